@@ -279,6 +279,13 @@ class HtpasswdFile(_CommonFile):
             though it can be overridden to implement non-standard hashes
             within the htpasswd file.
 
+    :param metrics:
+        optional :class:`~passlib.context.CryptMetrics` instance,
+        used to record latency & outcome of the hashes checked and created
+        via this file (see :attr:`CryptContext.metrics <passlib.context.CryptContext.metrics>`).
+        if specified, the file will use a copy of *context* with the metrics attached
+        (so the shared default context isn't affected).
+
     Loading & Saving
     ================
     .. automethod:: load
@@ -303,10 +310,16 @@ class HtpasswdFile(_CommonFile):
         contains one of the forbidden characters ``:\\r\\n\\t\\x00``,
         or is longer than 255 characters.
     """
-    def __init__(self, path=None, default=None, context=htpasswd_context, **kwds):
+    metrics = None #CryptMetrics instance, if enabled
+
+    def __init__(self, path=None, default=None, context=htpasswd_context, metrics=None, **kwds):
         self.context = context
         if default:
             self.context = self.context.replace(default=default)
+        if metrics is not None:
+            if self.context is context:
+                self.context = context.replace()
+            self.context.metrics = self.metrics = metrics
         super(HtpasswdFile, self).__init__(path, **kwds)
 
     def _parse_line(self, line):
@@ -348,6 +361,8 @@ class HtpasswdFile(_CommonFile):
         user = self._norm_user(user)
         hash = self._entry_map.get(user)
         if hash is None:
+            if self.metrics is not None:
+                self.metrics.incr("unknown_user")
             return None
         else:
             return self.context.verify(password, hash)
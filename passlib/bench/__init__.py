@@ -0,0 +1,15 @@
+"""passlib.bench - performance benchmarks for passlib
+
+this package measures the throughput & latency of passlib's handlers
+(for each available backend), the overhead of :class:`~passlib.context.CryptContext`,
+and :class:`~passlib.apache.HtpasswdFile` at various file sizes.
+it can be run from the command line::
+
+    python -m passlib.bench run -o before.json
+    python -m passlib.bench run -o after.json
+    python -m passlib.bench compare before.json after.json
+"""
+from passlib.bench.runner import measure, iter_backends, bench_handler, \
+    bench_handlers, bench_context, bench_htpasswd, run_benchmarks
+from passlib.bench.compare import dump_results, load_results, \
+    compare_results, format_comparison
@@ -0,0 +1,116 @@
+"""passlib.bench.__main__ - command line interface to benchmarks"""
+#=========================================================
+#imports
+#=========================================================
+#core
+import logging
+from optparse import OptionParser
+import sys
+#pkg
+from passlib.bench.runner import run_benchmarks, DEFAULT_DURATION
+from passlib.bench.compare import dump_results, load_results, \
+    compare_results, format_comparison
+#local
+__all__ = [
+    "main",
+]
+
+#=========================================================
+#commands
+#=========================================================
+def _split(value):
+    return [elem.strip() for elem in value.split(",") if elem.strip()]
+
+def run_command(args):
+    "run benchmarks, writing json results"
+    parser = OptionParser(usage="%prog run [options]")
+    parser.add_option("-o", "--output", metavar="PATH",
+        help="file to write json results to [stdout]")
+    parser.add_option("-s", "--schemes",
+        help="comma separated list of schemes to measure [all]")
+    parser.add_option("-c", "--context-schemes",
+        help="comma separated list of schemes to measure CryptContext overhead for")
+    parser.add_option("-n", "--sizes",
+        help="comma separated list of htpasswd file sizes to measure")
+    parser.add_option("-d", "--duration", type="float", default=DEFAULT_DURATION,
+        help="seconds to spend measuring each operation [%default]")
+    parser.add_option("-r", "--rounds", default="default",
+        help="rounds to use: 'default', 'min', or an integer [%default]")
+    parser.add_option("-q", "--quick", action="store_true", default=False,
+        help="quick run: min rounds, short duration, small htpasswd file")
+    opts, args = parser.parse_args(args)
+    if args:
+        parser.error("unexpected arguments")
+    rounds = opts.rounds
+    if rounds not in ("default", "min"):
+        rounds = int(rounds)
+    duration = opts.duration
+    sizes = opts.sizes
+    if sizes is not None:
+        sizes = [int(size) for size in _split(sizes)]
+    if opts.quick:
+        rounds = "min"
+        duration = min(duration, .05)
+        if sizes is None:
+            sizes = [10000]
+    results = run_benchmarks(
+        schemes=_split(opts.schemes) if opts.schemes is not None else None,
+        context_schemes=_split(opts.context_schemes) if opts.context_schemes is not None else None,
+        htpasswd_sizes=sizes,
+        duration=duration,
+        rounds=rounds,
+        )
+    if opts.output:
+        fh = open(opts.output, "w")
+        try:
+            dump_results(results, fh)
+        finally:
+            fh.close()
+    else:
+        dump_results(results, sys.stdout)
+    return 0
+
+def compare_command(args):
+    "compare two json result files, returns 1 if regressions found"
+    parser = OptionParser(usage="%prog compare [options] OLD NEW")
+    parser.add_option("-t", "--threshold", type="float", default=10.0,
+        help="percent slowdown which counts as a regression [%default]")
+    parser.add_option("-f", "--field", default="mean",
+        help="latency field to compare: mean, p50, p95 [%default]")
+    parser.add_option("-a", "--all", action="store_true", default=False,
+        help="list all benchmarks, not just those which changed")
+    opts, args = parser.parse_args(args)
+    if len(args) != 2:
+        parser.error("expected OLD and NEW result files")
+    old, new = [load_results(open(path)) for path in args]
+    rows = compare_results(old, new, opts.threshold/100, opts.field)
+    if not opts.all:
+        rows = [row for row in rows if row[4] != "ok"]
+    sys.stdout.write(format_comparison(rows))
+    regressions = sum(1 for row in rows if row[4] == "regression")
+    if regressions:
+        sys.stdout.write("%d regression(s) found\n" % regressions)
+        return 1
+    return 0
+
+_commands = {
+    "run": run_command,
+    "compare": compare_command,
+}
+
+def main(args=None):
+    "command line entry point"
+    if args is None:
+        args = sys.argv[1:]
+    if not args or args[0] not in _commands:
+        sys.stderr.write("usage: python -m passlib.bench {run,compare} [options]\n")
+        return 2
+    return _commands[args[0]](args[1:])
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
+
+#=========================================================
+#eof
+#=========================================================
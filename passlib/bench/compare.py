@@ -0,0 +1,94 @@
+"""passlib.bench.compare - saving & comparing benchmark results"""
+#=========================================================
+#imports
+#=========================================================
+#core
+try:
+    import json
+except ImportError: #pragma: no cover -- py25
+    try:
+        import simplejson as json
+    except ImportError:
+        json = None
+#site
+#pkg
+#local
+__all__ = [
+    "dump_results",
+    "load_results",
+    "compare_results",
+    "format_comparison",
+]
+
+#=========================================================
+#serialization
+#=========================================================
+def _require_json():
+    if json is None: #pragma: no cover -- py25
+        raise RuntimeError("json support requires python 2.6+, or the simplejson package")
+
+def dump_results(results, stream):
+    "write results from :func:`~passlib.bench.runner.run_benchmarks` to file as json"
+    _require_json()
+    json.dump(results, stream, indent=1, sort_keys=True)
+    stream.write("\n")
+
+def load_results(stream):
+    "load results written by :func:`dump_results`"
+    _require_json()
+    return json.load(stream)
+
+#=========================================================
+#comparison
+#=========================================================
+def compare_results(old, new, threshold=.1, field="mean"):
+    """compare two sets of benchmark results.
+
+    :arg old: baseline results (as returned by :func:`~passlib.bench.runner.run_benchmarks`)
+    :arg new: results to compare against baseline.
+    :param threshold:
+        fractional slowdown which counts as a regression
+        (defaults to ``.1``, ie 10% slower than baseline).
+    :param field: latency field to compare (``"mean"``, ``"p50"``, ``"p95"``).
+
+    :returns:
+        list of ``(key, old_value, new_value, change, status)`` tuples,
+        sorted by key, for every benchmark present in both result sets.
+        ``change`` is the fractional change in latency (positive is slower);
+        ``status`` is one of ``"regression"``, ``"improvement"``, ``"ok"``,
+        or ``"incomparable"`` (if the two runs used different rounds).
+    """
+    old = old['results']
+    new = new['results']
+    rows = []
+    for key in sorted(set(old) & set(new)):
+        a = old[key]
+        b = new[key]
+        if not isinstance(a, dict) or not isinstance(b, dict):
+            #error entries
+            continue
+        x = a[field]
+        y = b[field]
+        change = (y - x) / x if x else 0.0
+        if a.get("rounds") != b.get("rounds"):
+            status = "incomparable"
+        elif change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append((key, x, y, change, status))
+    return rows
+
+def format_comparison(rows):
+    "render rows returned by :func:`compare_results` as a table"
+    lines = ["%-48s %12s %12s %8s  %s" % ("benchmark", "old (us)", "new (us)", "change", "status")]
+    for key, x, y, change, status in rows:
+        lines.append("%-48s %12.2f %12.2f %+7.1f%%  %s" %
+                     (key, x*1e6, y*1e6, change*100, status))
+    return "\n".join(lines) + "\n"
+
+#=========================================================
+#eof
+#=========================================================
@@ -0,0 +1,336 @@
+"""passlib.bench.runner - benchmark routines"""
+#=========================================================
+#imports
+#=========================================================
+#core
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+#site
+#pkg
+from passlib import __version__
+from passlib import registry
+from passlib.apache import HtpasswdFile
+from passlib.context import CryptContext
+from passlib.utils import MissingBackendError, rng
+import passlib.utils.pbkdf2 as _pbkdf2
+#local
+log = logging.getLogger(__name__)
+__all__ = [
+    "measure",
+    "iter_backends",
+    "bench_handler",
+    "bench_handlers",
+    "bench_context",
+    "bench_htpasswd",
+    "run_benchmarks",
+]
+
+#=========================================================
+#constants
+#=========================================================
+
+#: timer used by benchmarks (perf_counter has better resolution, where available)
+timer = getattr(time, "perf_counter", time.time)
+
+#: default number of seconds to spend measuring each operation
+DEFAULT_DURATION = .25
+
+#: password used for all benchmarks
+SECRET = "too many secrets"
+
+#: values passed to handlers which require context kwds
+CONTEXT_KWDS = dict(user="admin", enable_wildcard=False)
+
+#: schemes whose CryptContext overhead is measured by default
+#: (cheap ones, so the overhead isn't lost in the noise)
+CONTEXT_SCHEMES = ["ldap_sha1", "hex_md5", "md5_crypt", "sha256_crypt"]
+
+#: htpasswd file sizes measured by default
+HTPASSWD_SIZES = [10000, 100000, 1000000]
+
+#=========================================================
+#measurement
+#=========================================================
+def _summarize(samples, calls, total):
+    "build summary dict from list of per-call latency samples"
+    samples.sort()
+    count = len(samples)
+    return dict(
+        calls=calls,
+        total=total,
+        mean=total/calls,
+        min=samples[0],
+        p50=samples[count//2],
+        p95=samples[int(.95*(count-1))],
+        ops=calls/total,
+        )
+
+def measure(func, duration=DEFAULT_DURATION, max_batch=1<<16):
+    """call function repeatedly for approximately *duration* seconds, recording it's latency.
+
+    fast functions are called in batches (sized so each batch takes at least 1ms),
+    so that timer overhead doesn't distort the results; each batch's average
+    is recorded as a single latency sample. the function is always called at least once.
+
+    :returns:
+        dict with keys ``calls`` (number of calls), ``total`` (seconds taken),
+        ``mean``, ``min``, ``p50``, ``p95`` (per-call latency in seconds),
+        and ``ops`` (calls per second).
+    """
+    batch = 1
+    while True:
+        start = timer()
+        for _ in xrange(batch):
+            func()
+        elapsed = timer() - start
+        if elapsed >= .001 or batch >= max_batch:
+            break
+        batch *= 4
+    samples = [elapsed/batch]
+    calls = batch
+    total = elapsed
+    while total < duration:
+        start = timer()
+        for _ in xrange(batch):
+            func()
+        elapsed = timer() - start
+        samples.append(elapsed/batch)
+        calls += batch
+        total += elapsed
+    return _summarize(samples, calls, total)
+
+#=========================================================
+#handler benchmarks
+#=========================================================
+def _uses_pbkdf2(handler):
+    "check if handler is built on passlib.utils.pbkdf2"
+    return getattr(handler, "wrapped", handler).__module__ == "passlib.handlers.pbkdf2"
+
+def iter_backends(handler):
+    """iterate over handler's available backends, activating each in turn.
+
+    yields the name of each backend once it's been activated,
+    and restores the original backend when done.
+    handlers w/o multiple backends yield a single ``"builtin"`` entry;
+    except for the pbkdf2-based handlers, which also yield ``"m2crypto"``
+    if :mod:`!M2Crypto` is available.
+    """
+    if getattr(handler, "backends", None):
+        try:
+            orig = handler.get_backend()
+        except MissingBackendError:
+            orig = None
+        try:
+            for backend in handler.backends:
+                if handler.has_backend(backend):
+                    handler.set_backend(backend)
+                    yield backend
+        finally:
+            if orig:
+                handler.set_backend(orig)
+    elif _uses_pbkdf2(handler) and _pbkdf2._EVP:
+        orig = _pbkdf2._EVP
+        yield "m2crypto"
+        try:
+            _pbkdf2._EVP = None
+            yield "builtin"
+        finally:
+            _pbkdf2._EVP = orig
+    else:
+        yield "builtin"
+
+def _get_settings(handler, rounds):
+    "return encrypt() settings for handler, for specified rounds mode"
+    settings = {}
+    if 'rounds' in handler.setting_kwds:
+        if rounds == "min":
+            settings['rounds'] = max(handler.min_rounds, 1)
+        elif rounds == "default":
+            settings['rounds'] = handler.default_rounds
+        else:
+            settings['rounds'] = rounds
+    for key in handler.context_kwds:
+        settings[key] = CONTEXT_KWDS[key]
+    return settings
+
+def bench_handler(handler, duration=DEFAULT_DURATION, rounds="default"):
+    """measure encrypt, verify & identify for handler's active backend.
+
+    :arg handler: handler (or name of handler) to measure.
+    :param duration: seconds to spend measuring each operation.
+    :param rounds:
+        rounds to use, for handlers which support them.
+        may be an integer, ``"default"`` (the handler's default rounds),
+        or ``"min"`` (the handler's minimum rounds, for quick runs).
+
+    :returns:
+        dict mapping ``encrypt``, ``verify``, ``identify`` to
+        the summary returned by :func:`measure`.
+    """
+    if isinstance(handler, str):
+        handler = registry.get_crypt_handler(handler)
+    settings = _get_settings(handler, rounds)
+    context = dict((key, settings[key]) for key in handler.context_kwds)
+    encrypt = handler.encrypt
+    hash = encrypt(SECRET, **settings)
+    result = dict(
+        encrypt=measure(lambda: encrypt(SECRET, **settings), duration),
+        verify=measure(lambda: handler.verify(SECRET, hash, **context), duration),
+        identify=measure(lambda: handler.identify(hash), duration),
+        )
+    if 'rounds' in settings:
+        for entry in result.itervalues():
+            entry['rounds'] = settings['rounds']
+    return result
+
+def bench_handlers(schemes=None, duration=DEFAULT_DURATION, rounds="default"):
+    """run :func:`bench_handler` for every backend of every scheme.
+
+    :param schemes:
+        list of scheme names to measure;
+        defaults to all handlers built into passlib.
+
+    :returns:
+        dict mapping :samp:`handler.{name}.{backend}.{op}` to summary dict.
+        schemes which can't be measured are recorded
+        as :samp:`handler.{name}.error` -> error message.
+    """
+    if schemes is None:
+        schemes = sorted(registry._handler_locations)
+    results = {}
+    for name in schemes:
+        try:
+            handler = registry.get_crypt_handler(name)
+            found = False
+            for backend in iter_backends(handler):
+                log.info("measuring %s (%s backend)", name, backend)
+                for op, entry in bench_handler(handler, duration, rounds).iteritems():
+                    results["handler.%s.%s.%s" % (name, backend, op)] = entry
+                found = True
+            if not found:
+                raise MissingBackendError("no backends available")
+        except (ValueError, TypeError, KeyError, NotImplementedError, MissingBackendError), err:
+            log.warning("can't measure %s: %s", name, err)
+            results["handler.%s.error" % (name,)] = str(err)
+    return results
+
+#=========================================================
+#context overhead
+#=========================================================
+def bench_context(schemes=None, duration=DEFAULT_DURATION, rounds="default"):
+    """measure overhead :class:`~passlib.context.CryptContext` adds to raw handler calls.
+
+    for each scheme, this creates a context containing that scheme (as the default)
+    along with the other schemes listed, and measures encrypt, verify & identify
+    through both the context and the raw handler.
+
+    :param schemes: list of schemes to measure, defaults to :data:`CONTEXT_SCHEMES`.
+
+    :returns:
+        dict mapping :samp:`context.{name}.{op}` to summary dict,
+        with additional keys ``raw_mean`` (raw handler's mean latency),
+        and ``overhead`` (seconds added by the context per call).
+    """
+    if schemes is None:
+        schemes = CONTEXT_SCHEMES
+    results = {}
+    for name in schemes:
+        handler = registry.get_crypt_handler(name)
+        settings = _get_settings(handler, rounds)
+        kwds = {}
+        if 'rounds' in settings:
+            kwds[name + "__default_rounds"] = settings['rounds']
+            kwds[name + "__vary_rounds"] = 0
+        others = [other for other in schemes if other != name]
+        ctx = CryptContext(schemes=[name] + others, **kwds)
+        hash = handler.encrypt(SECRET, **settings)
+        raw = bench_handler(handler, duration, rounds)
+        measured = dict(
+            encrypt=measure(lambda: ctx.encrypt(SECRET), duration),
+            verify=measure(lambda: ctx.verify(SECRET, hash), duration),
+            identify=measure(lambda: ctx.identify(hash), duration),
+            )
+        for op, entry in measured.iteritems():
+            entry['raw_mean'] = raw[op]['mean']
+            entry['overhead'] = entry['mean'] - raw[op]['mean']
+            if 'rounds' in settings:
+                entry['rounds'] = settings['rounds']
+            results["context.%s.%s" % (name, op)] = entry
+    return results
+
+#=========================================================
+#htpasswd
+#=========================================================
+def bench_htpasswd(sizes=None, duration=DEFAULT_DURATION):
+    """measure :class:`~passlib.apache.HtpasswdFile` load, verify & save for various file sizes.
+
+    :param sizes: list of entry counts to measure, defaults to :data:`HTPASSWD_SIZES`.
+
+    :returns: dict mapping :samp:`htpasswd.{size}.{op}` to summary dict.
+    """
+    if sizes is None:
+        sizes = HTPASSWD_SIZES
+    #NOTE: all entries share a single hash, the content doesn't affect load time.
+    hash = registry.get_crypt_handler("apr_md5_crypt").encrypt(SECRET)
+    results = {}
+    for size in sizes:
+        log.info("measuring htpasswd file w/ %d entries", size)
+        fd, path = tempfile.mkstemp(prefix="passlib-bench-", suffix=".htpasswd")
+        try:
+            lines = ["user%d:%s\n" % (idx, hash) for idx in xrange(size)]
+            os.write(fd, "".join(lines).encode("ascii"))
+            os.close(fd)
+            del lines
+            results["htpasswd.%d.load" % size] = measure(lambda: HtpasswdFile(path), duration)
+            ht = HtpasswdFile(path)
+            def verify():
+                ht.verify("user%d" % rng.randrange(size), SECRET)
+            results["htpasswd.%d.verify" % size] = measure(verify, duration)
+            results["htpasswd.%d.save" % size] = measure(ht.save, duration)
+        finally:
+            os.remove(path)
+    return results
+
+#=========================================================
+#main entry point
+#=========================================================
+def run_benchmarks(schemes=None, context_schemes=None, htpasswd_sizes=None,
+                   duration=DEFAULT_DURATION, rounds="default"):
+    """run all benchmarks, returning json-compatible results.
+
+    :param schemes: passed to :func:`bench_handlers`; use ``()`` to skip.
+    :param context_schemes: passed to :func:`bench_context`; use ``()`` to skip.
+    :param htpasswd_sizes: passed to :func:`bench_htpasswd`; use ``()`` to skip.
+    :param duration: seconds to spend measuring each operation.
+    :param rounds: passed to :func:`bench_handler`.
+
+    :returns:
+        dict containing ``meta`` (dict describing host & run settings)
+        and ``results`` (dict of all benchmark results).
+    """
+    from passlib.calibrate import get_host_id
+    results = {}
+    if schemes != ():
+        results.update(bench_handlers(schemes, duration, rounds))
+    if context_schemes != ():
+        results.update(bench_context(context_schemes, duration, rounds))
+    if htpasswd_sizes != ():
+        results.update(bench_htpasswd(htpasswd_sizes, duration))
+    meta = dict(
+        passlib=__version__,
+        python=platform.python_version(),
+        platform=sys.platform,
+        host=get_host_id(),
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        duration=duration,
+        rounds=rounds,
+        )
+    return dict(meta=meta, results=results)
+
+#=========================================================
+#eof
+#=========================================================
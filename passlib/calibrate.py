@@ -0,0 +1,926 @@
+"""passlib.calibrate - measure how many rounds a hash can afford on this host
+
+this module experimentally determines the number of rounds which causes
+a given hash to take a desired amount of time on the current host.
+it's used by :class:`~passlib.context.CryptContext` to implement the
+:samp:`{hash}__target_time` policy option, and caches it's results on disk,
+so that each process doesn't have to re-measure them when it starts.
+
+it also determines which of a handler's backends is fastest on the current host
+(used by ``set_backend("fastest")``), and contains a capacity planner,
+which picks rounds for a context's schemes based on a target login rate
+instead of a target latency; run ``python -m passlib.calibrate --help`` for details.
+"""
+#=========================================================
+#imports
+#=========================================================
+from __future__ import with_statement
+from passlib.utils import py32_lang
+#core
+# Py2k #
+from ConfigParser import SafeConfigParser
+# Py3k #
+#if py32_lang:
+#    #Py3.2 removed old ConfigParser, put SafeConfigParser in it's place
+#    from ConfigParser import ConfigParser as SafeConfigParser
+#else:
+#    from ConfigParser import SafeConfigParser
+# end Py3k #
+from hashlib import md5
+from math import log as logb
+import logging
+import os
+import sys
+import time
+try:
+    import threading
+except ImportError: #pragma: no cover -- python built w/o thread support
+    import dummy_threading as threading
+#site
+#pkg
+from passlib.registry import get_crypt_handler
+from passlib.utils import is_crypt_handler, MissingBackendError
+#local
+log = logging.getLogger(__name__)
+__all__ = [
+    "HashTimer",
+    "calibrate_rounds",
+    "find_fastest_backend",
+    "get_host_id",
+    "get_probe_id",
+    "clear_cache",
+
+    "measure_throughput",
+    "fit_throughput",
+    "plan_capacity",
+]
+
+#=========================================================
+#timing
+#=========================================================
+
+#: timer used by benchmarks (perf_counter has better resolution, where available)
+_timer = getattr(time, "perf_counter", time.time)
+
+class HashTimer(object):
+    """helper which determines number of rounds required for hash to take desired amount of time.
+
+    usage::
+
+        >>> timer = HashTimer("sha512_crypt")
+        >>> timer.find_rounds(.5)
+
+    :arg name: name of handler to time (or the handler object itself).
+    :param samples:
+        number of times to hash password when timing each rounds value;
+        the fastest run is used, to discard interference from other processes.
+
+    .. note::
+        This function is not very exact, and generates results
+        that are only approximately the same each time (w/in about 5% usually).
+
+        Furthermore, to generate useful values, it should
+        be run when the system has an average load
+        to get an accurate measurement.
+    """
+    log = logging.getLogger(__name__ + ".HashTimer")
+
+    def __init__(self, name, samples=3):
+        #
+        #get handler, extract boundary information
+        #
+        if is_crypt_handler(name):
+            self.handler = handler = name
+        else:
+            self.handler = handler = get_crypt_handler(name)
+        if 'rounds' not in handler.setting_kwds:
+            raise ValueError("scheme does not support rounds: %r" % (handler.name,))
+        self.min_rounds = getattr(handler, "min_rounds", 2)
+        self.max_rounds = getattr(handler, "max_rounds", (1<<32)-1)
+        rc = self.rounds_cost = getattr(handler, "rounds_cost", "linear")
+
+        #
+        #set up functions that vary based on rounds cost function
+        #
+        if rc == "linear":
+            def get_rps(rounds, delta):
+                return rounds/delta
+            def guess_rounds(rps, target):
+                return int(rps*target+.5)
+            erradj = 2
+        elif rc == "log2":
+            def get_rps(rounds, delta):
+                return (2**rounds)/delta
+            def guess_rounds(rps, target):
+                return int(logb(rps*target,2)+.5)
+            erradj = 1.1
+        else:
+            raise NotImplementedError("unknown rounds cost function: %r" % (rc,))
+        self.get_rps = get_rps
+        self.guess_rounds = guess_rounds
+        self.erradj = erradj
+
+        #
+        #init cache
+        #
+        self.samples = samples
+        self.cache = {}
+        self.srange = range(samples)
+
+    def time_encrypt(self, rounds):
+        "check how long encryption for a given number of rounds will take"
+        cache = self.cache
+        if rounds in cache:
+            return cache[rounds]
+        encrypt = self.handler.encrypt
+        delta = None
+        for x in self.srange:
+            start = _timer()
+            encrypt("too many secrets", rounds=rounds)
+            elapsed = _timer() - start
+            if delta is None or elapsed < delta:
+                delta = elapsed
+        cache[rounds] = delta
+        return delta
+
+    def find_rounds(self, target, over=False, under=False):
+        """find optimal rounds range for hash
+
+        :arg target: time hashing a password should take
+        :param over: if True, returns minimum rounds taking *at least* target seconds.
+        :param under: if True, returns maximum rounds taking *at most* target seconds.
+
+        if neither over / under is set, returns rounds taking
+        closest to target seconds.
+
+        :returns:
+            returns number of rounds closest
+            to taking about ``target`` seconds to hash a password.
+        """
+        if target <= 0:
+            raise ValueError("target must be > 0")
+
+        log = self.log
+        name = self.handler.name
+        get_rps = self.get_rps
+        time_encrypt = self.time_encrypt
+        log.info("%s: finding rounds for target time: %f", name, target)
+
+        #
+        #check if useful lower & upper bounds already exist in cache
+        #
+        lower = upper = None
+        for rounds, delta in self.cache.iteritems():
+            if delta < target:
+                if lower is None or rounds > lower:
+                    lower = rounds
+            else:
+                if upper is None or rounds < upper:
+                    upper = rounds
+
+        #
+        #if bounds not found in cache, run open-ended search for starting bounds
+        #
+        if lower is None:
+            lower = max(1,self.min_rounds)
+        if upper is None:
+            guess_rounds = self.guess_rounds
+            max_rounds = self.max_rounds
+            target_above = target*self.erradj #NOTE: we aim a little high as hack to deal w/ measuring error
+            rounds = lower
+            while True:
+                delta = time_encrypt(rounds)
+                rps = get_rps(rounds, delta)
+                log.debug("%s: ranging target: checked %r -> %fs (%f r/s)", name, rounds, delta, rps)
+                if delta < target:
+                    lower = rounds
+                    if rounds == max_rounds:
+                        log.warning("%s: target time out of range: hash would require > max_rounds (%d) in order to take %fs", name, max_rounds, target)
+                        return rounds
+                    rounds = min(max(guess_rounds(rps, target_above), rounds+1), max_rounds)
+                else:
+                    upper = rounds
+                    break
+
+        #
+        #perform binary search till we find match
+        #
+        while lower+1<upper:
+            #NOTE: weighting things in favor of upper, since per-call overhead causes curve to not be quite linear.
+            next = (upper*5+lower*3)//8
+            delta = time_encrypt(next)
+            rps = get_rps(next, delta)
+            log.debug("%s: finding target: range %r .. %r: checked %r -> %fs (%f r/s)", name, lower, upper, next, delta, rps)
+            if delta < target:
+                lower = next
+            else:
+                upper = next
+
+        #
+        #now 'lower' is largest value which takes less than target seconds,
+        #and 'upper' is smallest value which takes greater than target seconds.
+        #so we pick based on over/under flags, or fallback to whichever one is closest
+        #
+        if over:
+            return upper
+        elif under:
+            return lower
+        else:
+            cache = self.cache
+            if target-cache[lower] < cache[upper]-target:
+                return lower
+            else:
+                return upper
+
+    def find_rounds_range(self, target_high, target_low=None, over=False, under=False):
+        "find min/max rounds which will cause scheme to take specified range of times"
+        if target_low is None:
+            target_low = target_high * .75
+        elif target_low > target_high:
+            target_high = target_low
+        rounds_high = self.find_rounds(target_high, under=not over, over=over)
+        rounds_low = self.find_rounds(target_low, over=not under, under=under)
+        if rounds_low > rounds_high:
+            #NOTE: this happens sometimes w/ rounds_cost=log2...
+            #if nothing hits w/in range, rounds_low will be 1+ rounds_high
+            #we just return correctly ordered range
+            rounds_low, rounds_high = rounds_high, rounds_low
+        return rounds_low, rounds_high
+
+    def estimate_rps(self):
+        "return estimated rounds per second based on cached results"
+        cache = self.cache
+        if not cache:
+            raise RuntimeError("should not be called until cache populated by find_rounds()")
+        get_rps = self.get_rps
+        rps = sum(r*get_rps(r,d) for r,d in cache.iteritems())/sum(cache)
+        if rps > 1000: #for almost all cases, we'd return integer
+            rps = int(rps)
+        return rps
+
+#=========================================================
+#calibration cache
+#=========================================================
+
+#: path to file calibration results are cached in.
+#: defaults to ``$PASSLIB_CALIBRATION_CACHE`` if set,
+#: otherwise ``~/.cache/passlib/calibration.cfg``.
+#: may be set to ``None`` to disable the on-disk cache.
+cache_path = os.environ.get("PASSLIB_CALIBRATION_CACHE") or \
+    os.path.join(os.path.expanduser("~"), ".cache", "passlib", "calibration.cfg")
+
+#: age (in seconds) after which cached measurements are discarded and re-measured
+#: (defaults to 30 days); may be set to ``None`` to keep them indefinitely.
+cache_max_age = 30*24*60*60
+
+#: in-memory copy of results, maps (host id, option key) -> value string
+_memory_cache = {}
+
+#: lock serializing cache file access (held only briefly, never while measuring)
+_lock = threading.RLock()
+
+#: maps cache key -> lock held while that key is being measured,
+#: so concurrent callers wait for one measurement rather than repeating it.
+_measure_locks = {}
+
+def _get_measure_lock(key):
+    "return lock serializing measurements for specified cache key"
+    with _lock:
+        lock = _measure_locks.get(key)
+        if lock is None:
+            lock = _measure_locks[key] = threading.Lock()
+        return lock
+
+_host_id = None
+
+def get_host_id():
+    """return string identifying the host's cpu & python implementation.
+
+    this is used to key the calibration cache, so that results
+    aren't re-used on a different machine (eg if the cache file
+    is on a shared filesystem), or by a different python interpreter
+    (which may run pure-python backends at very different speeds).
+    """
+    global _host_id
+    if _host_id is not None:
+        return _host_id
+    import platform
+    cpu = None
+    try:
+        with open("/proc/cpuinfo", "r") as fh:
+            for line in fh:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except (IOError, OSError):
+        pass
+    if not cpu:
+        cpu = platform.processor() or "unknown cpu"
+    impl = getattr(platform, "python_implementation", lambda: "CPython")()
+    value = "%s / %s / %s %d.%d" % (cpu, platform.machine() or "unknown",
+                                    impl, sys.version_info[0], sys.version_info[1])
+    #NOTE: value is used as INI section name, so can't contain brackets.
+    _host_id = value.replace("[", "(").replace("]", ")")
+    return _host_id
+
+_probe_id = None
+
+def get_probe_id():
+    """return string identifying the interpreter & the C library backing :func:`!crypt`.
+
+    this is used to key cached results of :func:`passlib.utils.os_crypt_supports`;
+    it includes the path & mtime of the libraries, so that the cached results
+    are discarded whenever libc / libcrypt are upgraded.
+    """
+    global _probe_id
+    if _probe_id is not None:
+        return _probe_id
+    paths = []
+    try:
+        with open("/proc/self/maps", "r") as fh:
+            for line in fh:
+                path = line.split()[-1]
+                base = os.path.basename(path)
+                if (base.startswith("libcrypt") or base.startswith("libc.") or
+                        base.startswith("libc-")) and path not in paths:
+                    paths.append(path)
+    except (IOError, OSError):
+        pass
+    if not paths:
+        #non-linux: fall back to the crypt module itself
+        try:
+            import crypt
+            path = getattr(crypt, "__file__", None)
+            if path:
+                paths.append(path)
+        except ImportError:
+            pass
+    libs = []
+    for path in sorted(paths):
+        try:
+            libs.append("%s@%d" % (path, os.path.getmtime(path)))
+        except OSError:
+            libs.append(path)
+    value = "probe %s %s / %s" % (sys.executable, sys.version.split()[0],
+                                  ", ".join(libs) or "builtin")
+    _probe_id = value.replace("[", "(").replace("]", ")")
+    return _probe_id
+
+def _probe_key(hashes):
+    return "os_crypt." + md5(u"\n".join(hashes).encode("utf-8")).hexdigest()
+
+def lookup_probe(hashes):
+    "return cached result of :func:`passlib.utils.os_crypt_supports`, or ``None``"
+    with _lock:
+        value = _cache_lookup(_probe_key(hashes), get_probe_id())
+    if value is None:
+        return None
+    return value == "1"
+
+def store_probe(hashes, result):
+    "store result of :func:`passlib.utils.os_crypt_supports` in cache"
+    with _lock:
+        _cache_store(_probe_key(hashes), "1" if result else "0", get_probe_id())
+
+def _get_backend(handler):
+    "return name of handler's active backend, or 'builtin'"
+    get_backend = getattr(handler, "get_backend", None)
+    if get_backend is not None:
+        try:
+            return get_backend()
+        except MissingBackendError:
+            pass
+    return "builtin"
+
+def _read_cache_file(path):
+    "load calibration results from file into parser"
+    parser = SafeConfigParser()
+    try:
+        parser.read([path])
+    except Exception, err:
+        log.warning("ignoring unreadable calibration cache %r: %s", path, err)
+        parser = SafeConfigParser()
+    return parser
+
+def _write_cache_file(path, section, key, value):
+    "merge single result into calibration cache file"
+    parser = _read_cache_file(path)
+    if not parser.has_section(section):
+        parser.add_section(section)
+    parser.set(section, key, value)
+    _save_cache_file(path, parser)
+
+def _save_cache_file(path, parser):
+    "atomically replace calibration cache file with contents of parser"
+    try:
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "w") as fh:
+            parser.write(fh)
+        if os.name == "nt" and os.path.exists(path): #pragma: no cover
+            os.remove(path)
+        os.rename(tmp, path)
+    except (IOError, OSError), err:
+        log.warning("couldn't write calibration cache %r: %s", path, err)
+
+def _remove_cache_file_entries(path, prefix):
+    "remove entries whose key starts with prefix from calibration cache file"
+    parser = _read_cache_file(path)
+    for section in parser.sections():
+        for key in parser.options(section):
+            if key.startswith(prefix):
+                parser.remove_option(section, key)
+    _save_cache_file(path, parser)
+
+#: (path, mtime) of cache file when it was last loaded into memory cache
+_disk_state = None
+
+def _sync_cache_file():
+    "load cache file into memory cache, if it's changed since it was last loaded"
+    global _disk_state
+    path = cache_path
+    try:
+        state = (path, os.path.getmtime(path))
+    except OSError:
+        return
+    if state == _disk_state:
+        return
+    parser = _read_cache_file(path)
+    for section in parser.sections():
+        for key in parser.options(section):
+            _memory_cache[section, key] = parser.get(section, key, raw=True)
+    _disk_state = state
+
+def _cache_lookup(key, section=None):
+    "return cached value for key (checking memory, then disk), or ``None``"
+    if section is None:
+        section = get_host_id()
+    value = _memory_cache.get((section, key))
+    if value is None and cache_path:
+        _sync_cache_file()
+        value = _memory_cache.get((section, key))
+    return value
+
+def _cache_store(key, value, section=None):
+    "store value for key in memory & disk caches"
+    if section is None:
+        section = get_host_id()
+    _memory_cache[section, key] = value
+    if cache_path:
+        _write_cache_file(cache_path, section, key, value)
+
+def _lookup_result(key):
+    """return cached measurement for key, or ``None`` if missing or stale.
+
+    measurements are stored as :samp:`{value} @ {timestamp}`;
+    entries without a timestamp, or older than :data:`cache_max_age`, are ignored.
+    """
+    with _lock:
+        value = _cache_lookup(key)
+    if value is None:
+        return None
+    value, sep, stamp = value.rpartition("@")
+    if not sep:
+        return None
+    try:
+        stamp = float(stamp)
+    except ValueError:
+        return None
+    if cache_max_age is not None and not 0 <= time.time() - stamp <= cache_max_age:
+        log.info("re-measuring stale calibration cache entry: %r", key)
+        return None
+    return value.strip()
+
+def _store_result(key, value):
+    "store measurement for key in cache, along with current time"
+    with _lock:
+        _cache_store(key, "%s @ %d" % (value, time.time()))
+
+def calibrate_rounds(handler, target_time, use_cache=True):
+    """determine rounds settings for handler which take *target_time* seconds on this host.
+
+    :arg handler: handler (or name of handler) to calibrate
+    :arg target_time: desired number of seconds hashing a password should take.
+    :param use_cache:
+        if ``True`` (the default), results will be looked up in (and added to)
+        the in-memory & on-disk caches, keyed by :func:`get_host_id`,
+        the handler's name & active backend, and the target time.
+        cached results older than :data:`cache_max_age` are re-measured.
+
+    :returns:
+        ``(min_rounds, default_rounds)``, where ``default_rounds`` takes approximately
+        *target_time* seconds, and ``min_rounds`` takes approximately 3/4 of that time.
+    """
+    if not is_crypt_handler(handler):
+        handler = get_crypt_handler(handler)
+    target_time = float(target_time)
+    key = "%s.%s.%r" % (handler.name, _get_backend(handler), target_time)
+    with _get_measure_lock(key):
+        if use_cache:
+            value = _lookup_result(key)
+            if value is not None:
+                try:
+                    low, high = [int(v) for v in value.split(",")]
+                except ValueError:
+                    log.warning("ignoring malformed calibration cache entry: %r", key)
+                else:
+                    return low, high
+
+        log.info("%s: calibrating rounds for target time %rs", handler.name, target_time)
+        timer = HashTimer(handler)
+        result = timer.find_rounds_range(target_time)
+
+        if use_cache:
+            _store_result(key, "%d, %d" % result)
+        return result
+
+def _time_backends(handler, backends, samples, threads):
+    """helper for find_fastest_backend() - times each backend on the same test vector.
+
+    backends are called directly via their ``_calc_checksum_{backend}`` methods,
+    so the handler's active backend is never changed while other threads may be using it.
+
+    :returns: dict mapping backend -> hashes per second, measured with *threads* threads
+        hashing at once (so backends which hold the GIL, or aren't reentrant, don't
+        look better than they'll perform in a threaded server). any backends whose
+        output didn't match the reference backend are omitted.
+    """
+    settings = {}
+    if 'rounds' in handler.setting_kwds:
+        #use reduced rounds to keep things quick, but enough that per-call overhead
+        #doesn't dominate.
+        if getattr(handler, "rounds_cost", "linear") == "log2":
+            settings['rounds'] = handler.min_rounds
+        else:
+            settings['rounds'] = max(handler.min_rounds, 1, (handler.default_rounds or 0)//16)
+    config = handler.genconfig(**settings)
+    secret = "too many secrets"
+
+    def get_method(backend):
+        return getattr(handler.from_string(config), "_calc_checksum_" + backend)
+
+    def run(method):
+        "time *samples* calls to method, returns best time"
+        best = None
+        for _ in xrange(samples):
+            start = _timer()
+            method(secret)
+            elapsed = _timer() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best
+
+    #check builtin backend first (if available), it's output is used as the reference.
+    backends = sorted(backends, key=lambda name: name != "builtin")
+    reference = None
+    timings = {}
+    for backend in backends:
+        result = get_method(backend)(secret)
+        if reference is None:
+            reference = result
+        elif result != reference:
+            log.warning("%s: %s backend output doesn't match %s backend, ignoring it",
+                        handler.name, backend, backends[0])
+            continue
+        if threads < 2:
+            timings[backend] = 1 / max(run(get_method(backend)), 1e-9)
+            continue
+        #hash from multiple threads at once, each with it's own instance
+        methods = [get_method(backend) for _ in xrange(threads)]
+        workers = [threading.Thread(target=run, args=(method,)) for method in methods]
+        start = _timer()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = _timer() - start
+        timings[backend] = threads * samples / max(elapsed, 1e-9)
+    return timings
+
+def find_fastest_backend(handler, use_cache=True, samples=5, threads=4, margin=.1):
+    """determine which of a handler's available backends is fastest on this host.
+
+    this times each available backend on the same test vector,
+    after first checking that they all produce the same output as the ``builtin`` backend
+    (or the first one, if there's no builtin); backends which don't
+    are logged and ignored. this is what ``handler.set_backend("fastest")`` uses.
+
+    backends are compared by throughput with *threads* threads hashing at once,
+    since that's how they'll be used by a threaded server: a backend which
+    holds the GIL (or isn't reentrant, such as ``os_crypt``) may have the lowest
+    single-threaded latency, but won't scale. backends are timed by calling
+    them directly, so the handler's active backend isn't changed while measuring.
+
+    :arg handler: :class:`~passlib.utils.handlers.HasManyBackends` handler (or name) to check.
+    :param use_cache:
+        if ``True`` (the default), results will be looked up in (and added to)
+        the in-memory & on-disk caches, keyed by :func:`get_host_id`,
+        :func:`get_probe_id`, the handler's name, and the list of available backends.
+        cached results older than :data:`cache_max_age` are re-measured.
+    :param samples: number of times each thread should call each backend.
+    :param threads: number of threads to hash with at once (``1`` to measure latency only).
+    :param margin:
+        fraction by which another backend must outperform the handler's default
+        backend (the first available one in it's :attr:`!backends` list) to be chosen
+        over it; this keeps measurement noise from deciding between near-equal backends.
+
+    :raises MissingBackendError: if no backends are available.
+
+    :returns: name of fastest backend.
+    """
+    if not is_crypt_handler(handler):
+        handler = get_crypt_handler(handler)
+    available = [name for name in handler.backends if handler.has_backend(name)]
+    if not available:
+        raise MissingBackendError(handler._no_backends_msg())
+    if len(available) == 1:
+        return available[0]
+    #NOTE: key includes probe id, so choice is re-measured if libc / libcrypt are upgraded.
+    key = "%s.fastest.%s.%s" % (handler.name, "+".join(available),
+                                md5(get_probe_id().encode("utf-8")).hexdigest()[:8])
+    with _get_measure_lock(key):
+        if use_cache:
+            value = _lookup_result(key)
+            if value in available:
+                return value
+
+        timings = _time_backends(handler, available, samples, threads)
+        best = max(timings, key=timings.get)
+        default = available[0]
+        if default in timings and best != default and \
+                timings[best] < timings[default] * (1 + margin):
+            log.info("%s: %s backend isn't clearly faster than default %s backend, keeping default",
+                     handler.name, best, default)
+            best = default
+        log.info("%s: fastest backend is %s (%s hashes/s w/ %d threads)", handler.name, best,
+                 ", ".join("%s=%.1f" % item for item in sorted(timings.items())), threads)
+
+        if use_cache:
+            _store_result(key, best)
+        return best
+
+def clear_cache(disk=False, handler=None):
+    """clear in-memory calibration cache.
+
+    :param disk: if ``True``, the on-disk cache file is removed as well.
+    :param handler:
+        if specified (as a handler or name), only that handler's
+        calibration & fastest-backend results are discarded
+        (from the on-disk cache too, if *disk* is set),
+        so they'll be re-measured the next time they're needed.
+    """
+    global _disk_state
+    with _lock:
+        if handler is None:
+            _memory_cache.clear()
+            _disk_state = None
+            if disk and cache_path and os.path.exists(cache_path):
+                os.remove(cache_path)
+            return
+        if hasattr(handler, "name"):
+            handler = handler.name
+        prefix = handler.lower() + "."
+        for entry in list(_memory_cache):
+            if entry[1].lower().startswith(prefix):
+                del _memory_cache[entry]
+        if disk and cache_path and os.path.exists(cache_path):
+            _remove_cache_file_entries(cache_path, prefix)
+            _disk_state = None
+
+#=========================================================
+#capacity planning
+#=========================================================
+
+def _get_multiprocessing():
+    "import multiprocessing on demand (it's only needed by the planner, and slow to import)"
+    try:
+        import multiprocessing
+    except ImportError: #pragma: no cover -- py25, or python built w/o multiprocessing
+        return None
+    return multiprocessing
+
+def _saturate_worker(args):
+    "measure_throughput() helper: hash continuously for *duration* seconds, returns hashes/sec"
+    handler, rounds, duration = args
+    encrypt = handler.encrypt
+    count = 0
+    start = _timer()
+    end = start + duration
+    while True:
+        encrypt("too many secrets", rounds=rounds)
+        count += 1
+        now = _timer()
+        if now >= end:
+            break
+    return count / (now - start)
+
+def measure_throughput(handler, rounds, workers=1, duration=1.0, pool=None):
+    """measure aggregate throughput of handler when run by multiple processes at once.
+
+    :arg handler: handler (or name of handler) to measure.
+    :arg rounds: rounds value to encrypt passwords with.
+    :param workers: number of processes which should hash concurrently.
+    :param duration: number of seconds each process should hash for.
+    :param pool:
+        optional :class:`!multiprocessing.Pool` (w/ at least *workers* processes) to use;
+        if not specified, a pool will be created for the duration of the call.
+
+    :returns: total number of hashes per second calculated by all workers.
+    """
+    if not is_crypt_handler(handler):
+        handler = get_crypt_handler(handler)
+    args = (handler, rounds, duration)
+    multiprocessing = _get_multiprocessing()
+    if workers == 1 or multiprocessing is None:
+        if workers != 1:
+            log.warning("multiprocessing not available, measuring single process only")
+        return _saturate_worker(args)
+    if pool is None:
+        pool = multiprocessing.Pool(workers)
+        try:
+            return sum(pool.map(_saturate_worker, [args] * workers, 1))
+        finally:
+            pool.close()
+            pool.join()
+    return sum(pool.map(_saturate_worker, [args] * workers, 1))
+
+def fit_throughput(samples):
+    """fit scaling curve to throughput measurements.
+
+    the curve used is Amdahl's law, :samp:`X(n) = X1 * n / (1 + sigma * (n-1))`,
+    where :samp:`X1` is the single-process throughput, and :samp:`sigma` is the
+    fraction of the work which is effectively serialized (memory bandwidth,
+    shared cpu caches, hyperthreads sharing a core, etc).
+
+    :arg samples: list of ``(workers, throughput)`` pairs, including one for ``workers=1``.
+
+    :returns:
+        ``(x1, sigma)``, for use with :samp:`X(n) = x1 * n / (1 + sigma * (n-1))`.
+    """
+    samples = sorted(samples)
+    workers, x1 = samples[0]
+    if workers != 1:
+        raise ValueError("samples must include single-process measurement")
+    #least squares fit of linearized form: x1*n/X(n) - 1 == sigma * (n-1)
+    num = den = 0
+    for n, x in samples[1:]:
+        num += (n-1) * (x1*n/x - 1)
+        den += (n-1) ** 2
+    if den:
+        sigma = min(1.0, max(0.0, num / den))
+    else:
+        sigma = 0.0
+    return x1, sigma
+
+def _parse_vary_rounds(vary_rounds):
+    "return (value, is_percent) for vary_rounds option"
+    if isinstance(vary_rounds, str) and vary_rounds.endswith("%"):
+        return float(vary_rounds[:-1]) / 100, True
+    return int(vary_rounds), False
+
+def plan_capacity(source, rate, cpus=None, budget=1.0, vary_rounds="10%",
+                  duration=1.0, probe_time=.01):
+    """pick rounds for each of a policy's schemes, based on a target login rate.
+
+    for each (non-deprecated) scheme in the policy which supports rounds,
+    this measures the aggregate throughput of the scheme when hashed by
+    1, half of, and all of the host's cpus at once; fits a scaling curve
+    to the results (see :func:`fit_throughput`); and uses that to estimate
+    the throughput of *cpus* processes. It then picks the largest rounds
+    value which will let the host sustain *rate* logins/second, using no
+    more than *budget* of it's cpu time, even when :samp:`{hash}__vary_rounds`
+    picks the top of it's range.
+
+    each scheme is planned independantly, as if all logins used it.
+
+    :arg source: :class:`~passlib.context.CryptPolicy` or :class:`~passlib.context.CryptContext` to plan for.
+    :arg rate: peak (eg 95th percentile) number of logins per second which must be sustained.
+    :param cpus: number of cpus available for hashing (defaults to the number in this host).
+    :param budget: fraction of the cpus' time which may be spent hashing (defaults to ``1.0``).
+    :param vary_rounds: ``vary_rounds`` value to plan for, and include in the resulting policy.
+    :param duration: number of seconds to run each benchmark for.
+    :param probe_time: approximate time each hash should take when benchmarking.
+
+    :returns:
+        copy of the policy, with :samp:`{hash}__default_rounds` and
+        :samp:`{hash}__vary_rounds` set for each scheme that was planned
+        (use it's :meth:`~passlib.context.CryptPolicy.to_string` method to get an ini file).
+    """
+    from passlib.context import CryptPolicy
+    policy = getattr(source, "policy", source)
+    assert isinstance(policy, CryptPolicy)
+    if rate <= 0:
+        raise ValueError("rate must be > 0")
+    if not 0 < budget <= 1:
+        raise ValueError("budget must be in range (0, 1]")
+    multiprocessing = _get_multiprocessing()
+    host_cpus = multiprocessing.cpu_count() if multiprocessing else 1
+    if cpus is None:
+        cpus = host_cpus
+    counts = sorted(set([1, max(1, min(cpus, host_cpus)//2), min(cpus, host_cpus)]))
+    vr, vr_percent = _parse_vary_rounds(vary_rounds)
+
+    pool = None
+    if counts[-1] > 1 and multiprocessing is not None:
+        pool = multiprocessing.Pool(counts[-1])
+    kwds = {}
+    try:
+        for handler in policy.iter_handlers():
+            name = handler.name
+            if 'rounds' not in handler.setting_kwds or policy.handler_is_deprecated(name):
+                continue
+            if hasattr(handler, "has_backend") and not handler.has_backend():
+                log.warning("%s: skipping, no backends available", name)
+                continue
+            rounds_cost = getattr(handler, "rounds_cost", "linear")
+            probe = HashTimer(handler).find_rounds(probe_time)
+            samples = [
+                (n, measure_throughput(handler, probe, n, duration, pool))
+                for n in counts
+            ]
+            x1, sigma = fit_throughput(samples)
+            capacity = x1 * cpus / (1 + sigma * (cpus-1)) * budget
+            log.info("%s: measured %r at %d rounds; fit x1=%.2f sigma=%.3f; est %.2f hashes/s on %d cpus",
+                     name, samples, probe, x1, sigma, capacity, cpus)
+
+            #find largest (linear) rounds affordable at top of vary_rounds range
+            if rounds_cost == "log2":
+                cost = (1 << probe) * capacity / rate
+            else:
+                cost = probe * capacity / rate
+            if vr_percent:
+                cost /= 1 + vr
+            elif rounds_cost == "linear":
+                cost -= vr
+            if rounds_cost == "log2":
+                rounds = int(logb(max(cost, 1), 2))
+                if not vr_percent:
+                    #integer vary_rounds is added to the log2 rounds value itself
+                    rounds -= vr
+            else:
+                rounds = int(cost)
+
+            mn = getattr(handler, "min_rounds", 1)
+            mx = getattr(handler, "max_rounds", None)
+            if rounds < mn:
+                log.warning("%s: can't sustain %r logins/s w/ min_rounds (%d), would need %d rounds",
+                            name, rate, mn, rounds)
+                rounds = mn
+            elif mx and rounds > mx:
+                rounds = mx
+            kwds[name + "__default_rounds"] = rounds
+            kwds[name + "__vary_rounds"] = vary_rounds
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return policy.replace(**kwds)
+
+#=========================================================
+#command line
+#=========================================================
+def main(args=None):
+    "run capacity planner from command line"
+    from optparse import OptionParser
+    from passlib.context import CryptPolicy
+    parser = OptionParser(usage="%prog --rate LOGINS [options]",
+        description="benchmark a CryptContext's schemes on this host, and print "
+            "a policy whose rounds will sustain the specified login rate.")
+    parser.add_option("-r", "--rate", type="float",
+        help="peak logins per second to plan for (eg the 95th percentile)")
+    parser.add_option("-c", "--config", metavar="PATH",
+        help="existing policy file to plan for")
+    parser.add_option("-s", "--schemes", default="sha512_crypt",
+        help="comma separated list of schemes to plan for, if --config isn't used [%default]")
+    parser.add_option("-n", "--cpus", type="int",
+        help="number of cpus available for hashing [all cpus on this host]")
+    parser.add_option("-b", "--budget", type="float", default=100.0,
+        help="percent of cpu time which may be spent hashing [%default]")
+    parser.add_option("-v", "--vary-rounds", default="10%",
+        help="vary_rounds value to plan for [%default]")
+    parser.add_option("-d", "--duration", type="float", default=1.0,
+        help="seconds to run each benchmark for [%default]")
+    opts, args = parser.parse_args(args)
+    if args or not opts.rate:
+        parser.error("--rate is required")
+    if opts.config:
+        policy = CryptPolicy.from_path(opts.config)
+    else:
+        policy = CryptPolicy(schemes=opts.schemes)
+    vary_rounds = opts.vary_rounds
+    if not vary_rounds.endswith("%"):
+        vary_rounds = int(vary_rounds)
+    policy = plan_capacity(policy, opts.rate, cpus=opts.cpus, budget=opts.budget/100,
+                           vary_rounds=vary_rounds, duration=opts.duration)
+    sys.stdout.write(policy.to_string())
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    sys.exit(main())
+
+#=========================================================
+#eof
+#=========================================================
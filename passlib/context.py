@@ -16,29 +16,53 @@ from ConfigParser import SafeConfigParser,ConfigParser,InterpolationSyntaxError
 #else:
 #    from ConfigParser import SafeConfigParser
 # end Py3k #
+from functools import partial
 import inspect
 import re
 import hashlib
+import hmac
 from math import log as logb
+from bisect import bisect_left
 import logging; log = logging.getLogger(__name__)
 import time
 import os
 from warnings import warn
+try:
+    import threading
+except ImportError: #pragma: no cover -- python built w/o thread support
+    import dummy_threading as threading
 #site
 try:
     from pkg_resources import resource_string
 except ImportError:
     #not available eg: under GAE
     resource_string = None
+try:
+    import multiprocessing
+except ImportError:
+    #not available under py25, GAE, etc
+    multiprocessing = None
+try:
+    import asyncio
+except ImportError:
+    #only available under py34+
+    asyncio = None
 #libs
 from passlib.registry import get_crypt_handler, _unload_handler_name
 from passlib.utils import to_bytes, to_unicode, bytes, Undef, \
-                          is_crypt_handler, splitcomma, rng
+                          is_crypt_handler, splitcomma, rng, genseed, has_urandom, \
+                          getrandbytes, LRUCache, MissingBackendError
+from passlib.utils.handlers import PrefixWrapper, StaticHandler, GenericHandler
+from passlib.utils import profiling
 #pkg
 #local
 __all__ = [
     'CryptPolicy',
     'CryptContext',
+    'VerifyCache',
+    'ConcurrencyLimiter',
+    'HashingOverloaded',
+    'CryptMetrics',
 ]
 
 #=========================================================
@@ -63,6 +87,9 @@ _forbidden_hash_options = frozenset([ "salt" ])
 #: CryptContext kwds which should be parsed into comma separated list of strings
 _context_comma_options = frozenset([ "schemes", "deprecated" ])
 
+#: special values accepted by the set_backend() method of multi-backend handlers
+_special_backends = frozenset([ "any", "default", "fastest" ])
+
 #--------------------------------------------------------
 #parsing helpers
 #--------------------------------------------------------
@@ -99,6 +126,8 @@ def _parse_policy_value(cat, name, opt, value):
         elif opt == "min_verify_time":
             return float(value)
         return value
+    elif opt == "target_time":
+        return float(value)
     else:
         #try to coerce everything to int
         try:
@@ -151,6 +180,241 @@ def _is_legacy_parse_error(err):
     return False
 # end Py2k #
 
+#--------------------------------------------------------
+#identify dispatch index
+#--------------------------------------------------------
+def _get_identify_hints(handler):
+    """helper for _IdentifyIndex; returns ``(prefixes, size, chars)``.
+
+    * ``prefixes`` - list of unicode prefixes; every hash the handler identifies
+      must begin with one of them.
+    * ``size``, ``chars`` - exact length & allowed charset of the hash,
+      for prefix-less :class:`~passlib.utils.handlers.StaticHandler` subclasses
+      which declare ``checksum_size`` (eg the ``hex_*`` hashes).
+
+    all values are ``None`` if nothing is known about the hash format,
+    in which case the handler will always have to be probed.
+    """
+    if isinstance(handler, PrefixWrapper):
+        prefixes = handler.prefix and [ handler.prefix ]
+    else:
+        prefixes = getattr(handler, "ident_values", None)
+        if not prefixes:
+            ident = getattr(handler, "ident", None)
+            prefixes = ident and [ ident ]
+    if prefixes:
+        return [ to_unicode(prefix, "ascii") for prefix in prefixes ], None, None
+    if isinstance(handler, type) and issubclass(handler, StaticHandler):
+        size = getattr(handler, "checksum_size", None)
+        if size:
+            return None, size, getattr(handler, "checksum_chars", None)
+    return None, None, None
+
+class _IdentifyIndex(object):
+    """dispatch index used by :meth:`CryptPolicy.iter_candidates`.
+
+    this is built once per policy, and maps a hash string
+    to the (small) list of handlers which could possibly identify it,
+    so that :meth:`CryptContext.identify` doesn't have to probe every
+    handler in turn. it consists of:
+
+    * a prefix trie built from each handler's ``ident`` / ``ident_values``
+      (or ``prefix``, for :class:`~passlib.utils.handlers.PrefixWrapper`).
+    * a map of hash length -> handlers, for prefix-less fixed-size hashes.
+    * a list of "wildcard" handlers that nothing is known about,
+      which are always returned.
+
+    candidates are always returned in the same order as the policy's handlers,
+    and must still be confirmed by calling ``handler.identify()``,
+    so :meth:`CryptContext.identify` returns exactly what a linear scan would.
+    """
+    def __init__(self, handlers):
+        self.handlers = handlers
+        trie = self.trie = {}
+        sized = self.sized = {}
+        wildcards = self.wildcards = []
+        for idx, handler in enumerate(handlers):
+            prefixes, size, chars = _get_identify_hints(handler)
+            if prefixes:
+                for prefix in prefixes:
+                    node = trie
+                    for c in prefix:
+                        node = node.setdefault(c, {})
+                    #NOTE: using None as key for list of handlers terminating at node
+                    node.setdefault(None, []).append(idx)
+            elif size:
+                if chars is not None:
+                    chars = frozenset(chars)
+                sized.setdefault(size, []).append((idx, chars))
+            else:
+                wildcards.append(idx)
+        self.wildcard_handlers = [ handlers[idx] for idx in wildcards ]
+
+    def _match_sized(self, hash, found):
+        "add any fixed-size handlers which may identify hash to found"
+        entries = self.sized.get(len(hash))
+        if entries:
+            chars = None
+            for idx, allowed in entries:
+                if allowed is not None:
+                    if chars is None:
+                        chars = frozenset(hash)
+                    if not chars <= allowed:
+                        continue
+                found.append(idx)
+
+    def candidates(self, hash):
+        "return list of handlers which may identify hash, in policy order"
+        if isinstance(hash, bytes):
+            try:
+                hash = hash.decode("ascii")
+            except UnicodeDecodeError:
+                #only the wildcard handlers could match a non-ascii hash
+                hash = u''
+
+        #walk prefix trie, collecting any handlers whose prefix matches
+        found = []
+        node = self.trie
+        for c in hash:
+            node = node.get(c)
+            if node is None:
+                break
+            if None in node:
+                found.extend(node[None])
+
+        #check fixed-size hashes
+        self._match_sized(hash, found)
+        if hash.endswith(u"\n"):
+            #handlers whose identify() uses a regex anchored with '$'
+            #will also accept a trailing newline, so check for them too.
+            self._match_sized(hash[:-1], found)
+
+        #merge with wildcards, preserving policy order
+        handlers = self.handlers
+        if not found:
+            return self.wildcard_handlers
+        found.extend(self.wildcards)
+        if len(found) > 1:
+            found = sorted(set(found))
+        return [ handlers[idx] for idx in found ]
+
+#--------------------------------------------------------
+#settings plans
+#--------------------------------------------------------
+class _SettingsPlan(object):
+    """precomputed encrypt() settings for a single (handler, category) pair.
+
+    instances are created by :meth:`CryptPolicy.compile`,
+    and should be treated as immutable.
+    they contain everything :meth:`CryptContext.encrypt` & :meth:`CryptContext.genconfig`
+    need from the policy, so that all that's left to do per call is
+    merging the defaults into the caller's settings, and picking
+    a random rounds value from the precomputed interval.
+
+    :arg handler: the handler this plan is for
+    :arg opts: the options dict returned by :meth:`CryptPolicy.get_options`.
+    """
+    __slots__ = ("handler", "defaults", "has_rounds", "min_rounds", "max_rounds",
+                 "lower_rounds", "upper_rounds", "_rounds_warning")
+
+    def __init__(self, handler, opts):
+        self.handler = handler
+
+        #default values for any settings (besides rounds) the handler accepts
+        setting_kwds = handler.setting_kwds
+        self.defaults = tuple(
+            (k, opts[k]) for k in setting_kwds
+            if k in opts and k != "rounds"
+            )
+
+        #precompute rounds bounds & default interval
+        self.has_rounds = 'rounds' in setting_kwds
+        self.min_rounds = mn = opts.get("min_rounds")
+        self.max_rounds = mx = opts.get("max_rounds")
+        self._rounds_warning = None
+        lower = upper = None
+        if 'rounds' in opts:
+            #explicit rounds setting - no variance applied
+            lower = upper = self._clip_rounds(opts['rounds'])
+        else:
+            df = opts.get("default_rounds") or mx or mn
+            if df is not None:
+                vr = opts.get("vary_rounds")
+                if vr:
+                    lower, upper = self._calc_vary_interval(handler, df, vr)
+                    if lower > upper:
+                        #NOTE: this mainly happens when default_rounds>max_rounds, which shouldn't usually happen
+                        self._rounds_warning = "vary default rounds: lower bound > upper bound, using upper bound (%d > %d)" % (lower, upper)
+                        lower = upper = self._clip_rounds(upper)
+                else:
+                    lower = upper = self._clip_rounds(df)
+        self.lower_rounds = lower
+        self.upper_rounds = upper
+
+    def _calc_vary_interval(self, handler, df, vr):
+        "calculate [lower, upper] interval of rounds values from default & vary_rounds"
+        mn = self.min_rounds
+        mx = self.max_rounds
+        if isinstance(vr, str):
+            rc = getattr(handler, "rounds_cost", "linear")
+            vr = int(vr.rstrip("%"))
+                #NOTE: deliberately strip >1 %,
+                #in case an interpolation-escaped %%
+                #makes it through to here.
+            assert 0 <= vr < 100
+            if rc == "log2":
+                #let % variance scale the number of actual rounds, not the logarithmic value
+                df = 2**df
+                vr = int(df*vr/100)
+                lower = int(logb(df-vr,2)+.5) #err on the side of strength - round up
+                upper = int(logb(df+vr,2))
+            else:
+                assert rc == "linear"
+                vr = int(df*vr/100)
+                lower = df-vr
+                upper = df+vr
+        else:
+            lower = df-vr
+            upper = df+vr
+        if lower < 1:
+            lower = 1
+        if mn and lower < mn:
+            lower = mn
+        if mx and upper > mx:
+            upper = mx
+        return lower, upper
+
+    def _clip_rounds(self, rounds):
+        "clip rounds value to policy's min/max rounds"
+        mx = self.max_rounds
+        if mx and rounds > mx:
+            rounds = mx
+        mn = self.min_rounds
+        if mn and rounds < mn: #give mn predence if mn > mx
+            rounds = mn
+        return rounds
+
+    def prepare(self, settings):
+        "merge policy defaults into (and modify) settings dict; returns settings"
+        for k, v in self.defaults:
+            if k not in settings:
+                settings[k] = v
+        if self.has_rounds:
+            rounds = settings.get("rounds")
+            if rounds is None:
+                lower = self.lower_rounds
+                if lower is not None:
+                    if self._rounds_warning:
+                        warn(self._rounds_warning)
+                    upper = self.upper_rounds
+                    if lower == upper:
+                        settings['rounds'] = lower
+                    else:
+                        settings['rounds'] = rng.randint(lower, upper)
+            else:
+                settings['rounds'] = self._clip_rounds(rounds)
+        return settings
+
 #--------------------------------------------------------
 #policy class proper
 #--------------------------------------------------------
@@ -177,10 +441,13 @@ class CryptPolicy(object):
     .. automethod:: has_schemes
     .. automethod:: schemes
     .. automethod:: iter_handlers
+    .. automethod:: iter_candidates
     .. automethod:: get_handler
     .. automethod:: get_options
     .. automethod:: handler_is_deprecated
     .. automethod:: get_min_verify_time
+    .. automethod:: get_backend
+    .. automethod:: compile
 
     Exporting
     =========
@@ -397,6 +664,16 @@ class CryptPolicy(object):
     # this is used to cache results of the get_option() method
     _cache = None
 
+    #:_IdentifyIndex instance built from _handlers, used by iter_candidates()
+    _index = None
+
+    #:dict mapping handler name -> handler
+    _handler_map = None
+
+    #:dict mapping (handler name or None, category) -> _SettingsPlan;
+    # filled in by compile()
+    _plans = None
+
     #=========================================================
     #init
     #=========================================================
@@ -453,6 +730,10 @@ class CryptPolicy(object):
             handlers.append(handler)
             handler_names.add(name)
 
+        #build name map & dispatch index used by identify()
+        self._handler_map = dict((h.name, h) for h in handlers)
+        self._index = _IdentifyIndex(handlers)
+
         #
         #build _deprecated & _default maps
         #
@@ -506,6 +787,17 @@ class CryptPolicy(object):
         "iterate through handlers for all schemes in policy"
         return iter(self._handlers)
 
+    def iter_candidates(self, hash):
+        """iterate through handlers which may identify the specified hash.
+
+        this returns the subset of :meth:`iter_handlers` which
+        could possibly recognize the hash (based on it's prefix, or
+        it's size for prefix-less formats), in the same order.
+        each handler's ``identify()`` method must still be called
+        to confirm the match.
+        """
+        return iter(self._index.candidates(hash))
+
     def schemes(self, resolve=False):
         "return list of supported schemes; if resolve=True, returns list of handlers instead"
         if resolve:
@@ -526,9 +818,9 @@ class CryptPolicy(object):
         :returns: handler attached to specified name or None
         """
         if name:
-            for handler in self._handlers:
-                if handler.name == name:
-                    return handler
+            handler = self._handler_map.get(name)
+            if handler is not None:
+                return handler
         else:
             fmap = self._default
             if category in fmap:
@@ -589,6 +881,16 @@ class CryptPolicy(object):
             if tmp:
                 kwds.update(tmp)
 
+        #replace rounds defaults w/ values measured on this host
+        target = kwds.get("target_time")
+        if target:
+            handler = self._handler_map.get(name)
+            if handler is not None and 'rounds' in handler.setting_kwds:
+                from passlib.calibrate import calibrate_rounds
+                mn, df = calibrate_rounds(handler, target)
+                kwds['default_rounds'] = df
+                kwds['min_rounds'] = max(mn, kwds.get("min_rounds") or 0)
+
         cache[key] = kwds
         return kwds
 
@@ -604,6 +906,22 @@ class CryptPolicy(object):
         else:
             return False
 
+    def get_backend(self, name):
+        """return backend requested for scheme via :samp:`{hash}__backend` option, or ``None``.
+
+        unlike :meth:`get_options`, this ignores user categories
+        (since backends are selected process-wide),
+        and doesn't trigger :samp:`{hash}__target_time` calibration.
+        """
+        if hasattr(name, "name"):
+            name = name.name
+        options = self._options[None]
+        for key in (name, "all"):
+            value = options.get(key, {}).get("backend")
+            if value:
+                return value
+        return None
+
     def get_min_verify_time(self, category=None):
         "return minimal time that verify() should take, according to this policy"
         mvmap = self._min_verify_time
@@ -614,6 +932,71 @@ class CryptPolicy(object):
         else:
             return 0
 
+    def compile(self):
+        """precompute settings plans for all schemes & categories in policy.
+
+        this resolves all the options for each combination of scheme
+        and category ahead of time (defaults, rounds bounds, ``vary_rounds``
+        interval, etc), so that :meth:`CryptContext.encrypt`
+        and :meth:`CryptContext.genconfig` don't need to recalculate them
+        each time they're called.
+
+        it will be called automatically the first time it's needed,
+        but may be called explicitly to front-load the work (eg during
+        application startup).
+
+        :returns: the policy object itself.
+        """
+        if self._plans is not None:
+            return self
+        handlers = self._handlers
+        categories = set(self._options)
+        categories.update(self._default)
+        categories.add(None)
+        plans = {}
+        for cat in categories:
+            for handler in handlers:
+                name = handler.name
+                #NOTE: options for categories w/o any settings of their own
+                #      are the same as the default category, so share those plans.
+                if cat is None or cat in self._options:
+                    plan = _SettingsPlan(handler, self.get_options(name, cat))
+                else:
+                    plan = plans.get((name, None)) or \
+                        _SettingsPlan(handler, self.get_options(name))
+                plans[name, cat] = plan
+            if handlers:
+                default = self.get_handler(None, cat)
+                if hasattr(default, "name"):
+                    plans[None, cat] = plans[default.name, cat]
+        self._plans = plans
+        return self
+
+    def get_plan(self, name=None, category=None):
+        """return precomputed :class:`!_SettingsPlan` for scheme & category.
+
+        :arg name: name of scheme, or ``None`` for the category's default scheme.
+        :param category: optional user category
+
+        :raises KeyError: if the scheme isn't part of this policy.
+        """
+        plans = self._plans
+        if plans is None:
+            plans = self.compile()._plans
+        try:
+            return plans[name, category]
+        except KeyError:
+            pass
+        #category w/o any configuration of it's own - use default category's plans.
+        if category is not None and category not in self._options and \
+                category not in self._default:
+            try:
+                return plans[name, None]
+            except KeyError:
+                pass
+        self.get_handler(name, category, required=True)
+        raise KeyError("no crypt algorithm by that name: %r" % (name,)) #pragma: no cover
+
     #=========================================================
     #serialization
     #=========================================================
@@ -769,6 +1152,534 @@ default_policy = _load_default_policy()
 #=========================================================
 #
 #=========================================================
+
+def _new_digest_key():
+    "generate random key for _verify_digest()"
+    if has_urandom:
+        return os.urandom(32)
+    else: #pragma: no cover
+        return getrandbytes(rng, 32)
+
+def _verify_digest(key, secret, hash, scheme=None):
+    "return HMAC-SHA256 digest identifying combination of secret, hash, and scheme"
+    hash = to_bytes(hash, "ascii", errname="hash")
+    secret = to_bytes(secret, "utf-8", errname="secret")
+    #NOTE: including length of hash so hash/secret boundary is unambiguous
+    h = hmac.new(key, to_bytes("%d:%s:" % (len(hash), scheme or "")), hashlib.sha256)
+    h.update(hash)
+    h.update(secret)
+    return h.digest()
+
+class _InflightCall(object):
+    "helper for _InflightCalls - state of a single in-progress call"
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _InflightCalls(object):
+    """helper for :attr:`CryptContext.coalesce_verify`.
+
+    tracks the verify() calls currently in progress, keyed by a digest
+    of their arguments, so that identical concurrent calls can wait
+    for (and share) the result of the first, instead of recalculating it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {} #key -> _InflightCall, for threaded callers
+        self.futures = {} #(loop id, key) -> future, for asyncio callers
+        self.key = _new_digest_key()
+
+    def make_key(self, secret, hash, scheme=None):
+        return _verify_digest(self.key, secret, hash, scheme)
+
+    def run(self, key, func):
+        "return ``func()``, or wait for result of identical call if one is already in progress"
+        lock = self.lock
+        with lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _InflightCall()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            try:
+                call.result = func()
+            except Exception, err:
+                call.error = err
+                raise
+        finally:
+            with lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    def run_async(self, loop, key, func):
+        "return future from ``func()``, or future of identical call if one is already in progress"
+        fkey = (id(loop), key)
+        futures = self.futures
+        with self.lock:
+            future = futures.get(fkey)
+            if future is None:
+                future = futures[fkey] = func()
+                def callback(future):
+                    with self.lock:
+                        futures.pop(fkey, None)
+                future.add_done_callback(callback)
+        return future
+
+class VerifyCache(object):
+    """cache of successful verifications, for use as :attr:`CryptContext.verify_cache`.
+
+    When attached to a :class:`CryptContext`, this remembers which
+    ``(secret, hash)`` pairs have recently verified successfully,
+    so that repeating the same check can skip calculating the hash.
+    This is mainly useful for service accounts and other machine credentials,
+    which may present the same password on every request.
+
+    :param maxsize:
+        maximum number of entries to hold (default 1024);
+        the least recently used entries are discarded first.
+
+    :param ttl:
+        number of seconds entries remain valid for (default 300).
+
+    :param categories:
+        optional list of the user categories this cache should be used for
+        (``None`` can be included to indicate the default category).
+        by default, the cache is used for all categories.
+
+    Entries are stored as an HMAC-SHA256 digest of the secret and hash,
+    keyed using a random key which is generated for each instance,
+    and never leaves the process; neither the secret nor the hash are stored.
+    Since the hash is part of the digest, changing a user's stored hash
+    automatically invalidates any entries for it.
+    Only successful verifications are cached.
+
+    .. attribute:: categories
+
+        set of categories the cache is enabled for, or ``None`` for all categories.
+        this may be modified to enable/disable the cache for particular categories.
+
+    .. automethod:: is_enabled
+    .. automethod:: clear
+    .. automethod:: stats
+    .. automethod:: reset_stats
+    """
+    #: policy the cached results were calculated under
+    #: (managed by CryptContext, which clears the cache if the policy changes)
+    policy = None
+
+    def __init__(self, maxsize=1024, ttl=300, categories=None):
+        self.ttl = ttl
+        if categories is not None:
+            categories = set(categories)
+        self.categories = categories
+        self._entries = LRUCache(maxsize)
+        self._key = _new_digest_key()
+        self._lock = threading.Lock() #guards hit/miss counters
+        self.reset_stats()
+
+    def __repr__(self):
+        return "<VerifyCache size=%d maxsize=%d ttl=%r>" % (len(self._entries),
+                                                            self._entries.maxsize, self.ttl)
+
+    def is_enabled(self, category=None):
+        "check if cache is enabled for the specified category"
+        categories = self.categories
+        return categories is None or category in categories
+
+    def make_key(self, secret, hash, scheme=None):
+        "return digest identifying combination of secret, hash, and scheme"
+        return _verify_digest(self._key, secret, hash, scheme)
+
+    def lookup(self, key):
+        "check if key is present & hasn't expired"
+        expires = self._entries.get(key)
+        if expires is None:
+            with self._lock:
+                self.misses += 1
+            return False
+        if expires < time.time():
+            self._entries.pop(key)
+            with self._lock:
+                self.expirations += 1
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key):
+        "add key to the cache"
+        self._entries.set(key, time.time() + self.ttl)
+
+    def clear(self):
+        "remove all entries from the cache"
+        self._entries.clear()
+
+    def reset_stats(self):
+        "reset hit/miss counters"
+        with self._lock:
+            self.hits = self.misses = self.expirations = 0
+        self._entries.reset_stats()
+
+    def stats(self):
+        """return dict of statistics about the cache.
+
+        this contains the keys ``size``, ``maxsize``,
+        ``hits``, ``misses``, ``hit_rate`` (from 0.0 to 1.0),
+        ``expirations``, and ``evictions``.
+        """
+        with self._lock:
+            hits, misses, expirations = self.hits, self.misses, self.expirations
+        total = hits + misses
+        return dict(
+            size=len(self._entries),
+            maxsize=self._entries.maxsize,
+            hits=hits,
+            misses=misses,
+            hit_rate=(float(hits) / total) if total else 0.0,
+            expirations=expirations,
+            evictions=self._entries.evictions,
+        )
+
+class HashingOverloaded(RuntimeError):
+    """error raised by :class:`ConcurrencyLimiter` when a hashing
+    call can't be started, because too many calls are already running
+    (and either the wait queue is full, or the wait timed out).
+
+    applications will typically want to catch this and return
+    a "service unavailable" response, rather than retrying.
+    """
+
+class _Lane(object):
+    "helper for ConcurrencyLimiter - slots & statistics for a single lane"
+    def __init__(self, limit):
+        self.limit = limit
+        self.cond = threading.Condition(threading.Lock())
+        self.active = 0
+        self.queued = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.max_queued = 0
+        self.total_wait = 0
+        self.max_wait = 0
+
+    def stats(self):
+        admitted = self.admitted
+        return dict(
+            limit=self.limit,
+            active=self.active,
+            queued=self.queued,
+            max_queued=self.max_queued,
+            admitted=admitted,
+            rejected=self.rejected,
+            timeouts=self.timeouts,
+            total_wait=self.total_wait,
+            max_wait=self.max_wait,
+            avg_wait=(self.total_wait / admitted) if admitted else 0.0,
+        )
+
+class ConcurrencyLimiter(object):
+    """limits how many hashing calls a :class:`CryptContext` runs at once.
+
+    When attached to a context as :attr:`CryptContext.limiter`,
+    calls to :meth:`~CryptContext.encrypt` and :meth:`~CryptContext.verify` (and co)
+    must obtain a slot before calculating a hash. When all slots are in use,
+    callers wait in a bounded queue; if the queue is full, or the wait times out,
+    :exc:`HashingOverloaded` is raised instead.
+
+    :arg max_concurrency:
+        maximum number of hashing calls which may run at once,
+        across all lanes (see *category_limits*).
+
+    :param max_queue:
+        maximum number of callers which may wait for a slot
+        (per lane, see below). ``0`` rejects callers immediately
+        if no slot is free. defaults to ``None`` (unbounded).
+
+    :param timeout:
+        maximum number of seconds callers will wait for a slot.
+        defaults to ``None`` (wait indefinitely).
+
+    :param category_limits:
+        optional dict mapping user categories to a number of slots.
+        each category listed gets it's own separate lane,
+        with it's own slots & queue; so that (for example) a flood
+        of logins in the default category can't prevent ``admin`` logins
+        from being processed. all other categories share the default lane.
+        the category slots are reserved out of *max_concurrency*:
+        the default lane gets whatever's left over, which must be at least 1.
+
+    Hashes answered by :attr:`CryptContext.verify_cache`, and callers
+    waiting on another call via :attr:`CryptContext.coalesce_verify`,
+    don't use up a slot.
+
+    .. automethod:: acquire
+    .. automethod:: release
+    .. automethod:: call
+    .. automethod:: stats
+    .. automethod:: reset_stats
+    """
+    def __init__(self, max_concurrency, max_queue=None, timeout=None, category_limits=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must be >= 0")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lanes = lanes = {}
+        remaining = max_concurrency
+        if category_limits:
+            for cat, limit in category_limits.iteritems():
+                if limit < 1:
+                    raise ValueError("category limit must be >= 1: %r" % (cat,))
+                lanes[cat] = _Lane(limit)
+                remaining -= limit
+            if remaining < 1:
+                raise ValueError("category limits must leave at least 1 of "
+                                 "max_concurrency's slots for the default lane")
+        lanes[None] = _Lane(remaining)
+
+    def __repr__(self):
+        return "<ConcurrencyLimiter max_concurrency=%d max_queue=%r timeout=%r>" % \
+            (self.max_concurrency, self.max_queue, self.timeout)
+
+    def acquire(self, category=None, blocking=True):
+        """wait for a free slot in category's lane.
+
+        :param blocking:
+            if ``False``, returns ``None`` immediately if no slot is free,
+            instead of waiting (or raising :exc:`HashingOverloaded`).
+
+        :returns: opaque token which must be passed to :meth:`release`.
+        :raises HashingOverloaded: if no slot could be obtained.
+        """
+        lane = self._lanes.get(category)
+        if lane is None:
+            lane = self._lanes[None]
+        cond = lane.cond
+        with cond:
+            if lane.active < lane.limit:
+                lane.active += 1
+                lane.admitted += 1
+                return lane
+            if not blocking:
+                return None
+            max_queue = self.max_queue
+            if max_queue is not None and lane.queued >= max_queue:
+                lane.rejected += 1
+                raise HashingOverloaded("too many concurrent hashing calls "
+                                        "(category=%r)" % (category,))
+            timeout = self.timeout
+            start = time.time()
+            lane.queued += 1
+            if lane.queued > lane.max_queued:
+                lane.max_queued = lane.queued
+            try:
+                while lane.active >= lane.limit:
+                    if timeout is None:
+                        cond.wait()
+                        continue
+                    remaining = start + timeout - time.time()
+                    if remaining <= 0:
+                        lane.rejected += 1
+                        lane.timeouts += 1
+                        raise HashingOverloaded("timed out waiting for hashing slot "
+                                                "(category=%r)" % (category,))
+                    cond.wait(remaining)
+            finally:
+                lane.queued -= 1
+            lane.active += 1
+            lane.admitted += 1
+            wait = time.time() - start
+            lane.total_wait += wait
+            if wait > lane.max_wait:
+                lane.max_wait = wait
+            return lane
+
+    def release(self, token):
+        "release slot obtained from :meth:`acquire`"
+        cond = token.cond
+        with cond:
+            token.active -= 1
+            cond.notify()
+
+    def call(self, category, func, *args, **kwds):
+        "call ``func(*args, **kwds)`` once a slot in category's lane is available"
+        lane = self.acquire(category)
+        try:
+            return func(*args, **kwds)
+        finally:
+            self.release(lane)
+
+    def stats(self):
+        """return dict mapping each lane's category (``None`` for the default lane)
+        to a dict of statistics about that lane.
+
+        these include the current number of ``active`` and ``queued`` calls,
+        the ``max_queued`` depth seen; the number of calls ``admitted``
+        and ``rejected`` (including ``timeouts``); and the ``total_wait``,
+        ``avg_wait``, and ``max_wait`` time (in seconds) admitted calls spent queued.
+        """
+        return dict((cat, lane.stats()) for cat, lane in self._lanes.iteritems())
+
+    def reset_stats(self):
+        "reset counters returned by :meth:`stats`"
+        for lane in self._lanes.itervalues():
+            with lane.cond:
+                lane.reset_stats()
+
+#: timer used for metrics (perf_counter has better resolution, where available)
+_timer = getattr(time, "perf_counter", time.time)
+
+def _get_backend_name(handler):
+    "helper for metrics - return name of handler's active backend, or None"
+    get_backend = getattr(handler, "get_backend", None)
+    if get_backend is None:
+        return None
+    try:
+        return get_backend()
+    except MissingBackendError:
+        return None
+
+class CryptMetrics(object):
+    """collects latency histograms & event counters for a :class:`CryptContext`.
+
+    When attached to a context as :attr:`CryptContext.metrics`
+    (or passed to :class:`~passlib.apache.HtpasswdFile`),
+    this records how long each ``identify``, ``verify``, and ``encrypt``
+    call took, grouped by scheme, backend, and category;
+    as well as counting the following events:
+
+    * ``verify_success``, ``verify_failure`` - outcome of verify calls.
+    * ``identify_miss`` - hashes which couldn't be identified.
+    * ``deprecated`` - hashes found to be using a deprecated scheme.
+    * ``needs_update`` - hashes which :meth:`~CryptContext.hash_needs_update` flagged for any reason.
+    * ``min_verify_time_overrun`` - verify calls which took longer than ``min_verify_time``.
+    * ``unknown_user`` - :meth:`HtpasswdFile.verify() <passlib.apache.HtpasswdFile.verify>`
+      calls for users not present in the file.
+
+    :param bucket_bounds:
+        optional list of upper bounds (in seconds) to use for the
+        latency histogram buckets; defaults to :attr:`bucket_bounds`.
+
+    .. attribute:: bucket_bounds
+
+        sorted tuple of the upper bounds (in seconds) of each histogram bucket.
+        latencies larger than the last bound are counted in an extra final bucket.
+
+    .. automethod:: snapshot
+    .. automethod:: reset
+    .. automethod:: get_count
+    """
+    bucket_bounds = (.0001, .00025, .0005, .001, .0025, .005, .01, .025,
+                     .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+    def __init__(self, bucket_bounds=None):
+        if bucket_bounds is not None:
+            self.bucket_bounds = tuple(sorted(bucket_bounds))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __repr__(self):
+        return "<CryptMetrics at 0x%x>" % (id(self),)
+
+    def observe(self, op, scheme, backend, category, elapsed):
+        "record latency (in seconds) of a single operation"
+        bounds = self.bucket_bounds
+        idx = bisect_left(bounds, elapsed)
+        key = (op, scheme, backend, category)
+        with self._lock:
+            entry = self._latency.get(key)
+            if entry is None:
+                entry = self._latency[key] = [0, 0.0, 0.0, [0] * (len(bounds) + 1)]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            entry[3][idx] += 1
+
+    def incr(self, name, scheme=None, category=None, count=1):
+        "increment named event counter"
+        key = (name, scheme, category)
+        with self._lock:
+            counters = self._counters
+            counters[key] = counters.get(key, 0) + count
+
+    def get_count(self, name, scheme=None, category=None):
+        "return current value of event counter"
+        return self._counters.get((name, scheme, category), 0)
+
+    def reset(self):
+        "reset all histograms & counters"
+        with self._lock:
+            self._latency = {}
+            self._counters = {}
+
+    def snapshot(self, reset=False):
+        """return current metrics as a dict of plain python objects,
+        suitable for exporting to a monitoring system.
+
+        :param reset:
+            if ``True``, the metrics are reset at the same time,
+            so that the next snapshot only contains new activity.
+
+        the dict has the following keys:
+
+        * ``bucket_bounds`` - list of histogram bucket bounds (seconds).
+        * ``latency`` - list of dicts, one per combination of
+          ``op``, ``scheme``, ``backend``, and ``category``; each containing
+          the ``count`` of calls, their ``total`` and ``max`` latency,
+          and the list of ``buckets`` counts (one more than ``bucket_bounds``).
+        * ``counters`` - list of dicts containing the ``name``, ``scheme``,
+          ``category``, and ``count`` of each event counter.
+        """
+        with self._lock:
+            latency = self._latency
+            counters = self._counters
+            if reset:
+                self._latency = {}
+                self._counters = {}
+            else:
+                latency = dict((k, v[:3] + [list(v[3])]) for k, v in latency.iteritems())
+                counters = counters.copy()
+        return dict(
+            bucket_bounds=list(self.bucket_bounds),
+            latency=[
+                dict(op=op, scheme=scheme, backend=backend, category=category,
+                     count=count, total=total, max=max, buckets=buckets)
+                for (op, scheme, backend, category), (count, total, max, buckets)
+                in latency.iteritems()
+            ],
+            counters=[
+                dict(name=name, scheme=scheme, category=category, count=count)
+                for (name, scheme, category), count in counters.iteritems()
+            ],
+        )
+
+def _check_parsed(info, secret):
+    "helper for CryptContext._verify_info() - verify secret against parsed hash object"
+    return info.checksum == info.calc_checksum(secret)
+
+#:underlying function of GenericHandler.verify(), used by CryptContext
+#:to detect handlers whose hashes can be verified via a single from_string() call
+_generic_verify = GenericHandler.verify.__func__
+
 class CryptContext(object):
     """Helper for encrypting passwords using different algorithms.
 
@@ -814,12 +1725,131 @@ class CryptContext(object):
     =================
     .. automethod:: hash_needs_update
     .. automethod:: verify_and_update
+
+    Batch Interface
+    ===============
+    .. automethod:: verify_many
+    .. automethod:: encrypt_many
+    .. automethod:: close_pool
+
+    .. attribute:: min_pool_batch
+
+        Batches smaller than this (default 64) are run in the current process,
+        rather than starting a pool of worker processes,
+        unless an explicit ``workers`` count is passed.
+
+    Asyncio Interface
+    =================
+    .. attribute:: executor
+
+        The :class:`!concurrent.futures.Executor` used to run the
+        ``*_async()`` methods listed below.
+        Defaults to ``None``, which uses the event loop's default executor.
+
+    .. automethod:: encrypt_async
+    .. automethod:: verify_async
+    .. automethod:: hash_needs_update_async
+    .. automethod:: verify_and_update_async
+
+    Caching
+    =======
+    .. attribute:: parse_cache
+
+        Optional :class:`~passlib.utils.LRUCache` instance, used to hold
+        the fields parsed from hash strings by :meth:`verify`,
+        :meth:`verify_and_update`, and :meth:`hash_needs_update`,
+        so that frequently checked hashes don't have to be re-parsed each time.
+        Defaults to ``None`` (disabled); can be enabled per context,
+        eg: ``ctx.parse_cache = LRUCache(1000)``.
+
+        The cache only holds information contained in the hash strings
+        themselves (salt, rounds, checksum, etc), never any secrets.
+        Entries are stored as immutable tuples, and a new handler object
+        is built from them each time, so cached state is never shared between threads.
+        It's :attr:`~passlib.utils.LRUCache.hits`, :attr:`~passlib.utils.LRUCache.misses`,
+        and :attr:`~passlib.utils.LRUCache.evictions` counters can be used to monitor it's effectiveness.
+
+    .. attribute:: verify_cache
+
+        Optional :class:`VerifyCache` instance, used to remember
+        recent successful calls to :meth:`verify` (and :meth:`verify_and_update`),
+        so that repeated checks of the same secret against the same hash
+        don't have to recalculate the hash each time.
+        Defaults to ``None`` (disabled).
+
+        .. warning::
+
+            This trades away some of the protection offered
+            by a slow hash algorithm: anyone able to read the process' memory
+            could use the cache to check password guesses quickly.
+            It's intended for machine credentials which are checked
+            frequently, see :class:`VerifyCache` for details.
+
+    Admission Control
+    =================
+    .. attribute:: limiter
+
+        Optional :class:`ConcurrencyLimiter` instance, used to limit
+        how many calls to :meth:`encrypt` and :meth:`verify` (and co)
+        will calculate hashes at the same time. When the limit has been
+        reached and the limiter's queue is full (or it's wait times out),
+        these methods will raise :exc:`HashingOverloaded`.
+        Defaults to ``None`` (no limit).
+
+    .. attribute:: coalesce_verify
+
+        If set to ``True``, concurrent calls to :meth:`verify` (and co)
+        with the same secret, hash, and scheme will wait for the first call
+        to finish and share it's result, rather than each calculating the hash.
+        This limits the cpu time spent on any one credential during bursts
+        of identical requests (eg client retry storms).
+        Works for both threaded callers, and the ``*_async()`` methods.
+        Defaults to ``False``.
+
+    Monitoring
+    ==========
+    .. attribute:: metrics
+
+        Optional :class:`CryptMetrics` instance, used to record
+        latency histograms & event counters for calls to :meth:`identify`,
+        :meth:`verify`, :meth:`encrypt`, :meth:`hash_needs_update`, and co.
+        Defaults to ``None`` (disabled).
+
+    .. seealso::
+
+        :mod:`passlib.utils.profiling`, which can break down
+        the time taken by each phase of these calls.
     """
     #===================================================================
     #instance attrs
     #===================================================================
     policy = None #policy object governing context
 
+    executor = None #executor used by *_async() methods, None uses loop's default
+
+    parse_cache = None #optional LRUCache of parsed hashes, keyed by (handler, hash)
+
+    verify_cache = None #optional VerifyCache of recent successful verifications
+
+    coalesce_verify = False #whether identical concurrent verify() calls should share a result
+
+    limiter = None #optional ConcurrencyLimiter restricting concurrent encrypt/verify calls
+
+    metrics = None #optional CryptMetrics instance
+    _inflight = None #_InflightCalls instance used by coalesce_verify
+    _policy = None #CryptPolicy instance backing the 'policy' property
+    _pending_backends = None #dict of handler -> backend not yet loaded (see _load_backends)
+
+    _pool = None #multiprocessing pool used by verify_many / encrypt_many
+    _pool_policy = None #policy the pool's workers were loaded with
+    _pool_workers = None #number of processes in pool
+    _pool_users = None #dict mapping pool -> number of batches currently using it
+    _pool_lock = threading.Lock() #guards pool attributes (shared by all contexts)
+
+    #: batches smaller than this run in the current process,
+    #: unless verify_many / encrypt_many are passed an explicit ``workers`` count.
+    min_pool_batch = 64
+
     #===================================================================
     #init
     #===================================================================
@@ -831,6 +1861,7 @@ class CryptContext(object):
             policy = CryptPolicy(**kwds)
         elif kwds:
             policy = policy.replace(**kwds)
+        self._inflight = _InflightCalls()
         self.policy = policy
 
     def __repr__(self):
@@ -853,78 +1884,60 @@ class CryptContext(object):
         """
         return CryptContext(policy=self.policy.replace(**kwds))
 
+    def _get_policy(self):
+        return self._policy
+
+    def _set_policy(self, policy):
+        self._policy = policy
+        self._load_backends()
+
+    policy = property(_get_policy, _set_policy, doc="""
+        :class:`CryptPolicy` instance used by this context.
+        assigning a new policy also activates any backends it requests
+        via :samp:`{hash}__backend`.
+        """)
+
+    def _load_backends(self):
+        """activate any backends requested by policy's :samp:`{hash}__backend` options.
+
+        ``"fastest"`` requires benchmarking the handler's backends,
+        so it's deferred until the handler is first used (see :meth:`_check_backend`).
+        """
+        policy = self.policy
+        options = policy._options[None]
+        pending = {}
+        for handler in policy.iter_handlers():
+            if not hasattr(handler, "set_backend"):
+                continue
+            backend = policy.get_backend(handler.name)
+            if not backend:
+                continue
+            if backend not in handler.backends and backend not in _special_backends and \
+                    not options.get(handler.name, {}).get("backend"):
+                #a specific backend named by 'all__backend' only applies
+                #to the handlers which offer it.
+                continue
+            if backend == "fastest":
+                pending[handler] = backend
+                continue
+            handler.set_backend(backend)
+        self._pending_backends = pending
+
+    def _check_backend(self, handler):
+        "helper for encrypt() & co - perform any backend selection :meth:`_load_backends` deferred for handler"
+        pending = self._pending_backends
+        if pending and handler in pending:
+            backend = pending.pop(handler, None)
+            if backend is not None:
+                handler.set_backend(backend)
+        return handler
+
     #===================================================================
     #policy adaptation
     #===================================================================
-    def _prepare_rounds(self, handler, opts, settings):
-        "helper for prepare_default_settings"
-        mn = opts.get("min_rounds")
-        mx = opts.get("max_rounds")
-        rounds = settings.get("rounds")
-        if rounds is None:
-            df = opts.get("default_rounds") or mx or mn
-            if df is not None:
-                vr = opts.get("vary_rounds")
-                if vr:
-                    if isinstance(vr, str):
-                        rc = getattr(handler, "rounds_cost", "linear")
-                        vr = int(vr.rstrip("%"))
-                            #NOTE: deliberately strip >1 %,
-                            #in case an interpolation-escaped %%
-                            #makes it through to here.
-                        assert 0 <= vr < 100
-                        if rc == "log2":
-                            #let % variance scale the number of actual rounds, not the logarithmic value
-                            df = 2**df
-                            vr = int(df*vr/100)
-                            lower = int(logb(df-vr,2)+.5) #err on the side of strength - round up
-                            upper = int(logb(df+vr,2))
-                        else:
-                            assert rc == "linear"
-                            vr = int(df*vr/100)
-                            lower = df-vr
-                            upper = df+vr
-                    else:
-                        lower = df-vr
-                        upper = df+vr
-                    if lower < 1:
-                        lower = 1
-                    if mn and lower < mn:
-                        lower = mn
-                    if mx and upper > mx:
-                        upper = mx
-                    if lower > upper:
-                        #NOTE: this mainly happens when default_rounds>max_rounds, which shouldn't usually happen
-                        rounds = upper
-                        warn("vary default rounds: lower bound > upper bound, using upper bound (%d > %d)" % (lower, upper))
-                    else:
-                        rounds = rng.randint(lower, upper)
-                else:
-                    rounds = df
-        if rounds is not None:
-            if mx and rounds > mx:
-                rounds = mx
-            if mn and rounds < mn: #give mn predence if mn > mx
-                rounds = mn
-            settings['rounds'] = rounds
-
     def _prepare_settings(self, handler, category=None, **settings):
         "normalize settings for handler according to context configuration"
-        opts = self.policy.get_options(handler, category)
-        if not opts:
-            return settings
-
-        #load in default values for any settings
-        for k in handler.setting_kwds:
-            if k not in settings and k in opts:
-                settings[k] = opts[k]
-
-        #handle rounds
-        if 'rounds' in handler.setting_kwds:
-            self._prepare_rounds(handler, opts, settings)
-
-        #done
-        return settings
+        return self.policy.get_plan(handler.name, category).prepare(settings)
 
     def hash_needs_update(self, hash, category=None):
         """check if hash is allowed by current policy, or if secret should be re-encrypted.
@@ -942,11 +1955,35 @@ class CryptContext(object):
 
         :returns: True/False
         """
-        handler = self.identify(hash, resolve=True, required=True)
+        handler = self.identify(hash, category, resolve=True, required=True)
+        return self._hash_needs_update(handler, hash, category)
+
+    def _hash_needs_update(self, handler, hash, category, info=None):
+        """helper for hash_needs_update() & verify_and_update().
+
+        :arg handler: handler which was identified for the hash
+        :arg info:
+            optional handler instance already parsed from the hash
+            (via ``handler.from_string()``), used to avoid parsing it again.
+        """
+        profiler = profiling.active
+        if profiler is None:
+            result = self._check_hash_policy(handler, hash, category, info)
+        else:
+            result = profiler.call(handler.name, "policy", self._check_hash_policy,
+                                   handler, hash, category, info)
+        if result and self.metrics is not None:
+            self.metrics.incr("needs_update", handler.name, category)
+        return result
+
+    def _check_hash_policy(self, handler, hash, category, info):
+        "helper for _hash_needs_update() - check if hash complies with policy"
         policy = self.policy
 
         #check if handler has been deprecated
         if policy.handler_is_deprecated(handler, category):
+            if self.metrics is not None:
+                self.metrics.incr("deprecated", handler.name, category)
             return True
 
         #get options, and call compliance helper (check things such as rounds, etc)
@@ -964,7 +2001,8 @@ class CryptContext(object):
             #check if we can parse hash to check it's rounds parameter
             if ('min_rounds' in opts or 'max_rounds' in opts) and \
                'rounds' in handler.setting_kwds and hasattr(handler, "from_string"):
-                    info = handler.from_string(hash)
+                    if info is None:
+                        info = self._parse_hash(handler, hash)
                     rounds = getattr(info, "rounds", None) #should generally work, but just in case
                     if rounds is not None:
                         min_rounds = opts.get("min_rounds")
@@ -990,9 +2028,8 @@ class CryptContext(object):
         directly is that this method will add in any policy-specific
         options relevant for the particular hash.
         """
-        handler = self.policy.get_handler(scheme, category, required=True)
-        settings = self._prepare_settings(handler, category, **settings)
-        return handler.genconfig(**settings)
+        plan = self.policy.get_plan(scheme, category)
+        return plan.handler.genconfig(**plan.prepare(settings))
 
     def genhash(self, secret, config, scheme=None, category=None, **context):
         """Call genhash() for specified handler.
@@ -1006,6 +2043,7 @@ class CryptContext(object):
             handler = self.policy.get_handler(scheme, required=True)
         else:
             handler = self.identify(config, resolve=True, required=True)
+        self._check_backend(handler)
         #XXX: could insert normalization to preferred unicode encoding here
         return handler.genhash(secret, config, **context)
 
@@ -1019,8 +2057,11 @@ class CryptContext(object):
             If ``True``, returns the handler itself,
             instead of the name of the handler.
 
-        All registered algorithms will be checked in from last to first,
+        All registered algorithms will be checked in order,
         and whichever one claims the hash first will be returned.
+        Algorithms which can't possibly match the hash (eg, because
+        it has the wrong prefix) are skipped via the policy's
+        dispatch index (see :meth:`CryptPolicy.iter_candidates`).
 
         :returns:
             The handler which first identifies the hash,
@@ -1031,15 +2072,27 @@ class CryptContext(object):
             if required:
                 raise ValueError("no hash specified")
             return None
-        handler = None
-        for handler in self.policy.iter_handlers():
+        policy = self.policy
+        metrics = self.metrics
+        profiler = profiling.active
+        if metrics is not None or profiler is not None:
+            start = _timer()
+        for handler in policy.iter_candidates(hash):
             if handler.identify(hash):
+                if metrics is not None:
+                    metrics.observe("identify", handler.name, None, category, _timer() - start)
+                if profiler is not None:
+                    profiler.record(handler.name, "identify", _timer() - start)
                 if resolve:
                     return handler
                 else:
                     return handler.name
+        if metrics is not None:
+            metrics.incr("identify_miss", None, category)
+        if profiler is not None:
+            profiler.record(None, "identify", _timer() - start)
         if required:
-            if handler is None:
+            if not policy.has_schemes():
                 raise KeyError("no crypt algorithms supported")
             raise ValueError("hash could not be identified")
         return None
@@ -1063,10 +2116,28 @@ class CryptContext(object):
         :returns:
             The secret as encoded by the specified algorithm and options.
         """
-        handler = self.policy.get_handler(scheme, category, required=True)
-        kwds = self._prepare_settings(handler, category, **kwds)
+        plan = self.policy.get_plan(scheme, category)
+        handler = self._check_backend(plan.handler)
+        profiler = profiling.active
+        if profiler is None:
+            settings = plan.prepare(kwds)
+        else:
+            settings = profiler.call(handler.name, "policy", plan.prepare, kwds)
         #XXX: could insert normalization to preferred unicode encoding here
-        return handler.encrypt(secret, **kwds)
+        limiter = self.limiter
+        metrics = self.metrics
+        if metrics is None:
+            if limiter is None:
+                return handler.encrypt(secret, **settings)
+            return limiter.call(category, handler.encrypt, secret, **settings)
+        start = _timer()
+        if limiter is None:
+            result = handler.encrypt(secret, **settings)
+        else:
+            result = limiter.call(category, handler.encrypt, secret, **settings)
+        metrics.observe("encrypt", handler.name, _get_backend_name(handler),
+                        category, _timer() - start)
+        return result
 
     def verify(self, secret, hash, scheme=None, category=None, **context):
         """verify secret against specified hash.
@@ -1103,11 +2174,42 @@ class CryptContext(object):
         if mvt:
             start = time.time()
 
+        handler, result = self._verify(secret, hash, scheme, category, context)
+
+        if mvt:
+            #delta some amount of time if verify took less than mvt seconds
+            delta = self._get_verify_delay(handler, mvt, start, category)
+            if delta > 0:
+                self._pad_verify(handler, delta)
+
+        return result
+
+    def _verify(self, secret, hash, scheme, category, context):
+        "helper for verify() & co; returns ``(handler, result)``, ignoring min_verify_time"
+        handler, result, info = self._verify_info(secret, hash, scheme, category, context)
+        return handler, result
+
+    def _verify_info(self, secret, hash, scheme, category, context, handler=None):
+        """helper for verify() & co.
+
+        returns ``(handler, result, info)``,
+        where *info* is the handler instance parsed from the hash
+        (or ``None`` if the handler doesn't support that).
+        for handlers using :meth:`GenericHandler.verify` as-is,
+        this parses the hash once (or fetches it from :attr:`parse_cache`),
+        and verifies using the parsed object,
+        so that :meth:`_hash_needs_update` doesn't have to parse it again.
+
+        if *handler* is specified, it's assumed to have already been located
+        via :meth:`_get_verify_handler`.
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            start = _timer()
+
         #locate handler
-        if scheme:
-            handler = self.policy.get_handler(scheme, required=True)
-        else:
-            handler = self.identify(hash, resolve=True, required=True)
+        if handler is None:
+            handler = self._get_verify_handler(hash, scheme, category)
 
         #strip context kwds if scheme doesn't use them
         ##for k in context.keys():
@@ -1116,21 +2218,111 @@ class CryptContext(object):
 
         #XXX: could insert normalization to preferred unicode encoding here
 
+        #check if secret was recently verified against this hash
+        cache = self._get_verify_cache(category, context)
+        if cache is not None:
+            key = cache.make_key(secret, hash, scheme)
+            if cache.lookup(key):
+                if metrics is not None:
+                    self._record_verify(metrics, handler, category, _timer() - start, True)
+                return handler, True, None
+        else:
+            key = None
+
         #use handler to verify secret
-        result = handler.verify(secret, hash, **context)
+        #NOTE: when profiling, using handler.verify() so it can record it's phases.
+        if context or getattr(handler.verify, "__func__", None) is not _generic_verify \
+                or profiling.active is not None:
+            info = None
+            func = partial(handler.verify, secret, hash, **context)
+        else:
+            info = self._parse_hash(handler, hash)
+            func = partial(_check_parsed, info, secret)
+        if self.limiter is not None:
+            func = partial(self.limiter.call, category, func)
+        if self.coalesce_verify and not context:
+            #share result with any identical calls already in progress
+            inflight = self._inflight
+            result = inflight.run(inflight.make_key(secret, hash, scheme), func)
+        else:
+            result = func()
+        if result and key is not None:
+            cache.store(key)
+        if metrics is not None:
+            self._record_verify(metrics, handler, category, _timer() - start, result)
+        return handler, result, info
+
+    def _get_verify_handler(self, hash, scheme, category):
+        "helper for _verify_info() & co - return handler which should verify hash"
+        if scheme:
+            handler = self.policy.get_handler(scheme, required=True)
+        else:
+            handler = self.identify(hash, category, resolve=True, required=True)
+        return self._check_backend(handler)
 
-        if mvt:
-            #delta some amount of time if verify took less than mvt seconds
-            end = time.time()
-            delta = mvt + start - end
-            if delta > 0:
-                time.sleep(delta)
-            elif delta < 0:
-                #warn app they aren't being protected against timing attacks...
-                warn("CryptContext: verify exceeded min_verify_time: scheme=%r min_verify_time=%r elapsed=%r" %
-                     (handler.name, mvt, end-start))
+    def _get_verify_cache(self, category, context):
+        "helper for _verify_info() & co - return :attr:`verify_cache` if it applies to call, else ``None``"
+        cache = self.verify_cache
+        if cache is None or context or not cache.is_enabled(category):
+            return None
+        if cache.policy is not self.policy:
+            #policy was replaced, previous results may no longer apply
+            cache.clear()
+            cache.policy = self.policy
+        return cache
+
+    def _record_verify(self, metrics, handler, category, elapsed, result):
+        "helper for _verify_info() & co - record verify latency & outcome"
+        name = handler.name
+        metrics.observe("verify", name, _get_backend_name(handler), category, elapsed)
+        if result:
+            metrics.incr("verify_success", name, category)
+        else:
+            metrics.incr("verify_failure", name, category)
 
-        return result
+    def _parse_hash(self, handler, hash):
+        """helper to parse hash via ``handler.from_string()``, using :attr:`parse_cache` if enabled.
+
+        the cache holds an immutable tuple of the parsed instance's attributes
+        (salt, rounds, checksum, ident, etc), rather than the instance itself;
+        each call returns a new instance built from that tuple, which the caller
+        is free to modify without affecting other threads.
+        """
+        cache = self.parse_cache
+        if cache is None:
+            return handler.from_string(hash)
+        key = (handler, hash)
+        state = cache.get(key)
+        if state is None:
+            info = handler.from_string(hash)
+            if getattr(info, "__dict__", None) is not None:
+                cache.set(key, tuple(info.__dict__.iteritems()))
+            return info
+        #NOTE: values were validated when the hash was first parsed,
+        #      so this bypasses the constructor.
+        info = handler.__new__(handler)
+        info.__dict__.update(state)
+        return info
+
+    def _get_verify_delay(self, handler, mvt, start, category=None):
+        "helper for verify() & co; returns remaining time needed to reach min_verify_time"
+        end = time.time()
+        delta = mvt + start - end
+        if delta < 0:
+            if self.metrics is not None:
+                self.metrics.incr("min_verify_time_overrun", handler.name, category)
+            #warn app they aren't being protected against timing attacks...
+            warn("CryptContext: verify exceeded min_verify_time: scheme=%r min_verify_time=%r elapsed=%r" %
+                 (handler.name, mvt, end-start))
+        return delta
+
+    def _pad_verify(self, handler, delta):
+        "helper for verify() & co; sleeps to honor min_verify_time"
+        profiler = profiling.active
+        if profiler is None:
+            time.sleep(delta)
+        else:
+            profiler.call(handler.name, "pad", time.sleep, delta)
 
     def verify_and_update(self, secret, hash, scheme=None, category=None, **kwds):
         """verify secret and check if hash needs upgrading, in a single call.
@@ -1171,18 +2363,518 @@ class CryptContext(object):
 
         .. seealso:: :ref:`context-migrating-passwords` for a usage example.
         """
-        ok = self.verify(secret, hash, scheme=scheme, category=category, **kwds)
+        #quick checks
+        if hash is None:
+            return False, None
+
+        mvt = self.policy.get_min_verify_time(category)
+        if mvt:
+            start = time.time()
+
+        handler, ok, info = self._verify_info(secret, hash, scheme, category, kwds)
+
+        if mvt:
+            #delta some amount of time if verify took less than mvt seconds
+            delta = self._get_verify_delay(handler, mvt, start, category)
+            if delta > 0:
+                self._pad_verify(handler, delta)
+
         if not ok:
             return False, None
-        if self.hash_needs_update(hash, category=category):
+        if self._hash_needs_update(handler, hash, category, info):
             return True, self.encrypt(secret, category=category, **kwds)
         else:
             return True, None
 
+    #===================================================================
+    #asyncio interface
+    #===================================================================
+    #NOTE: these are written as plain methods returning asyncio futures
+    #      (rather than as coroutines), so this module can still be
+    #      parsed by python 2; the results can be awaited just the same.
+
+    def _run_async(self, func, *args, **kwds):
+        "helper for *_async() methods - run func in executor, returning future"
+        loop = _get_event_loop()
+        return loop.run_in_executor(self.executor, partial(func, *args, **kwds))
+
+    def encrypt_async(self, secret, scheme=None, category=None, **kwds):
+        """asyncio version of :meth:`encrypt`.
+
+        the hash is calculated using the context's :attr:`executor`,
+        so the event loop isn't blocked while it's running.
+
+        :returns: future which will contain the resulting hash.
+        """
+        return self._run_async(self.encrypt, secret, scheme, category, **kwds)
+
+    def hash_needs_update_async(self, hash, category=None):
+        """asyncio version of :meth:`hash_needs_update`.
+
+        :returns: future which will contain ``True`` or ``False``.
+        """
+        return self._run_async(self.hash_needs_update, hash, category)
+
+    def verify_async(self, secret, hash, scheme=None, category=None, **context):
+        """asyncio version of :meth:`verify`.
+
+        the hash is calculated using the context's :attr:`executor`,
+        so the event loop isn't blocked while it's running.
+        if the policy specifies a ``min_verify_time``, the remaining time
+        is waited out using an event loop timer, rather than :func:`!time.sleep`.
+
+        :returns: future which will contain ``True`` or ``False``.
+        """
+        loop = _get_event_loop()
+        if hash is None:
+            return _get_done_future(loop, False)
+        mvt = self.policy.get_min_verify_time(category)
+        start = time.time()
+        if self.coalesce_verify and not context:
+            inflight = self._inflight
+            inner = inflight.run_async(loop, inflight.make_key(secret, hash, scheme),
+                partial(self._run_async, self._verify, secret, hash, scheme, category, context))
+        else:
+            inner = self._run_async(self._verify, secret, hash, scheme, category, context)
+        return self._pad_async(loop, inner, mvt, start, category)
+
+    def verify_and_update_async(self, secret, hash, scheme=None, category=None, **kwds):
+        """asyncio version of :meth:`verify_and_update`.
+
+        :returns: future which will contain the tuple ``(verified, new_hash)``.
+        """
+        loop = _get_event_loop()
+        if hash is None:
+            return _get_done_future(loop, (False, None))
+        mvt = self.policy.get_min_verify_time(category)
+        start = time.time()
+
+        def helper():
+            handler, ok, info = self._verify_info(secret, hash, scheme, category, kwds)
+            #NOTE: recording verify time now, so any re-encrypt
+            #      doesn't count against min_verify_time.
+            delay = mvt and self._get_verify_delay(handler, mvt, start, category)
+            if not ok:
+                return delay, (False, None)
+            if self._hash_needs_update(handler, hash, category, info):
+                return delay, (True, self.encrypt(secret, category=category, **kwds))
+            else:
+                return delay, (True, None)
+
+        inner = self._run_async(helper)
+        return self._pad_async(loop, inner, None, start)
+
+    def _pad_async(self, loop, inner, mvt, start, category=None):
+        """helper for verify_async() & co.
+
+        takes in future containing ``(handler, result)``
+        (or ``(delay, result)`` if ``mvt=None``),
+        returns future which will contain ``result``,
+        once min_verify_time has elapsed.
+        """
+        outer = _create_future(loop)
+
+        def callback(inner):
+            if outer.cancelled():
+                return
+            if inner.cancelled():
+                outer.cancel()
+                return
+            err = inner.exception()
+            if err is not None:
+                outer.set_exception(err)
+                return
+            value, result = inner.result()
+            if mvt is None:
+                delay = value
+            else:
+                delay = mvt and self._get_verify_delay(value, mvt, start, category)
+            if delay > 0:
+                loop.call_later(delay, _set_future_result, outer, result)
+            else:
+                outer.set_result(result)
+
+        inner.add_done_callback(callback)
+        return outer
+
+    #===================================================================
+    #batch interface
+    #===================================================================
+    def _get_workers(self, workers, count):
+        "helper for verify_many / encrypt_many - return number of worker processes to use for batch"
+        if multiprocessing is None:
+            return 1
+        if workers is None:
+            if count < self.min_pool_batch:
+                return 1
+            try:
+                workers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                return 1
+        return workers
+
+    def _acquire_pool(self, workers):
+        """helper for _run_batch - return pool w/ specified number of workers.
+
+        the pool is marked as in use, and must be passed to :meth:`_release_pool`
+        once the caller is done with it.
+        """
+        policy = self.policy
+        old = None
+        with self._pool_lock:
+            users = self._pool_users
+            if users is None:
+                users = self._pool_users = {}
+            pool = self._pool
+            if pool is not None and (self._pool_policy is not policy or
+                                     self._pool_workers != workers):
+                old = self._retire_pool()
+                pool = None
+            if pool is None:
+                #NOTE: each worker builds it's own copy of the context once,
+                #      and keeps it for the lifetime of the pool.
+                pool = self._pool = multiprocessing.Pool(workers, _init_batch_worker,
+                                                         (policy,))
+                self._pool_policy = policy
+                self._pool_workers = workers
+            users[pool] = users.get(pool, 0) + 1
+        if old is not None:
+            _shutdown_pool(old)
+        return pool
+
+    def _release_pool(self, pool):
+        "helper for _run_batch - release pool obtained from :meth:`_acquire_pool`"
+        with self._pool_lock:
+            users = self._pool_users
+            count = users[pool] - 1
+            if count or pool is self._pool:
+                users[pool] = count
+                return
+            #pool was retired while in use, and this was it's last user
+            del users[pool]
+        _shutdown_pool(pool)
+
+    def _retire_pool(self):
+        """helper for pool management - detach current pool from context (must hold :attr:`_pool_lock`).
+
+        returns the pool if it should be shut down by the caller,
+        or ``None`` if there's no pool, or it's still in use
+        (in which case it'll be shut down by the last :meth:`_release_pool` call).
+        """
+        pool = self._pool
+        self._pool = self._pool_policy = self._pool_workers = None
+        if pool is None:
+            return None
+        users = self._pool_users
+        if users.get(pool):
+            return None
+        users.pop(pool, None)
+        return pool
+
+    def _run_batch(self, func, items, options, workers, chunksize):
+        "helper for verify_many / encrypt_many - *workers* should come from :meth:`_get_workers`"
+        if not items:
+            return []
+        if workers < 2:
+            return func((self, options, items))
+        pool = self._acquire_pool(workers)
+        try:
+            if not chunksize:
+                chunksize, extra = divmod(len(items), workers*4)
+                if extra:
+                    chunksize += 1
+            tasks = [
+                (None, options, items[idx:idx+chunksize])
+                for idx in xrange(0, len(items), chunksize)
+            ]
+            result = []
+            for chunk in pool.map(func, tasks):
+                result.extend(chunk)
+            return result
+        finally:
+            self._release_pool(pool)
+
+    def _acquire_slots(self, category, count):
+        """helper for verify_many - obtain up to *count* limiter slots for category.
+
+        waits for the first slot as usual, then takes as many more as are free
+        (without waiting, so that concurrent batches can't deadlock each other).
+        returns list of tokens, which must each be passed to ``limiter.release()``.
+        """
+        limiter = self.limiter
+        tokens = [ limiter.acquire(category) ]
+        while len(tokens) < count:
+            token = limiter.acquire(category, blocking=False)
+            if token is None:
+                break
+            tokens.append(token)
+        return tokens
+
+    def verify_many(self, pairs, scheme=None, category=None, workers=None,
+                    chunksize=None, **context):
+        """verify a batch of secrets against their hashes, in parallel.
+
+        This is a batch version of :meth:`verify`, meant for
+        bulk operations such as importing credentials from another system.
+        The work is split into chunks, and handed off to a pool of worker
+        processes (each of which keeps a copy of this context), so that
+        all cpu cores can be used, instead of just the one
+        running the current thread.
+
+        :arg pairs:
+            sequence of ``(secret, hash)`` tuples.
+        :param scheme:
+            optional force context to use specfic scheme
+            (must be listed in context).
+        :param category:
+            optional user category, if used by the application.
+        :param workers:
+            number of worker processes to use. defaults to the number of cpus,
+            except that batches smaller than :attr:`min_pool_batch` (64) run
+            in the current process. if set to ``1`` (or if :mod:`!multiprocessing`
+            isn't available), everything runs in the current process.
+        :param chunksize:
+            number of pairs to send to a worker at a time.
+            by default, the batch is split into ``4*workers`` chunks.
+        :param \*\*context:
+            all additional keywords are passed to the appropriate handler.
+
+        :returns:
+            list of ``True``/``False`` values, in the same order as ``pairs``.
+
+        Each pair is checked against :attr:`verify_cache`, run through
+        :attr:`limiter`, and recorded in :attr:`metrics`, just as :meth:`verify` would.
+        When worker processes are used, the cache is consulted (and updated)
+        by the current process, the limiter must admit one call per worker process
+        (fewer workers are used if fewer slots are free), and only the verify
+        outcome counters are recorded (the worker processes' latencies
+        aren't visible to this process).
+
+        .. note::
+
+            unlike :meth:`verify`, this method does not honor the
+            ``min_verify_time`` option; and any error raised while
+            verifying one of the pairs will be raised for the whole batch.
+
+        .. note::
+
+            large batches of :class:`~passlib.hash.md5_crypt`,
+            :class:`~passlib.hash.apr_md5_crypt` and :class:`~passlib.hash.phpass`
+            hashes are verified all at once, using :mod:`passlib.utils.md5_batch`,
+            if numpy is installed. likewise, batches of des-based hashes
+            are verified using :func:`passlib.utils.des.mdes_encrypt_int_blocks`.
+        """
+        pairs = list(pairs)
+        workers = self._get_workers(workers, len(pairs))
+        if workers < 2 or not pairs:
+            return self._verify_pairs(pairs, scheme, category, context)
+
+        #worker processes only have a copy of the policy, not this context's
+        #verify_cache / limiter / metrics; so those are handled here.
+        limiter = self.limiter
+        tokens = None
+        if limiter is not None:
+            #take one slot per worker process
+            tokens = self._acquire_slots(category, workers)
+            if len(tokens) < 2:
+                limiter.release(tokens[0])
+                return self._verify_pairs(pairs, scheme, category, context)
+            workers = len(tokens)
+        try:
+            cache = self._get_verify_cache(category, context)
+            metrics = self.metrics
+            result = [ False ] * len(pairs)
+            handlers = {}
+            keys = {}
+            todo = []
+            for idx, (secret, hash) in enumerate(pairs):
+                if hash is None:
+                    continue
+                if metrics is not None:
+                    handlers[idx] = self._get_verify_handler(hash, scheme, category)
+                if cache is not None:
+                    key = cache.make_key(secret, hash, scheme)
+                    if cache.lookup(key):
+                        result[idx] = True
+                        continue
+                    keys[idx] = key
+                todo.append(idx)
+            if todo:
+                oks = self._run_batch(_verify_batch_chunk, [ pairs[idx] for idx in todo ],
+                                      (scheme, category, context), workers, chunksize)
+                for idx, ok in zip(todo, oks):
+                    result[idx] = ok
+                    if ok and cache is not None:
+                        cache.store(keys[idx])
+        finally:
+            if tokens:
+                for token in tokens:
+                    limiter.release(token)
+        if metrics is not None:
+            for idx, handler in handlers.iteritems():
+                metrics.incr("verify_success" if result[idx] else "verify_failure",
+                             handler.name, category)
+        return result
+
+    def _verify_pairs(self, pairs, scheme, category, context):
+        """helper for verify_many() - verify list of ``(secret, hash)`` pairs in current process.
+
+        each pair goes through the same path as :meth:`verify`
+        (minus ``min_verify_time``), except that pairs belonging to handlers
+        which provide a ``_verify_batch()`` hook (e.g. md5_crypt), and which
+        aren't in :attr:`verify_cache`, are set aside & handed off in one go at the end,
+        since those handlers can check many hashes faster at once.
+        """
+        result = []
+        batches = {}
+        batchable = not context and profiling.active is None
+        for secret, hash in pairs:
+            if hash is None:
+                result.append(False)
+                continue
+            handler = self._get_verify_handler(hash, scheme, category)
+            if batchable and hasattr(handler, "_verify_batch"):
+                batches.setdefault(handler, []).append(len(result))
+                result.append(None)
+                continue
+            result.append(self._verify_info(secret, hash, scheme, category,
+                                            context, handler)[1])
+        for handler, indices in batches.iteritems():
+            self._verify_handler_batch(handler, pairs, indices, scheme, category, result)
+        return result
+
+    def _verify_handler_batch(self, handler, pairs, indices, scheme, category, result):
+        """helper for _verify_pairs() - verify ``pairs[idx]`` for each idx in indices
+        via ``handler._verify_batch()``, storing outcome in ``result[idx]``.
+        """
+        metrics = self.metrics
+        cache = self._get_verify_cache(category, None)
+        keys = {}
+        todo = []
+        for idx in indices:
+            if cache is not None:
+                start = _timer()
+                secret, hash = pairs[idx]
+                key = cache.make_key(secret, hash, scheme)
+                if cache.lookup(key):
+                    result[idx] = True
+                    if metrics is not None:
+                        self._record_verify(metrics, handler, category, _timer() - start, True)
+                    continue
+                keys[idx] = key
+            todo.append(idx)
+        if not todo:
+            return
+        start = _timer()
+        func = partial(handler._verify_batch, [ pairs[idx] for idx in todo ])
+        if self.limiter is not None:
+            func = partial(self.limiter.call, category, func)
+        oks = func()
+        #NOTE: batch is timed as a whole, so each hash is recorded w/ it's share of the time.
+        elapsed = (_timer() - start) / len(todo)
+        for idx, ok in zip(todo, oks):
+            result[idx] = ok
+            if ok and cache is not None:
+                cache.store(keys[idx])
+            if metrics is not None:
+                self._record_verify(metrics, handler, category, elapsed, ok)
+
+    def encrypt_many(self, secrets, scheme=None, category=None, workers=None,
+                     chunksize=None, **kwds):
+        """encrypt a batch of secrets, in parallel.
+
+        This is a batch version of :meth:`encrypt`;
+        it accepts the same ``workers`` and ``chunksize`` options
+        as :meth:`verify_many`.
+
+        :arg secrets: sequence of secrets to encrypt.
+
+        :returns: list of hashes, in the same order as ``secrets``.
+        """
+        secrets = list(secrets)
+        return self._run_batch(_encrypt_batch_chunk, secrets,
+                               (scheme, category, kwds),
+                               self._get_workers(workers, len(secrets)), chunksize)
+
+    def close_pool(self):
+        """shut down the worker processes used by :meth:`verify_many` / :meth:`encrypt_many`.
+
+        the pool is created the first time it's needed, and kept around
+        for reuse by later calls; this method may be called to release it
+        (it will be recreated if needed again). if another thread is
+        still using the pool, it's shut down once that call finishes.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                return
+            pool = self._retire_pool()
+        if pool is not None:
+            _shutdown_pool(pool)
+
     #=========================================================
     #eoc
     #=========================================================
 
+#=========================================================
+#asyncio helpers
+#=========================================================
+def _get_event_loop():
+    "helper for CryptContext's *_async() methods"
+    if asyncio is None:
+        raise RuntimeError("CryptContext's *_async() methods require asyncio (python 3.4+)")
+    return asyncio.get_event_loop()
+
+def _create_future(loop):
+    "create future attached to event loop"
+    if hasattr(loop, "create_future"):
+        return loop.create_future()
+    return asyncio.Future(loop=loop) #pragma: no cover -- py34 compat
+
+def _get_done_future(loop, result):
+    "return future which already contains result"
+    future = _create_future(loop)
+    future.set_result(result)
+    return future
+
+def _set_future_result(future, result):
+    "set result of future, unless it's been cancelled"
+    if not future.done():
+        future.set_result(result)
+
+#=========================================================
+#batch worker helpers
+#=========================================================
+#: context used by worker processes; set by _init_batch_worker()
+_batch_context = None
+
+def _init_batch_worker(policy):
+    "initializer for CryptContext's worker processes"
+    global _batch_context
+    _batch_context = CryptContext(policy=policy)
+    if not has_urandom:
+        #make sure forked workers don't generate the same salts
+        rng.seed(genseed(rng))
+
+def _shutdown_pool(pool):
+    "helper for CryptContext's pool management - shut down worker processes"
+    pool.close()
+    pool.join()
+
+def _verify_batch_chunk(task):
+    "verify chunk of (secret, hash) pairs in worker process; called by CryptContext.verify_many"
+    context, (scheme, category, kwds), pairs = task
+    if context is None:
+        context = _batch_context
+    return context._verify_pairs(pairs, scheme, category, kwds)
+
+def _encrypt_batch_chunk(task):
+    "encrypt chunk of secrets; called by CryptContext.encrypt_many"
+    context, (scheme, category, kwds), secrets = task
+    if context is None:
+        context = _batch_context
+    encrypt = context.encrypt
+    return [ encrypt(secret, scheme, category, **kwds) for secret in secrets ]
+
 class LazyCryptContext(CryptContext):
     """CryptContext subclass which doesn't load handlers until needed.
 
@@ -1234,16 +2926,21 @@ class LazyCryptContext(CryptContext):
         super(LazyCryptContext, self).__init__(**kwds)
 
     #NOTE: 'policy' property calls _lazy_init the first time it's accessed,
-    #      and relies on CryptContext.__init__ to replace it with an actual instance.
-    #      it should then have no more effect from then on.
+    #      and from then on acts just like CryptContext.policy.
     class _PolicyProperty(object):
 
         def __get__(self, obj, cls):
             if obj is None:
                 return self
-            obj._lazy_init()
-            assert isinstance(obj.policy, CryptPolicy)
-            return obj.policy
+            if obj._lazy_kwds is not None:
+                obj._lazy_init()
+            assert isinstance(obj._policy, CryptPolicy)
+            return obj._policy
+
+        def __set__(self, obj, value):
+            if obj._lazy_kwds is not None:
+                obj._lazy_init()
+            CryptContext._set_policy(obj, value)
 
     policy = _PolicyProperty()
 
@@ -25,7 +25,7 @@ try:
 except ImportError: #pragma: no cover - though should run whole suite w/o bcryptor installed
     bcryptor_engine = None
 #libs
-from passlib.utils import safe_os_crypt, classproperty, handlers as uh, \
+from passlib.utils import safe_os_crypt, os_crypt_supports, safe_crypt_r, crypt_r_supports, classproperty, handlers as uh, \
     h64, to_hash_str, rng, getrandstr, bytes
 
 #pkg
@@ -194,7 +194,7 @@ class bcrypt(uh.HasManyIdents, uh.HasRounds, uh.HasSalt, uh.HasManyBackends, uh.
     #=========================================================
     #primary interface
     #=========================================================
-    backends = ("pybcrypt", "bcryptor", "os_crypt")
+    backends = ("pybcrypt", "bcryptor", "os_crypt", "crypt_r")
 
     @classproperty
     def _has_backend_pybcrypt(cls):
@@ -208,8 +208,13 @@ class bcrypt(uh.HasManyIdents, uh.HasRounds, uh.HasSalt, uh.HasManyBackends, uh.
     def _has_backend_os_crypt(cls):
         h1 = u'$2$04$......................1O4gOrCYaqBG3o/4LnT2ykQUt1wbyju'
         h2 = u'$2a$04$......................qiOQjkB8hxU8OzRhS.GhRMa4VUnkPty'
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h1)[1]==h1 and
-                    safe_os_crypt(u"test", h2)[1]==h2)
+        return os_crypt_supports(h1, h2)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h1 = u'$2$04$......................1O4gOrCYaqBG3o/4LnT2ykQUt1wbyju'
+        h2 = u'$2a$04$......................qiOQjkB8hxU8OzRhS.GhRMa4VUnkPty'
+        return crypt_r_supports(h1, h2)
 
     @classmethod
     def _no_backends_msg(cls):
@@ -225,6 +230,14 @@ class bcrypt(uh.HasManyIdents, uh.HasRounds, uh.HasSalt, uh.HasManyBackends, uh.
             raise ValueError("encoded password can't be handled by os_crypt"
                              " (recommend installing pybcrypt or bcryptor)")
 
+    def _calc_checksum_crypt_r(self, secret):
+        ok, hash = safe_crypt_r(secret, self.to_string(native=False))
+        if ok:
+            return hash[-31:]
+        else:
+            raise ValueError("encoded password can't be handled by crypt_r"
+                             " (recommend installing pybcrypt or bcryptor)")
+
     def _calc_checksum_pybcrypt(self, secret):
         #pybcrypt behavior:
         #   py2: unicode secret -> ascii bytes (we override this)
@@ -58,9 +58,11 @@ import logging; log = logging.getLogger(__name__)
 from warnings import warn
 #site
 #libs
-from passlib.utils import h64, classproperty, safe_os_crypt, b, bytes, \
+from passlib.utils import h64, classproperty, safe_os_crypt, os_crypt_supports, \
+    safe_crypt_r, crypt_r_supports, b, bytes, \
             to_hash_str, handlers as uh, bord
-from passlib.utils.des import mdes_encrypt_int_block
+from passlib.utils import des
+from passlib.utils.des import DesCipher, mdes_encrypt_int_blocks
 #pkg
 #local
 __all__ = [
@@ -97,42 +99,74 @@ def raw_crypt(secret, salt):
     key_value = _crypt_secret_to_key(secret)
 
     #run data through des using input of 0
-    result = mdes_encrypt_int_block(key_value, 0, salt_value, 25)
+    result = DesCipher(key_value).encrypt_int_block(0, salt_value, 25)
 
     #run h64 encode on result
     return h64.encode_dc_int64(result)
 
-def raw_ext_crypt(secret, rounds, salt):
-    "ext_crypt() helper which returns checksum only"
-
-    #decode salt
-    try:
-        salt_value = h64.decode_int24(salt)
-    except ValueError: #pragma: no cover - always caught by class
-        raise ValueError("invalid salt")
-
+def _ext_crypt_secret_to_key(secret):
+    "ext_crypt() helper which converts secret of any length -> des key"
     #validate secret
     if b('\x00') in secret: #pragma: no cover - always caught by class
         #builtin linux crypt doesn't like this, so we don't either
         #XXX: would make more sense to raise ValueError, but want to be compatible w/ stdlib crypt
         raise ValueError("secret must be string without null bytes")
 
-    #convert secret string into an integer
+    #fold each additional 8 bytes of secret into the key
     key_value = _crypt_secret_to_key(secret)
     idx = 8
     end = len(secret)
     while idx < end:
         next = idx+8
-        key_value = mdes_encrypt_int_block(key_value, key_value) ^ \
+        key_value = DesCipher(key_value).encrypt_int_block(key_value) ^ \
                                         _crypt_secret_to_key(secret[idx:next])
         idx = next
+    return key_value
+
+def raw_ext_crypt(secret, rounds, salt):
+    "ext_crypt() helper which returns checksum only"
+
+    #decode salt
+    try:
+        salt_value = h64.decode_int24(salt)
+    except ValueError: #pragma: no cover - always caught by class
+        raise ValueError("invalid salt")
+
+    #convert secret string into an integer
+    key_value = _ext_crypt_secret_to_key(secret)
 
     #run data through des using input of 0
-    result = mdes_encrypt_int_block(key_value, 0, salt_value, rounds)
+    result = DesCipher(key_value).encrypt_int_block(0, salt_value, rounds)
 
     #run h64 encode on result
     return h64.encode_dc_int64(result)
 
+def raw_crypt_batch(secrets, salts):
+    """batch version of :func:`raw_crypt`, using bitsliced des.
+
+    :arg secrets: list of secrets (as bytes)
+    :arg salts: list of 2 char salts (as bytes)
+    :returns: list of checksums (as bytes), in the same order.
+    """
+    keys = [ _crypt_secret_to_key(secret) for secret in secrets ]
+    try:
+        salt_values = [ h64.decode_int12(salt) for salt in salts ]
+    except ValueError: #pragma: no cover - always caught by class
+        raise ValueError("invalid chars in salt")
+    results = mdes_encrypt_int_blocks(keys, 0, salt_values, 25)
+    return [ h64.encode_dc_int64(result) for result in results ]
+
+def _verify_each(cls, pairs):
+    "verify each (secret, hash) pair separately - fallback for _verify_batch() methods"
+    verify = cls.verify
+    return [ verify(secret, hash) for secret, hash in pairs ]
+
+def _use_batch(cls, pairs):
+    "check if _verify_batch() methods should use bitsliced des"
+    if len(pairs) < des.bs_min_lanes:
+        return False
+    return not hasattr(cls, "get_backend") or cls.get_backend() == "builtin"
+
 #=========================================================
 #handler
 #=========================================================
@@ -199,14 +233,19 @@ class des_crypt(uh.HasManyBackends, uh.HasSalt, uh.GenericHandler):
     #=========================================================
     #backend
     #=========================================================
-    backends = ("os_crypt", "builtin")
+    backends = ("os_crypt", "builtin", "crypt_r")
 
     _has_backend_builtin = True
 
     @classproperty
     def _has_backend_os_crypt(cls):
         h = u'abgOeLfPimXQo'
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h)[1]==h)
+        return os_crypt_supports(h)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h = u'abgOeLfPimXQo'
+        return crypt_r_supports(h)
 
     def _calc_checksum_builtin(self, secret):
         #gotta do something - no official policy since des-crypt predates unicode
@@ -231,6 +270,36 @@ class des_crypt(uh.HasManyBackends, uh.HasSalt, uh.GenericHandler):
         else:
             return self._calc_checksum_builtin(secret)
 
+    def _calc_checksum_crypt_r(self, secret):
+        #NOTE: safe_crypt_r encodes unicode secret -> utf8, and refuses
+        #      null chars, leaving builtin to raise the error.
+        ok, hash = safe_crypt_r(secret, self.salt)
+        if ok:
+            return hash[2:]
+        else:
+            return self._calc_checksum_builtin(secret)
+
+    @classmethod
+    def _verify_batch(cls, pairs):
+        "verify list of (secret, hash) pairs at once; used by CryptContext.verify_many"
+        #NOTE: os_crypt / crypt_r are much faster than bitsliced des
+        if not _use_batch(cls, pairs):
+            return _verify_each(cls, pairs)
+        records = [ cls.from_string(hash) for secret, hash in pairs ]
+        secrets = []
+        for secret, hash in pairs:
+            if isinstance(secret, unicode):
+                secret = secret.encode("utf-8")
+            if b('\x00') in secret:
+                raise ValueError("null char in secret")
+            secrets.append(secret)
+        checksums = raw_crypt_batch(secrets,
+                                    [ record.salt.encode("ascii") for record in records ])
+        return [
+            record.checksum == checksum.decode("ascii")
+            for record, checksum in zip(records, checksums)
+        ]
+
     #=========================================================
     #eoc
     #=========================================================
@@ -271,6 +340,7 @@ class bsdi_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandler
     #=========================================================
     #--GenericHandler--
     name = "bsdi_crypt"
+    ident = u"_"
     setting_kwds = ("salt", "rounds")
     checksum_size = 11
     checksum_chars = uh.H64_CHARS
@@ -328,14 +398,19 @@ class bsdi_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandler
     #=========================================================
     #backend
     #=========================================================
-    backends = ("os_crypt", "builtin")
+    backends = ("os_crypt", "builtin", "crypt_r")
 
     _has_backend_builtin = True
 
     @classproperty
     def _has_backend_os_crypt(cls):
         h = u'_/...lLDAxARksGCHin.'
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h)[1]==h)
+        return os_crypt_supports(h)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h = u'_/...lLDAxARksGCHin.'
+        return crypt_r_supports(h)
         
     def _calc_checksum_builtin(self, secret):
         if isinstance(secret, unicode):
@@ -349,6 +424,41 @@ class bsdi_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandler
         else:
             return self._calc_checksum_builtin(secret)
 
+    def _calc_checksum_crypt_r(self, secret):
+        ok, hash = safe_crypt_r(secret, self.to_string(native=False))
+        if ok:
+            return hash[9:]
+        else:
+            return self._calc_checksum_builtin(secret)
+
+    @classmethod
+    def _verify_batch(cls, pairs):
+        "verify list of (secret, hash) pairs at once; used by CryptContext.verify_many"
+        if not _use_batch(cls, pairs):
+            return _verify_each(cls, pairs)
+        #group hashes by rounds, since each batch has to share the same count
+        groups = {}
+        records = []
+        for idx, (secret, hash) in enumerate(pairs):
+            record = cls.from_string(hash)
+            records.append(record)
+            groups.setdefault(record.rounds, []).append(idx)
+        result = [ None ] * len(pairs)
+        for rounds, indices in groups.iteritems():
+            keys = []
+            salts = []
+            for idx in indices:
+                secret = pairs[idx][0]
+                if isinstance(secret, unicode):
+                    secret = secret.encode("utf-8")
+                keys.append(_ext_crypt_secret_to_key(secret))
+                salts.append(h64.decode_int24(records[idx].salt.encode("ascii")))
+            results = mdes_encrypt_int_blocks(keys, 0, salts, rounds)
+            for idx, value in zip(indices, results):
+                result[idx] = records[idx].checksum == \
+                    h64.encode_dc_int64(value).decode("ascii")
+        return result
+
     #=========================================================
     #eoc
     #=========================================================
@@ -441,6 +551,35 @@ class bigcrypt(uh.HasSalt, uh.GenericHandler):
             idx = next
         return chk.decode("ascii")
 
+    @classmethod
+    def _verify_batch(cls, pairs):
+        "verify list of (secret, hash) pairs at once; used by CryptContext.verify_many"
+        if not _use_batch(cls, pairs):
+            return _verify_each(cls, pairs)
+        records = [ cls.from_string(hash) for secret, hash in pairs ]
+        secrets = []
+        for secret, hash in pairs:
+            if isinstance(secret, unicode):
+                secret = secret.encode("utf-8")
+            secrets.append(secret)
+        checksums = raw_crypt_batch(secrets,
+                                    [ record.salt.encode("ascii") for record in records ])
+        #each additional 8 chars of secret are encrypted using the
+        #previous block's output as the salt, so run them a block at a time.
+        idx = 8
+        active = [ pos for pos, secret in enumerate(secrets) if len(secret) > idx ]
+        while active:
+            chunks = raw_crypt_batch([ secrets[pos][idx:idx+8] for pos in active ],
+                                     [ checksums[pos][-11:-9] for pos in active ])
+            for pos, chunk in zip(active, chunks):
+                checksums[pos] += chunk
+            idx += 8
+            active = [ pos for pos in active if len(secrets[pos]) > idx ]
+        return [
+            record.checksum == checksum.decode("ascii")
+            for record, checksum in zip(records, checksums)
+        ]
+
     #=========================================================
     #eoc
     #=========================================================
@@ -521,18 +660,40 @@ class crypt16(uh.HasSalt, uh.GenericHandler):
         key1 = _crypt_secret_to_key(secret)
 
         #run data through des using input of 0
-        result1 = mdes_encrypt_int_block(key1, 0, salt_value, 20)
+        result1 = DesCipher(key1).encrypt_int_block(0, salt_value, 20)
 
         #convert next 8 bytes of secret string into integer (key=0 if secret < 8 chars)
         key2 = _crypt_secret_to_key(secret[8:])
 
         #run data through des using input of 0
-        result2 = mdes_encrypt_int_block(key2, 0, salt_value, 5)
+        result2 = DesCipher(key2).encrypt_int_block(0, salt_value, 5)
 
         #done
         chk = h64.encode_dc_int64(result1) + h64.encode_dc_int64(result2)
         return chk.decode("ascii")
 
+    @classmethod
+    def _verify_batch(cls, pairs):
+        "verify list of (secret, hash) pairs at once; used by CryptContext.verify_many"
+        if not _use_batch(cls, pairs):
+            return _verify_each(cls, pairs)
+        records = [ cls.from_string(hash) for secret, hash in pairs ]
+        secrets = []
+        for secret, hash in pairs:
+            if isinstance(secret, unicode):
+                secret = secret.encode("utf-8")
+            secrets.append(secret)
+        salts = [ h64.decode_int12(record.salt.encode("ascii")) for record in records ]
+        results1 = mdes_encrypt_int_blocks(
+            [ _crypt_secret_to_key(secret) for secret in secrets ], 0, salts, 20)
+        results2 = mdes_encrypt_int_blocks(
+            [ _crypt_secret_to_key(secret[8:]) for secret in secrets ], 0, salts, 5)
+        return [
+            record.checksum == (h64.encode_dc_int64(result1) +
+                                h64.encode_dc_int64(result2)).decode("ascii")
+            for record, result1, result2 in zip(records, results1, results2)
+        ]
+
     #=========================================================
     #eoc
     #=========================================================
@@ -10,7 +10,9 @@ from warnings import warn
 #site
 #libs
 from passlib.utils import b, bytes, to_bytes, h64, safe_os_crypt, \
-                          classproperty, handlers as uh
+                          os_crypt_supports, safe_crypt_r, crypt_r_supports, \
+                          classproperty, crypt_round_schedule, handlers as uh
+from passlib.utils import md5_batch
 #pkg
 #local
 __all__ = [
@@ -46,7 +48,53 @@ def raw_md5_crypt(secret, salt, apr=False):
     # when all you did was change the ident incorporated into the hash?
     # would love to find webpage explaining why just using a portable
     # implementation of $1$ wasn't sufficient. *nothing* else was changed.
+    secret, salt, result = _raw_md5_crypt_primary(secret, salt, apr)
 
+    #next:
+    # do 1000 rounds of md5 to make things harder.
+    # each round we do digest of round-specific content,
+    # where content is formed from concatenation of...
+    #   secret if round % 2 else result
+    #   salt if round % 3
+    #   secret if round % 7
+    #   result if round % 2 else secret
+    #
+    #NOTE:
+    # this pattern repeats every 42 rounds, so instead of doing this
+    # directly, this implementation pre-computes all the combinations
+    # of strings & md5 hash objects that will be needed, and runs the rounds
+    # in (even, odd) pairs driven by crypt_round_schedule: even rounds are
+    # md5(result + suffix), odd rounds copy a pre-calculated hash of the
+    # prefix, then add result. so there are no tests inside the loop,
+    # and each round is one hash create/copy + 1 update + 1 digest.
+    secret_secret = secret*2
+    odd_hashes = (
+        md5(secret).copy,
+        md5(secret+salt).copy,
+        md5(secret_secret).copy,
+        md5(secret+salt+secret).copy,
+    )
+    even_suffixes = (
+        secret,
+        salt+secret,
+        secret_secret,
+        salt+secret_secret,
+    )
+    schedule = [
+        (even_suffixes[even], odd_hashes[odd])
+        for even, odd in crypt_round_schedule
+    ]
+    #1000 rounds = 23 full 42-round cycles + 17 round pairs
+    for even, odd in schedule * 23 + schedule[:17]:
+        h = odd()
+        h.update(md5(result + even).digest())
+        result = h.digest()
+
+    #encode resulting hash
+    return h64.encode_transposed_bytes(result, _chk_offsets).decode("ascii")
+
+def _raw_md5_crypt_primary(secret, salt, apr):
+    "helper for raw_md5_crypt: normalize secret & salt, and calculate primary hash"
     #validate secret
     #FIXME: can't find definitive policy on how md5-crypt handles non-ascii.
     if isinstance(secret, unicode):
@@ -59,16 +107,14 @@ def raw_md5_crypt(secret, salt, apr=False):
         salt = salt[:8]
 
     #primary hash = secret+id+salt+...
-    h = md5(secret)
-    h.update(B_APR_MAGIC if apr else B_MD5_MAGIC)
-    h.update(salt)
+    #NOTE: the primary hash's input is assembled in full, then hashed
+    #      in one call, rather than feeding it to md5 piece by piece.
+    slen = len(secret)
 
     # primary hash - add len(secret) chars of tmp hash,
     # where temp hash is md5(secret+salt+secret)
     tmp = md5(secret + salt + secret).digest()
     assert len(tmp) == 16
-    slen = len(secret)
-    h.update(tmp * (slen//16) + tmp[:slen % 16])
 
     # primary hash - add null chars & first char of secret !?!
     #
@@ -79,65 +125,70 @@ def raw_md5_crypt(secret, salt, apr=False):
     #
     # sha-crypt replaced this step with
     # something more useful, anyways
-    idx = len(secret)
-    evenchar = secret[:1]
-    while idx > 0:
-        h.update(B_NULL if idx & 1 else evenchar)
-        idx >>= 1
-    result = h.digest()
+    result = md5(
+        secret + (B_APR_MAGIC if apr else B_MD5_MAGIC) + salt +
+        (tmp * (slen//16 + 1))[:slen] +
+        _bit_walk_mask(slen).replace(B_EVEN_MARK, secret[:1])
+    ).digest()
+    return secret, salt, result
 
-    #next:
-    # do 1000 rounds of md5 to make things harder.
-    # each round we do digest of round-specific content,
-    # where content is formed from concatenation of...
-    #   secret if round % 2 else result
-    #   salt if round % 3
-    #   secret if round % 7
-    #   result if round % 2 else secret
-    #
-    #NOTE:
-    # instead of doing this directly, this implementation
-    # pre-computes all the combinations of strings & md5 hash objects
-    # that will be needed, in order to perform round operations as fast as possible
-    # (so that each round consists of one hash create/copy + 1 update + 1 digest)
-    #
-    #TODO: might be able to optimize even further by removing need for tests, since
-    # if/then pattern is easily predicatble -
-    # pattern is 7-0-1-0-3-0 (where 1 bit = mult 2, 2 bit = mult 3, 3 bit = mult 7)
-    secret_secret = secret*2
-    salt_secret = salt+secret
-    salt_secret_secret = salt + secret*2
-    secret_hash = md5(secret).copy
-    secret_secret_hash = md5(secret_secret).copy
-    secret_salt_hash = md5(secret+salt).copy
-    secret_salt_secret_hash = md5(secret+salt_secret).copy
-    for idx in xrange(1000):
-        if idx & 1:
-            if idx % 3:
-                if idx % 7:
-                    h = secret_salt_secret_hash()
-                else:
-                    h = secret_salt_hash()
-            elif idx % 7:
-                h = secret_secret_hash()
-            else:
-                h = secret_hash()
-            h.update(result)
-        else:
-            h = md5(result)
-            if idx % 3:
-                if idx % 7:
-                    h.update(salt_secret_secret)
-                else:
-                    h.update(salt_secret)
-            elif idx % 7:
-                h.update(secret_secret)
-            else:
-                h.update(secret)
-        result = h.digest()
+def raw_md5_crypt_batch(pairs, apr=False):
+    """perform raw md5-crypt calculation for a batch of secrets.
 
-    #encode resulting hash
-    return h64.encode_transposed_bytes(result, _chk_offsets).decode("ascii")
+    this is equivalent to calling :func:`raw_md5_crypt` for each pair,
+    but if numpy is installed and the batch is large enough,
+    the main loop is run for all of them at once by
+    :mod:`passlib.utils.md5_batch`.
+
+    :arg pairs:
+        list of ``(secret, salt)`` tuples.
+
+    :param apr:
+        flag to use apache variant
+
+    :returns:
+        list of encoded checksums as unicode, in the same order as *pairs*.
+    """
+    if not md5_batch.available or len(pairs) < md5_batch.min_lanes:
+        return [ raw_md5_crypt(secret, salt, apr) for secret, salt in pairs ]
+    secrets = []
+    salts = []
+    results = []
+    for secret, salt in pairs:
+        secret, salt, result = _raw_md5_crypt_primary(secret, salt, apr)
+        secrets.append(secret)
+        salts.append(salt)
+        results.append(result)
+    #500 round pairs = 1000 rounds
+    results = md5_batch.md5_crypt_many(secrets, salts, results, 500, crypt_round_schedule)
+    return [
+        h64.encode_transposed_bytes(result, _chk_offsets).decode("ascii")
+        for result in results
+    ]
+
+#: marker byte used by _bit_walk_mask()
+B_EVEN_MARK = b("\x01")
+
+#: cache of _bit_walk_mask() results, for typical password lengths
+_bit_walk_cache = {}
+
+def _bit_walk_mask(slen):
+    """return the primary hash's bit-walk string for a secret of length *slen*.
+
+    this has one char per bit of *slen* (least significant first): a null if the
+    bit is set, else :data:`B_EVEN_MARK`, which the caller replaces with the
+    first char of the secret.
+    """
+    mask = _bit_walk_cache.get(slen)
+    if mask is None:
+        idx = slen
+        mask = b('')
+        while idx > 0:
+            mask += B_NULL if idx & 1 else B_EVEN_MARK
+            idx >>= 1
+        if slen < 256:
+            _bit_walk_cache[slen] = mask
+    return mask
 
 _chk_offsets = (
     12,6,0,
@@ -185,6 +236,24 @@ class _Md5Common(uh.HasSalt, uh.GenericHandler):
     #=========================================================
     #calc_checksum in subclass
 
+    #: apr flag passed to raw_md5_crypt_batch() by _verify_batch()
+    _batch_apr = False
+
+    @classmethod
+    def _verify_batch(cls, pairs):
+        "verify list of (secret, hash) pairs at once; used by CryptContext.verify_many"
+        if not md5_batch.available or len(pairs) < md5_batch.min_lanes:
+            verify = cls.verify
+            return [ verify(secret, hash) for secret, hash in pairs ]
+        records = [ cls.from_string(hash) for secret, hash in pairs ]
+        checksums = raw_md5_crypt_batch([
+            (secret, record.salt) for (secret, hash), record in zip(pairs, records)
+            ], cls._batch_apr)
+        return [
+            record.checksum == checksum
+            for record, checksum in zip(records, checksums)
+        ]
+
     #=========================================================
     #eoc
     #=========================================================
@@ -223,14 +292,19 @@ class md5_crypt(uh.HasManyBackends, _Md5Common):
     #FIXME: can't find definitive policy on how md5-crypt handles non-ascii.
     # all backends currently coerce -> utf-8
 
-    backends = ("os_crypt", "builtin")
+    backends = ("os_crypt", "builtin", "crypt_r")
 
     _has_backend_builtin = True
 
     @classproperty
     def _has_backend_os_crypt(cls):
         h = u'$1$test$pi/xDtU5WFVRqYS6BMU8X/'
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h)[1]==h)
+        return os_crypt_supports(h)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h = u'$1$test$pi/xDtU5WFVRqYS6BMU8X/'
+        return crypt_r_supports(h)
 
     def _calc_checksum_builtin(self, secret):
         return raw_md5_crypt(secret, self.salt)
@@ -242,6 +316,21 @@ class md5_crypt(uh.HasManyBackends, _Md5Common):
         else:
             return self._calc_checksum_builtin(secret)
 
+    def _calc_checksum_crypt_r(self, secret):
+        ok, hash = safe_crypt_r(secret, self.ident + self.salt)
+        if ok:
+            return hash[-22:]
+        else:
+            return self._calc_checksum_builtin(secret)
+
+    @classmethod
+    def _verify_batch(cls, pairs):
+        if cls.get_backend() != "builtin":
+            #the os's md5-crypt is faster than the batch engine
+            verify = cls.verify
+            return [ verify(secret, hash) for secret, hash in pairs ]
+        return super(md5_crypt, cls)._verify_batch(pairs)
+
     #=========================================================
     #eoc
     #=========================================================
@@ -267,6 +356,8 @@ class apr_md5_crypt(_Md5Common):
     name = "apr_md5_crypt"
     ident = u"$apr1$"
 
+    _batch_apr = True
+
     #=========================================================
     #primary interface
     #=========================================================
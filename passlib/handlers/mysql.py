@@ -51,6 +51,7 @@ class mysql323(uh.StaticHandler):
     #class attrs
     #=========================================================
     name = "mysql323"
+    checksum_size = 16
     checksum_chars = uh.HEX_CHARS
 
     _pat = re.compile(ur"^[0-9a-f]{16}$", re.I)
@@ -112,6 +113,7 @@ class mysql41(uh.StaticHandler):
     #class attrs
     #=========================================================
     name = "mysql41"
+    ident = u"*"
     _pat = re.compile(r"^\*[0-9A-F]{40}$", re.I)
 
     #=========================================================
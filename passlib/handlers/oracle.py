@@ -11,9 +11,9 @@ from warnings import warn
 #site
 #libs
 #pkg
-from passlib.utils import xor_bytes, handlers as uh, bytes, to_unicode, \
+from passlib.utils import handlers as uh, bytes, to_unicode, \
     to_hash_str, b
-from passlib.utils.des import des_encrypt_block
+from passlib.utils.des import DesCipher, get_des_cipher
 #local
 __all__ = [
     "oracle10g",
@@ -40,11 +40,13 @@ def des_cbc_encrypt(key, value, iv=b('\x00') * 8, pad=b('\x00')):
     :returns: last block of DES-CBC encryption of all ``value``'s byte blocks.
     """
     value += pad * (-len(value) % 8) #null pad to multiple of 8
-    hash = iv #start things off
-    for offset in xrange(0,len(value),8):
-        chunk = xor_bytes(hash, value[offset:offset+8])
-        hash = des_encrypt_block(key, chunk)
-    return hash
+    #NOTE: only the constant ORACLE10_MAGIC key goes through get_des_cipher()'s cache;
+    #      the second pass's key is derived from the secret, so it's never cached.
+    if key == ORACLE10_MAGIC:
+        cipher = get_des_cipher(key)
+    else:
+        cipher = DesCipher(key)
+    return cipher.encrypt_cbc(value, iv)[-8:]
 
 #: magic string used as initial des key by oracle10
 ORACLE10_MAGIC = b("\x01\x23\x45\x67\x89\xAB\xCD\xEF")
@@ -67,6 +69,8 @@ class oracle10(uh.StaticHandler):
     name = "oracle10"
     setting_kwds = ()
     context_kwds = ("user",)
+    checksum_size = 16
+    checksum_chars = uh.HEX_CHARS
 
     #=========================================================
     #formatting
@@ -12,7 +12,7 @@ from warnings import warn
 #libs
 from passlib.utils import adapted_b64_encode, adapted_b64_decode, \
         handlers as uh, to_hash_str, to_unicode, bytes, b
-from passlib.utils.pbkdf2 import pbkdf2
+from passlib.utils.pbkdf2 import pbkdf2, hashlib_pbkdf2
 #pkg
 #local
 __all__ = [
@@ -24,10 +24,30 @@ __all__ = [
     "grub_pbkdf2_sha512",
 ]
 
+#=========================================================
+#backends
+#=========================================================
+class _Pbkdf2Backends(uh.HasManyBackends):
+    """mixin providing the backends shared by the pbkdf2-based handlers.
+
+    subclasses implement ``_calc_checksum_kdf(secret, kdf)``, where ``kdf``
+    has the same signature as :func:`~passlib.utils.pbkdf2.pbkdf2`.
+    """
+    backends = ("hashlib", "builtin")
+
+    _has_backend_hashlib = hashlib_pbkdf2 is not None
+    _has_backend_builtin = True
+
+    def _calc_checksum_hashlib(self, secret):
+        return self._calc_checksum_kdf(secret, hashlib_pbkdf2)
+
+    def _calc_checksum_builtin(self, secret):
+        return self._calc_checksum_kdf(secret, pbkdf2)
+
 #=========================================================
 #
 #=========================================================
-class Pbkdf2DigestHandler(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.GenericHandler):
+class Pbkdf2DigestHandler(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, _Pbkdf2Backends, uh.GenericHandler):
     "base class for various pbkdf2_{digest} algorithms"
     #=========================================================
     #class attrs
@@ -88,10 +108,10 @@ class Pbkdf2DigestHandler(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.Gen
             hash = u'%s%d$%s' % (self.ident, self.rounds, salt)
         return to_hash_str(hash)
 
-    def calc_checksum(self, secret):
+    def _calc_checksum_kdf(self, secret, kdf):
         if isinstance(secret, unicode):
             secret = secret.encode("utf-8")
-        return pbkdf2(secret, self.salt, self.rounds, self.checksum_size, self._prf)
+        return kdf(secret, self.salt, self.rounds, self.checksum_size, self._prf)
 
 def create_pbkdf2_hash(hash_name, digest_size, ident=None):
     "create new Pbkdf2DigestHandler subclass for a specific hash"
@@ -145,7 +165,7 @@ ldap_pbkdf2_sha512 = uh.PrefixWrapper("ldap_pbkdf2_sha512", pbkdf2_sha512, "{PBK
 #: bytes used by cta hash for base64 values 63 & 64
 CTA_ALTCHARS = b("-_")
 
-class cta_pbkdf2_sha1(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.GenericHandler):
+class cta_pbkdf2_sha1(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, _Pbkdf2Backends, uh.GenericHandler):
     """This class implements Cryptacular's PBKDF2-based crypt algorithm, and follows the :ref:`password-hash-api`.
 
     It supports a variable-length salt, and a variable number of rounds.
@@ -230,10 +250,10 @@ class cta_pbkdf2_sha1(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.Generic
     #=========================================================
     #backend
     #=========================================================
-    def calc_checksum(self, secret):
+    def _calc_checksum_kdf(self, secret, kdf):
         if isinstance(secret, unicode):
             secret = secret.encode("utf-8")
-        return pbkdf2(secret, self.salt, self.rounds, 20, "hmac-sha1")
+        return kdf(secret, self.salt, self.rounds, 20, "hmac-sha1")
 
     #=========================================================
     #eoc
@@ -242,7 +262,7 @@ class cta_pbkdf2_sha1(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.Generic
 #=========================================================
 #dlitz's pbkdf2 hash
 #=========================================================
-class dlitz_pbkdf2_sha1(uh.HasRounds, uh.HasSalt, uh.GenericHandler):
+class dlitz_pbkdf2_sha1(uh.HasRounds, uh.HasSalt, _Pbkdf2Backends, uh.GenericHandler):
     """This class implements Dwayne Litzenberger's PBKDF2-based crypt algorithm, and follows the :ref:`password-hash-api`.
 
     It supports a variable-length salt, and a variable number of rounds.
@@ -324,11 +344,11 @@ class dlitz_pbkdf2_sha1(uh.HasRounds, uh.HasSalt, uh.GenericHandler):
     #=========================================================
     #backend
     #=========================================================
-    def calc_checksum(self, secret):
+    def _calc_checksum_kdf(self, secret, kdf):
         if isinstance(secret, unicode):
             secret = secret.encode("utf-8")
         salt = self.to_string(withchk=False, native=False).encode("ascii")
-        result = pbkdf2(secret, salt, self.rounds, 24, "hmac-sha1")
+        result = kdf(secret, salt, self.rounds, 24, "hmac-sha1")
         return adapted_b64_encode(result).decode("ascii")
 
     #=========================================================
@@ -338,7 +358,7 @@ class dlitz_pbkdf2_sha1(uh.HasRounds, uh.HasSalt, uh.GenericHandler):
 #=========================================================
 #crowd
 #=========================================================
-class atlassian_pbkdf2_sha1(uh.HasRawSalt, uh.HasRawChecksum, uh.GenericHandler):
+class atlassian_pbkdf2_sha1(uh.HasRawSalt, uh.HasRawChecksum, _Pbkdf2Backends, uh.GenericHandler):
     """This class implements the PBKDF2 hash used by Atlassian.
 
     It supports a fixed-length salt, and a fixed number of rounds.
@@ -379,17 +399,17 @@ class atlassian_pbkdf2_sha1(uh.HasRawSalt, uh.HasRawChecksum, uh.GenericHandler)
         hash = self.ident + b64encode(data).decode("ascii")
         return to_hash_str(hash)
 
-    def calc_checksum(self, secret):
+    def _calc_checksum_kdf(self, secret, kdf):
         #TODO: find out what crowd's policy is re: unicode
         if isinstance(secret, unicode):
             secret = secret.encode("utf-8")
         #crowd seems to use a fixed number of rounds.
-        return pbkdf2(secret, self.salt, 10000, 32, "hmac-sha1")
+        return kdf(secret, self.salt, 10000, 32, "hmac-sha1")
 
 #=========================================================
 #grub
 #=========================================================
-class grub_pbkdf2_sha512(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.GenericHandler):
+class grub_pbkdf2_sha512(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, _Pbkdf2Backends, uh.GenericHandler):
     """This class implements Grub's pbkdf2-hmac-sha512 hash, and follows the :ref:`password-hash-api`.
 
     It supports a variable-length salt, and a variable number of rounds.
@@ -453,11 +473,11 @@ class grub_pbkdf2_sha512(uh.HasRounds, uh.HasRawSalt, uh.HasRawChecksum, uh.Gene
             hash = u'%s%d.%s' % (self.ident, self.rounds, salt)
         return to_hash_str(hash)
 
-    def calc_checksum(self, secret):
+    def _calc_checksum_kdf(self, secret, kdf):
         #TODO: find out what grub's policy is re: unicode
         if isinstance(secret, unicode):
             secret = secret.encode("utf-8")
-        return pbkdf2(secret, self.salt, self.rounds, 64, "hmac-sha512")
+        return kdf(secret, self.salt, self.rounds, 64, "hmac-sha512")
 
 #=========================================================
 #eof
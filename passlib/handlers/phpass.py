@@ -16,6 +16,7 @@ from warnings import warn
 #site
 #libs
 from passlib.utils import h64, handlers as uh, bytes, b, to_unicode, to_hash_str
+from passlib.utils import md5_batch
 #pkg
 #local
 __all__ = [
@@ -126,6 +127,59 @@ class phpass(uh.HasManyIdents, uh.HasRounds, uh.HasSalt, uh.GenericHandler):
             r += 1
         return h64.encode_bytes(result).decode("ascii")
 
+    @classmethod
+    def calc_checksum_batch(cls, pairs, rounds):
+        """calculate checksums for a batch of secrets.
+
+        this is equivalent to calling :meth:`calc_checksum` for each pair,
+        but if numpy is installed and the batch is large enough,
+        the main loop is run for all of them at once by
+        :mod:`passlib.utils.md5_batch`.
+
+        :arg pairs: list of ``(secret, salt)`` tuples.
+        :arg rounds: rounds setting (log2 of actual rounds) shared by all of them.
+
+        :returns: list of encoded checksums, in the same order as *pairs*.
+        """
+        if not md5_batch.available or len(pairs) < md5_batch.min_lanes:
+            return [
+                cls(salt=salt, rounds=rounds).calc_checksum(secret)
+                for secret, salt in pairs
+            ]
+        secrets = []
+        results = []
+        for secret, salt in pairs:
+            if isinstance(secret, unicode):
+                secret = secret.encode("utf-8")
+            if isinstance(salt, unicode):
+                salt = salt.encode("ascii")
+            secrets.append(secret)
+            results.append(md5(salt + secret).digest())
+        results = md5_batch.phpass_many(secrets, results, 1<<rounds)
+        return [ h64.encode_bytes(result).decode("ascii") for result in results ]
+
+    @classmethod
+    def _verify_batch(cls, pairs):
+        "verify list of (secret, hash) pairs at once; used by CryptContext.verify_many"
+        if not md5_batch.available or len(pairs) < md5_batch.min_lanes:
+            verify = cls.verify
+            return [ verify(secret, hash) for secret, hash in pairs ]
+        #group hashes by rounds, since each batch has to share the same count
+        groups = {}
+        records = []
+        for idx, (secret, hash) in enumerate(pairs):
+            record = cls.from_string(hash)
+            records.append(record)
+            groups.setdefault(record.rounds, []).append(idx)
+        result = [ None ] * len(pairs)
+        for rounds, indices in groups.iteritems():
+            checksums = cls.calc_checksum_batch([
+                (pairs[idx][0], records[idx].salt) for idx in indices
+                ], rounds)
+            for idx, checksum in zip(indices, checksums):
+                result[idx] = records[idx].checksum == checksum
+        return result
+
     #=========================================================
     #eoc
     #=========================================================
@@ -13,8 +13,8 @@ import logging; log = logging.getLogger(__name__)
 from warnings import warn
 #site
 #libs
-from passlib.utils import h64, handlers as uh, safe_os_crypt, classproperty, \
-    to_hash_str, to_unicode, bytes, b
+from passlib.utils import h64, handlers as uh, safe_os_crypt, os_crypt_supports, classproperty, \
+    safe_crypt_r, crypt_r_supports, to_hash_str, to_unicode, bytes, b
 from passlib.utils.pbkdf2 import hmac_sha1
 #pkg
 #local
@@ -98,14 +98,19 @@ class sha1_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandler
     #=========================================================
     #backend
     #=========================================================
-    backends = ("os_crypt", "builtin")
+    backends = ("os_crypt", "builtin", "crypt_r")
 
     _has_backend_builtin = True
 
     @classproperty
     def _has_backend_os_crypt(cls):
         h = u'$sha1$1$Wq3GL2Vp$C8U25GvfHS8qGHimExLaiSFlGkAe'
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h)[1]==h)
+        return os_crypt_supports(h)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h = u'$sha1$1$Wq3GL2Vp$C8U25GvfHS8qGHimExLaiSFlGkAe'
+        return crypt_r_supports(h)
 
     def _calc_checksum_builtin(self, secret):
         if isinstance(secret, unicode):
@@ -137,6 +142,13 @@ class sha1_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandler
         else:
             return self._calc_checksum_builtin(secret)
 
+    def _calc_checksum_crypt_r(self, secret):
+        ok, hash = safe_crypt_r(secret, self.to_string(native=False))
+        if ok:
+            return hash[hash.rindex("$")+1:]
+        else:
+            return self._calc_checksum_builtin(secret)
+
     #=========================================================
     #eoc
     #=========================================================
@@ -9,7 +9,8 @@ import logging; log = logging.getLogger(__name__)
 from warnings import warn
 #site
 #libs
-from passlib.utils import h64, safe_os_crypt, classproperty, handlers as uh, \
+from passlib.utils import h64, safe_os_crypt, os_crypt_supports, safe_crypt_r, crypt_r_supports, \
+    classproperty, crypt_round_schedule, handlers as uh, \
     to_hash_str, to_unicode, bytes, b, bord
 #pkg
 #local
@@ -96,55 +97,58 @@ def raw_sha_crypt(secret, salt, rounds, hash):
 
     #
     #calc digest C
-    #NOTE: this has been contorted a little to allow pre-computing
-    #some of the hashes. the original algorithm was that
-    #each round generates digest composed of:
+    #NOTE: the original algorithm is that each round
+    #generates a digest composed of:
     #   if round%2>0 => dp else lr
     #   if round%3>0 => ds
     #   if round%7>0 => dp
     #   if round%2>0 => lr else dp
     #where lr is digest of the last round's hash (initially = a_result)
     #
+    #since this pattern repeats every 42 rounds, this implementation
+    #runs the rounds in (even, odd) pairs, driven by crypt_round_schedule:
+    #even rounds are hash(lr + suffix), and odd rounds copy a pre-calculated
+    #hash of the prefix, then add lr; so the main loop needs no tests.
+    #
 
-    #pre-calculate some digests to speed up odd rounds
-    dp_hash = hash(dp_result).copy
-    dp_ds_hash = hash(dp_result + ds_result).copy
-    dp_dp_hash = hash(dp_result * 2).copy
-    dp_ds_dp_hash = hash(dp_result + ds_result + dp_result).copy
-
-    #pre-calculate some strings to speed up even rounds
-    ds_dp_result = ds_result + dp_result
+    #pre-calculate the odd round prefix hashes & even round suffixes,
+    #indexed by the flags used in crypt_round_schedule (salt = DS, secret = DP).
     dp_dp_result = dp_result * 2
-    ds_dp_dp_result = ds_result + dp_dp_result
-
-    #run through rounds
+    odd_hashes = (
+        hash(dp_result).copy,
+        hash(dp_result + ds_result).copy,
+        hash(dp_dp_result).copy,
+        hash(dp_result + ds_result + dp_result).copy,
+    )
+    even_suffixes = (
+        dp_result,
+        ds_result + dp_result,
+        dp_dp_result,
+        ds_result + dp_dp_result,
+    )
+    schedule = [
+        (even_suffixes[even], odd_hashes[odd])
+        for even, odd in crypt_round_schedule
+    ]
+
+    #run through full 42-round cycles
     last_result = a_result
-    i = 0
-    while i < rounds:
-        if i % 2:
-            if i % 3:
-                if i % 7:
-                    c = dp_ds_dp_hash()
-                else:
-                    c = dp_ds_hash()
-            elif i % 7:
-                c = dp_dp_hash()
-            else:
-                c = dp_hash()
-            c.update(last_result)
-        else:
-            c = hash(last_result)
-            if i % 3:
-                if i % 7:
-                    c.update(ds_dp_dp_result)
-                else:
-                    c.update(ds_dp_result)
-            elif i % 7:
-                c.update(dp_dp_result)
-            else:
-                c.update(dp_result)
+    cycles, tail = divmod(rounds, 42)
+    while cycles:
+        for even, odd in schedule:
+            c = odd()
+            c.update(hash(last_result + even).digest())
+            last_result = c.digest()
+        cycles -= 1
+
+    #run through remaining rounds
+    pairs, extra = divmod(tail, 2)
+    for even, odd in schedule[:pairs]:
+        c = odd()
+        c.update(hash(last_result + even).digest())
         last_result = c.digest()
-        i += 1
+    if extra:
+        last_result = hash(last_result + schedule[pairs][0]).digest()
 
     #return unencoded result, along w/ normalized config values
     return last_result, salt, rounds
@@ -321,14 +325,19 @@ class sha256_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandl
     #=========================================================
     #backend
     #=========================================================
-    backends = ("os_crypt", "builtin")
+    backends = ("os_crypt", "builtin", "crypt_r")
 
     _has_backend_builtin = True
 
     @classproperty
     def _has_backend_os_crypt(cls):
         h = u"$5$rounds=1000$test$QmQADEXMG8POI5WDsaeho0P36yK3Tcrgboabng6bkb/"
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h)[1]==h)
+        return os_crypt_supports(h)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h = u"$5$rounds=1000$test$QmQADEXMG8POI5WDsaeho0P36yK3Tcrgboabng6bkb/"
+        return crypt_r_supports(h)
 
     def _calc_checksum_builtin(self, secret):
         if isinstance(secret, unicode):
@@ -354,6 +363,18 @@ class sha256_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandl
         else:
             return self._calc_checksum_builtin(secret)
 
+    def _calc_checksum_crypt_r(self, secret):
+        ok, result = safe_crypt_r(secret, self.to_string(native=False))
+        if ok:
+            #NOTE: avoiding full parsing routine via from_string().checksum,
+            # and just extracting the bit we need.
+            assert result.startswith(u"$5$")
+            chk = result[-43:]
+            assert u'$' not in chk
+            return chk
+        else:
+            return self._calc_checksum_builtin(secret)
+
     #=========================================================
     #eoc
     #=========================================================
@@ -473,14 +494,19 @@ class sha512_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandl
     #=========================================================
     #backend
     #=========================================================
-    backends = ("os_crypt", "builtin")
+    backends = ("os_crypt", "builtin", "crypt_r")
 
     _has_backend_builtin = True
 
     @classproperty
     def _has_backend_os_crypt(cls):
         h = u"$6$rounds=1000$test$2M/Lx6MtobqjLjobw0Wmo4Q5OFx5nVLJvmgseatA6oMnyWeBdRDx4DU.1H3eGmse6pgsOgDisWBGI5c7TZauS0"
-        return bool(safe_os_crypt and safe_os_crypt(u"test",h)[1]==h)
+        return os_crypt_supports(h)
+
+    @classproperty
+    def _has_backend_crypt_r(cls):
+        h = u"$6$rounds=1000$test$2M/Lx6MtobqjLjobw0Wmo4Q5OFx5nVLJvmgseatA6oMnyWeBdRDx4DU.1H3eGmse6pgsOgDisWBGI5c7TZauS0"
+        return crypt_r_supports(h)
 
     #NOTE: testing w/ HashTimer shows 64-bit linux's crypt to be ~2.6x faster than builtin (627253 vs 238152 rounds/sec)
 
@@ -508,6 +534,18 @@ class sha512_crypt(uh.HasManyBackends, uh.HasRounds, uh.HasSalt, uh.GenericHandl
         else:
             return self._calc_checksum_builtin(secret)
 
+    def _calc_checksum_crypt_r(self, secret):
+        ok, result = safe_crypt_r(secret, self.to_string(native=False))
+        if ok:
+            #NOTE: avoiding full parsing routine via from_string().checksum,
+            # and just extracting the bit we need.
+            assert result.startswith(u"$6$")
+            chk = result[-86:]
+            assert u'$' not in chk
+            return chk
+        else:
+            return self._calc_checksum_builtin(secret)
+
     #=========================================================
     #eoc
     #=========================================================
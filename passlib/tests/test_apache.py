@@ -195,6 +195,32 @@ class HtpasswdFileTest(TestCase):
         ht = apache.HtpasswdFile()
         self.assertEqual(ht.to_string(), b(""))
 
+    def test_09_metrics(self):
+        "test metrics option"
+        from passlib.context import CryptMetrics
+        metrics = CryptMetrics()
+        ht = apache.HtpasswdFile._from_string(self.sample_01, metrics=metrics)
+        self.assertIsNot(ht.context, apache.htpasswd_context)
+        self.assertIs(apache.htpasswd_context.metrics, None)
+
+        self.assertTrue(ht.verify("user1", "pass1"))
+        self.assertFalse(ht.verify("user2", "pass1"))
+        self.assertIs(ht.verify("user5", "pass5"), None)
+        ht.update("user5", "pass5")
+
+        self.assertEqual(metrics.get_count("verify_success", "apr_md5_crypt"), 1)
+        self.assertEqual(metrics.get_count("verify_failure", "des_crypt"), 1)
+        self.assertEqual(metrics.get_count("unknown_user"), 1)
+        ops = sorted((entry['op'], entry['scheme'])
+                     for entry in metrics.snapshot()['latency'])
+        self.assertEqual(ops, [
+            ("encrypt", "apr_md5_crypt"),
+            ("identify", "apr_md5_crypt"),
+            ("identify", "des_crypt"),
+            ("verify", "apr_md5_crypt"),
+            ("verify", "des_crypt"),
+            ])
+
     #=========================================================
     #eoc
     #=========================================================
@@ -0,0 +1,83 @@
+"""test passlib.bench"""
+#=========================================================
+#imports
+#=========================================================
+from __future__ import with_statement
+#core
+import logging; log = logging.getLogger(__name__)
+#site
+#pkg
+from passlib import hash as hashmod
+from passlib.bench import run_benchmarks, iter_backends, measure, \
+    compare_results, format_comparison
+from passlib.bench.compare import json
+from passlib.tests.utils import TestCase
+#module
+
+#=========================================================
+#benchmark tests
+#=========================================================
+class BenchTest(TestCase):
+    "test benchmark runner & comparison"
+
+    def test_measure(self):
+        "test measure()"
+        calls = []
+        result = measure(lambda: calls.append(1), duration=.01)
+        self.assertTrue(0 < result['calls'] <= len(calls)) #excludes warmup batches
+        self.assertTrue(result['min'] <= result['p50'] <= result['p95'])
+        self.assertAlmostEqual(result['mean'] * result['ops'], 1, 6)
+
+    def test_iter_backends(self):
+        "test iter_backends()"
+        handler = hashmod.sha256_crypt
+        orig = handler.get_backend()
+        backends = list(iter_backends(handler))
+        self.assertTrue("builtin" in backends)
+        self.assertEqual(handler.get_backend(), orig)
+        self.assertEqual(list(iter_backends(hashmod.hex_md5)), ["builtin"])
+
+    def test_run(self):
+        "test run_benchmarks()"
+        result = run_benchmarks(schemes=["md5_crypt", "postgres_md5", "bcrypt"],
+                                context_schemes=["hex_md5"], htpasswd_sizes=[100],
+                                duration=.001, rounds="min")
+        results = result['results']
+        self.assertEqual(result['meta']['rounds'], "min")
+        for op in ["encrypt", "verify", "identify"]:
+            self.assertTrue("handler.md5_crypt.builtin." + op in results)
+            self.assertTrue("handler.postgres_md5.builtin." + op in results)
+            entry = results["context.hex_md5." + op]
+            self.assertAlmostEqual(entry['overhead'], entry['mean'] - entry['raw_mean'], 9)
+        for op in ["load", "verify", "save"]:
+            self.assertTrue("htpasswd.100." + op in results)
+        if not hashmod.bcrypt.has_backend():
+            self.assertEqual(results["handler.bcrypt.error"], "no backends available")
+
+        #results should survive json round trip
+        if json is None:
+            raise self.skipTest("json not available")
+        self.assertEqual(json.loads(json.dumps(result)), result)
+
+    def test_compare(self):
+        "test compare_results()"
+        def make(**kwds):
+            return dict(results=dict(
+                (key.replace("_", "."), dict(mean=value, rounds=1000 if key.startswith("r") else None))
+                for key, value in kwds.items()))
+        old = make(a_verify=1.0, b_verify=1.0, c_verify=1.0, r_verify=1.0, x_verify=1.0)
+        new = make(a_verify=1.05, b_verify=1.5, c_verify=.5, y_verify=1.0)
+        new['results']['r.verify'] = dict(mean=2.0, rounds=2000)
+        rows = compare_results(old, new)
+        self.assertEqual([(row[0], row[4]) for row in rows], [
+            ("a.verify", "ok"),
+            ("b.verify", "regression"),
+            ("c.verify", "improvement"),
+            ("r.verify", "incomparable"),
+            ])
+        self.assertEqual(compare_results(old, new, threshold=.6)[1][4], "ok")
+        self.assertEqual(len(format_comparison(rows).splitlines()), 5)
+
+#=========================================================
+#eof
+#=========================================================
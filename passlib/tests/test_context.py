@@ -17,13 +17,15 @@ except ImportError:
     resource_filename = None
 #pkg
 from passlib import hash
-from passlib.context import CryptContext, CryptPolicy, LazyCryptContext
-from passlib.utils import to_bytes, to_unicode
+from passlib.context import CryptContext, CryptPolicy, LazyCryptContext, \
+    VerifyCache, ConcurrencyLimiter, HashingOverloaded, CryptMetrics
+from passlib.utils import to_bytes, to_unicode, LRUCache
 import passlib.utils.handlers as uh
 from passlib.tests.utils import TestCase, mktemp, catch_warnings, \
     gae_env, set_file
 from passlib.registry import register_crypt_handler_path, has_crypt_handler, \
-    _unload_handler_name as unload_handler_name
+    _unload_handler_name as unload_handler_name, get_crypt_handler, \
+    list_crypt_handlers
 #module
 log = getLogger(__name__)
 
@@ -383,6 +385,17 @@ admin__context__deprecated = des_crypt, bsdi_crypt
         p3 = CryptPolicy(**self.sample_config_3pd)
         self.assertEqual(list(p3.iter_handlers()), [])
 
+    def test_11_iter_candidates(self):
+        "test iter_candidates() method"
+        p1 = CryptPolicy(schemes=["md5_crypt", "hex_md5", "des_crypt",
+                                  "ldap_md5_crypt", "plaintext"])
+        def get(hash):
+            return [h.name for h in p1.iter_candidates(hash)]
+        self.assertEqual(get('$1$abc'), ["md5_crypt", "des_crypt", "plaintext"])
+        self.assertEqual(get('{CRYPT}$1$abc'), ["des_crypt", "ldap_md5_crypt", "plaintext"])
+        self.assertEqual(get('a' * 32), ["hex_md5", "des_crypt", "plaintext"])
+        self.assertEqual(get('z' * 32), ["des_crypt", "plaintext"])
+
     def test_12_get_handler(self):
         "test get_handler() method"
 
@@ -468,6 +481,170 @@ admin__context__deprecated = des_crypt, bsdi_crypt
         self.assertEqual(pd.get_min_verify_time(), .1)
         self.assertEqual(pd.get_min_verify_time('admin'), .2)
 
+    def test_16_compile(self):
+        "test compile() & get_plan() methods"
+        p4 = CryptPolicy.from_string(self.sample_config_4s)
+        self.assertIs(p4.compile(), p4)
+
+        #check default category
+        plan = p4.get_plan("sha512_crypt")
+        self.assertIs(plan.handler, hash.sha512_crypt)
+        self.assertEqual((plan.lower_rounds, plan.upper_rounds), (18000, 20000))
+        self.assertIs(p4.get_plan(), plan)
+
+        #check configured category
+        plan = p4.get_plan("sha512_crypt", "admin")
+        self.assertEqual((plan.lower_rounds, plan.upper_rounds), (38000, 40000))
+
+        #check unconfigured category falls back to default
+        self.assertIs(p4.get_plan(None, "user"), p4.get_plan())
+
+        #check prepare() merges defaults & clips explicit rounds
+        self.assertEqual(plan.prepare(dict(rounds=50000)), dict(rounds=40000))
+        settings = plan.prepare({})
+        self.assertTrue(38000 <= settings['rounds'] <= 40000)
+
+        #check unknown scheme
+        self.assertRaises(KeyError, p4.get_plan, "md5_crypt")
+        self.assertRaises(KeyError, CryptPolicy().get_plan)
+
+        #check plans agree w/ get_options()
+        p1 = CryptPolicy(**self.sample_config_1pd)
+        plan = p1.get_plan("bsdi_crypt")
+        self.assertEqual(plan.min_rounds, None)
+        self.assertEqual(plan.max_rounds, 30000)
+        self.assertEqual((plan.lower_rounds, plan.upper_rounds), (22500, 27500))
+
+    def test_17_target_time(self):
+        "test target_time option"
+        from passlib import calibrate
+        orig_path = calibrate.cache_path
+        path = calibrate.cache_path = mktemp()
+        calibrate.clear_cache()
+        try:
+            #run actual calibration, check result is cached on disk
+            mn, df = calibrate.calibrate_rounds("sha256_crypt", 0.01)
+            self.assertTrue(1000 <= mn <= df)
+            self.assertTrue(os.path.exists(path))
+            calibrate.clear_cache()
+            self.assertEqual(calibrate.calibrate_rounds("sha256_crypt", 0.01), (mn, df))
+
+            #entries older than cache_max_age (or w/o timestamp) should be re-measured
+            key = "sha256_crypt.%s.0.01" % (hash.sha256_crypt.get_backend(),)
+            section = "[%s]\n" % (calibrate.get_host_id(),)
+            for stamp in [" @ %d" % (time.time() - calibrate.cache_max_age - 60), ""]:
+                calibrate.clear_cache()
+                set_file(path, "%s%s = 1, 2%s\n" % (section, key, stamp))
+                self.assertNotEqual(calibrate.calibrate_rounds("sha256_crypt", 0.01), (1, 2))
+
+            #seed cache w/ known value, check policy uses it
+            calibrate.clear_cache()
+            set_file(path, "[%s]\nsha256_crypt.%s.0.25 = 12000, 16000 @ %d\n" %
+                     (calibrate.get_host_id(), hash.sha256_crypt.get_backend(), time.time()))
+            policy = CryptPolicy(schemes=["sha256_crypt", "md5_crypt"],
+                                 sha256_crypt__target_time="0.25",
+                                 sha256_crypt__min_rounds=14000,
+                                 sha256_crypt__max_rounds=15000,
+                                 md5_crypt__target_time=0.25,
+                                 )
+            self.assertEqual(policy.get_options("sha256_crypt"), dict(
+                target_time=0.25, min_rounds=14000, default_rounds=16000,
+                max_rounds=15000))
+            plan = policy.get_plan("sha256_crypt")
+            self.assertEqual((plan.lower_rounds, plan.upper_rounds), (15000, 15000))
+
+            #check schemes w/o rounds ignore option
+            self.assertEqual(policy.get_options("md5_crypt"), dict(target_time=0.25))
+
+            #check cache lookups aren't blocked while another thread is measuring
+            import threading
+            entered = threading.Event()
+            release = threading.Event()
+            class StubTimer(object):
+                def __init__(self, handler):
+                    pass
+                def find_rounds_range(self, target):
+                    entered.set()
+                    release.wait(5)
+                    return 1000, 2000
+            orig_timer = calibrate.HashTimer
+            calibrate.HashTimer = StubTimer
+            try:
+                measuring = threading.Thread(target=calibrate.calibrate_rounds,
+                                             args=("sha256_crypt", 0.5))
+                measuring.start()
+                entered.wait(5)
+                results = []
+                lookup = threading.Thread(target=lambda:
+                    results.append(calibrate.calibrate_rounds("sha256_crypt", 0.25)))
+                lookup.start()
+                lookup.join(2)
+                self.assertEqual(results, [(12000, 16000)])
+            finally:
+                release.set()
+                measuring.join()
+                calibrate.HashTimer = orig_timer
+        finally:
+            calibrate.cache_path = orig_path
+            calibrate.clear_cache()
+
+    def test_18_plan_capacity(self):
+        "test capacity planner"
+        from passlib.calibrate import fit_throughput, plan_capacity
+
+        #check curve fitting
+        self.assertEqual(fit_throughput([(1, 100.0), (2, 200.0), (4, 400.0)]), (100.0, 0))
+        x1, sigma = fit_throughput([(4, 250.0), (1, 100.0), (2, 500/3.0)])
+        self.assertEqual(x1, 100.0)
+        self.assertAlmostEqual(sigma, 0.2, 6)
+        self.assertRaises(ValueError, fit_throughput, [(2, 100.0)])
+
+        #check planner output, halving rate should roughly double rounds
+        policy = CryptPolicy(schemes=["sha256_crypt", "md5_crypt"], deprecated=["md5_crypt"])
+        kwds = dict(cpus=2, duration=.1, probe_time=.002)
+        p1 = plan_capacity(policy, 400, **kwds)
+        p2 = plan_capacity(CryptContext(policy=policy), 200, vary_rounds=0, **kwds)
+        self.assertEqual(p1.get_options("md5_crypt"), {})
+        self.assertEqual(p2.get_options("sha256_crypt")['vary_rounds'], 0)
+        r1 = p1.get_options("sha256_crypt")['default_rounds']
+        r2 = p2.get_options("sha256_crypt")['default_rounds']
+        self.assertTrue(1.2 < r2/float(r1) < 4, (r1, r2))
+        self.assertEqual(CryptPolicy.from_string(p1.to_string()).get_options("sha256_crypt"),
+                         dict(default_rounds=r1, vary_rounds="10%"))
+
+        #check integer vary_rounds is applied to log2 rounds
+        from passlib import calibrate
+        class dummy_log2(uh.HasRounds, uh.GenericHandler):
+            name = "dummy_log2"
+            setting_kwds = ("rounds",)
+            rounds_cost = "log2"
+            min_rounds = 4
+            max_rounds = 31
+            default_rounds = 8
+
+        class StubTimer(object):
+            def __init__(self, handler):
+                pass
+            def find_rounds(self, target):
+                return 10
+
+        def stub_throughput(handler, rounds, workers=1, duration=1.0, pool=None):
+            return 100.0
+
+        orig = calibrate.HashTimer, calibrate.measure_throughput
+        calibrate.HashTimer, calibrate.measure_throughput = StubTimer, stub_throughput
+        try:
+            policy = CryptPolicy(schemes=[dummy_log2])
+            def plan(vary_rounds):
+                p = plan_capacity(policy, 100, cpus=1, vary_rounds=vary_rounds)
+                return p.get_options("dummy_log2")['default_rounds']
+            self.assertEqual(plan(0), 10)
+            self.assertEqual(plan(1), 9)
+            self.assertEqual(plan(2), 8)
+            self.assertEqual(plan("10%"), 9)
+        finally:
+            calibrate.HashTimer, calibrate.measure_throughput = orig
+
     #TODO: test this.
     ##def test_gen_min_verify_time(self):
     ##    "test get_min_verify_time() method"
@@ -862,9 +1039,781 @@ class CryptContextTest(TestCase):
         self.assertTrue(ok)
         self.assertIs(new_hash, None)
 
+    def test_25_verify_and_update_parse(self):
+        "test verify_and_update() only parses hash once"
+        calls = []
+        class counted_sha256_crypt(hash.sha256_crypt):
+            name = "counted_sha256_crypt"
+
+            @classmethod
+            def from_string(cls, hash):
+                calls.append(hash)
+                return super(counted_sha256_crypt, cls).from_string(hash)
+
+        cc = CryptContext([counted_sha256_crypt],
+                          all__min_rounds=2000, all__max_rounds=3000)
+        h1 = counted_sha256_crypt.encrypt("password", rounds=1000)
+        h2 = cc.encrypt("password")
+
+        #check out-of-bounds rounds are detected, parsing only once
+        del calls[:]
+        ok, new_hash = cc.verify_and_update("password", h1)
+        self.assertTrue(ok)
+        self.assertTrue(new_hash)
+        self.assertEqual(calls, [h1])
+
+        #check in-bounds rounds, parsing only once
+        del calls[:]
+        self.assertEqual(cc.verify_and_update("password", h2), (True, None))
+        self.assertEqual(calls, [h2])
+
+        #check wrong password, parsing only once
+        del calls[:]
+        self.assertEqual(cc.verify_and_update("wrong", h1), (False, None))
+        self.assertEqual(calls, [h1])
+
+    def test_25_parse_cache(self):
+        "test parse_cache attribute"
+        calls = []
+        class counted_sha256_crypt(hash.sha256_crypt):
+            name = "counted_sha256_crypt"
+
+            @classmethod
+            def from_string(cls, hash):
+                calls.append(hash)
+                return super(counted_sha256_crypt, cls).from_string(hash)
+
+        cc = CryptContext([counted_sha256_crypt, "des_crypt"],
+                          all__min_rounds=1000)
+        h1 = cc.encrypt("password")
+        h2 = cc.encrypt("password")
+        h3 = cc.encrypt("password", scheme="des_crypt")
+
+        #check disabled by default
+        self.assertIs(cc.parse_cache, None)
+        self.assertTrue(cc.verify("password", h1))
+        self.assertTrue(cc.verify("password", h1))
+        self.assertEqual(len(calls), 2)
+
+        #check repeated verify only parses once
+        cc.parse_cache = cache = LRUCache(1)
+        del calls[:]
+        self.assertTrue(cc.verify("password", h1))
+        self.assertFalse(cc.verify("wrong", h1))
+        self.assertEqual(cc.verify_and_update("password", h1), (True, None))
+        self.assertFalse(cc.hash_needs_update(h1))
+        self.assertEqual(calls, [h1])
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+        #check eviction
+        self.assertTrue(cc.verify("password", h2))
+        self.assertTrue(cc.verify("password", h1))
+        self.assertEqual(calls, [h1, h2, h1])
+        self.assertEqual(cache.evictions, 2)
+
+        #check entries are keyed by handler as well as hash
+        self.assertTrue(cc.verify("password", h3))
+        self.assertTrue((hash.des_crypt, h3) in cache)
+        self.assertFalse((counted_sha256_crypt, h1) in cache)
+
+        #check cache holds immutable state, and each call gets it's own instance
+        entry = cache.get((hash.des_crypt, h3))
+        self.assertTrue(isinstance(entry, tuple))
+        info1 = cc._parse_hash(hash.des_crypt, h3)
+        info2 = cc._parse_hash(hash.des_crypt, h3)
+        self.assertTrue(isinstance(info1, hash.des_crypt))
+        self.assertFalse(info1 is info2)
+        self.assertEqual(info1.to_string(), h3)
+        info1.checksum = None
+        self.assertEqual(cc._parse_hash(hash.des_crypt, h3).to_string(), h3)
+        self.assertTrue(cc.verify("password", h3))
+
+    def test_25_verify_cache(self):
+        "test verify_cache attribute"
+        calls = []
+        class counted_sha256_crypt(hash.sha256_crypt):
+            name = "counted_sha256_crypt"
+
+            def calc_checksum(self, secret):
+                calls.append(secret)
+                return super(counted_sha256_crypt, self).calc_checksum(secret)
+
+        cc = CryptContext([counted_sha256_crypt], all__min_rounds=1000)
+        h1 = cc.encrypt("password")
+        h2 = cc.encrypt("password")
+        cc.verify_cache = cache = VerifyCache(categories=[None, "service"])
+        self.assertTrue(cache.is_enabled())
+        self.assertFalse(cache.is_enabled("admin"))
+
+        #check successful verify is cached
+        del calls[:]
+        self.assertTrue(cc.verify("password", h1))
+        self.assertTrue(cc.verify("password", h1))
+        self.assertEqual(cc.verify_and_update("password", h1), (True, None))
+        self.assertTrue(cc.verify("password", h1, category="service"))
+        self.assertEqual(len(calls), 1)
+
+        #check failed verify isn't cached
+        del calls[:]
+        self.assertFalse(cc.verify("wrong", h1))
+        self.assertFalse(cc.verify("wrong", h1))
+        self.assertEqual(len(calls), 2)
+
+        #check new hash for same secret isn't a hit
+        del calls[:]
+        self.assertTrue(cc.verify("password", h2))
+        self.assertEqual(len(calls), 1)
+
+        #check disabled categories bypass cache
+        del calls[:]
+        self.assertTrue(cc.verify("password", h1, category="admin"))
+        self.assertTrue(cc.verify("password", h1, category="admin"))
+        self.assertEqual(len(calls), 2)
+
+        #check stats
+        stats = cache.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual((stats['hits'], stats['misses']), (3, 4))
+        self.assertAlmostEqual(stats['hit_rate'], 3.0/7)
+        cache.reset_stats()
+        self.assertEqual(cache.stats()['hit_rate'], 0)
+
+        #check replacing policy clears cache
+        cc.policy = cc.policy.replace(all__min_rounds=1000)
+        del calls[:]
+        self.assertTrue(cc.verify("password", h1))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['size'], 1)
+
+        #check entries expire
+        cache.ttl = -1
+        cache.clear()
+        del calls[:]
+        self.assertTrue(cc.verify("password", h1))
+        self.assertTrue(cc.verify("password", h1))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.expirations, 1)
+
+        #check counters are consistent under concurrent lookups
+        import threading
+        cache = VerifyCache()
+        hit = cache.make_key("password", h1)
+        cache.store(hit)
+        miss = cache.make_key("wrong", h1)
+        def worker():
+            for _ in xrange(500):
+                cache.lookup(hit)
+                cache.lookup(miss)
+        threads = [threading.Thread(target=worker) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2000, 2000))
+
+    def test_26_identify_index(self):
+        "test identify() dispatch index agrees with linear scan"
+        #NOTE: other tests may leave bad entries in the registry, so skip those.
+        handlers = []
+        for name in list_crypt_handlers():
+            try:
+                handlers.append(get_crypt_handler(name))
+            except (ValueError, ImportError):
+                pass
+        names = [ handler.name for handler in handlers ]
+        samples = [
+            '', '!', '*', '$', '$1$', '{SHA}', '{CRYPT}$1$',
+            '0' * 16, 'A' * 16, '0' * 32, 'G' * 32, '0' * 40, '*' + '0' * 40,
+            '0' * 16 + '\n', '0' * 32 + '\n', '0' * 40 + '\n', '0' * 16 + '\n\n',
+            u'$6$\u00e9',
+        ]
+        for handler in handlers:
+            try:
+                config = handler.genconfig()
+            except (ValueError, TypeError):
+                continue
+            if config:
+                samples.append(config)
+                samples.append(to_unicode(config, "ascii"))
+
+        def linear_identify(cc, value):
+            for handler in cc.policy.iter_handlers():
+                if handler.identify(value):
+                    return handler.name
+            return None
+
+        for schemes in (handlers, list(reversed(handlers))):
+            cc = CryptContext(schemes, policy=None)
+            for value in samples:
+                self.assertEqual(cc.identify(value), linear_identify(cc, value),
+                                 "hash=%r:" % (value,))
+
+        #fixed-size hashes w/ trailing newline should be identified same as before
+        cc = CryptContext(["mysql323", "oracle10", "md5_crypt"])
+        self.assertEqual(cc.identify("0" * 16 + "\n"), "mysql323")
+        self.assertEqual(cc.identify(u"0" * 16 + u"\n"), "mysql323")
+        self.assertEqual(cc.identify("0" * 16 + "\n\n"), None)
+
+        #candidates should be a small subset for prefixed hashes
+        cc = CryptContext(handlers, policy=None)
+        result = list(cc.policy.iter_candidates('$1$abcdefgh'))
+        self.assertTrue(hash.md5_crypt in result)
+        self.assertTrue(hash.sha512_crypt not in result)
+        self.assertTrue(len(result) < len(names)//2)
+
+    #=========================================================
+    #batch interface
+    #=========================================================
+    def test_27_coalesce_verify(self):
+        "test coalesce_verify with concurrent threads"
+        import threading
+        calls = []
+        release = threading.Event()
+
+        class BlockingHash(uh.StaticHandler):
+            "psuedo hash that waits until released"
+            name = "blocking_hash"
+
+            @classmethod
+            def identify(cls, hash):
+                return True
+
+            @classmethod
+            def genhash(cls, secret, hash):
+                calls.append(secret)
+                release.wait()
+                if secret == "error":
+                    raise ValueError("test error")
+                return secret
+
+        cc = CryptContext([BlockingHash])
+        cc.coalesce_verify = True
+
+        def run_threads(*secrets):
+            results = []
+            def worker(secret):
+                try:
+                    results.append(cc.verify(secret, "stub"))
+                except ValueError:
+                    results.append("error")
+            threads = [threading.Thread(target=worker, args=(secret,))
+                       for secret in secrets]
+            for thread in threads:
+                thread.start()
+            time.sleep(.2)
+            release.set()
+            for thread in threads:
+                thread.join()
+            release.clear()
+            return sorted(results)
+
+        #identical calls should share a single hash calculation
+        self.assertEqual(run_threads(*["stub"]*5), [True]*5)
+        self.assertEqual(calls, ["stub"])
+
+        #different secrets shouldn't be coalesced
+        del calls[:]
+        self.assertEqual(run_threads("stub", "stub", "wrong"), [False, True, True])
+        self.assertEqual(sorted(calls), ["stub", "wrong"])
+
+        #errors should be raised in all callers
+        del calls[:]
+        self.assertEqual(run_threads(*["error"]*3), ["error"]*3)
+        self.assertEqual(calls, ["error"])
+        self.assertEqual(cc._inflight.calls, {})
+
+        #shouldn't coalesce when disabled
+        del calls[:]
+        cc.coalesce_verify = False
+        self.assertEqual(run_threads(*["stub"]*3), [True]*3)
+        self.assertEqual(calls, ["stub"]*3)
+
+    def test_28_limiter(self):
+        "test ConcurrencyLimiter"
+        import threading
+        self.assertRaises(ValueError, ConcurrencyLimiter, 0)
+        self.assertRaises(ValueError, ConcurrencyLimiter, 1, max_queue=-1)
+        self.assertRaises(ValueError, ConcurrencyLimiter, 2, category_limits=dict(admin=0))
+
+        #check category slots are reserved out of max_concurrency
+        self.assertRaises(ValueError, ConcurrencyLimiter, 2, category_limits=dict(admin=2))
+        limiter = ConcurrencyLimiter(5, category_limits=dict(admin=1, service=2))
+        self.assertEqual(sum(stats['limit'] for stats in limiter.stats().values()), 5)
+        self.assertEqual(limiter.stats()[None]['limit'], 2)
+
+        #check immediate rejection when queue is disabled
+        limiter = ConcurrencyLimiter(2, max_queue=0, category_limits=dict(admin=1))
+        token = limiter.acquire()
+        self.assertRaises(HashingOverloaded, limiter.acquire)
+        self.assertRaises(HashingOverloaded, limiter.acquire, "user")
+
+        #check separate lane for admin category
+        limiter.release(limiter.acquire("admin"))
+        limiter.release(token)
+        limiter.release(limiter.acquire("user"))
+        stats = limiter.stats()
+        self.assertEqual(set(stats), set([None, "admin"]))
+        self.assertEqual(stats[None]['admitted'], 2)
+        self.assertEqual(stats[None]['rejected'], 2)
+        self.assertEqual(stats[None]['timeouts'], 0)
+        self.assertEqual(stats["admin"]['admitted'], 1)
+        limiter.reset_stats()
+        self.assertEqual(limiter.stats()[None]['rejected'], 0)
+
+        #check wait timeout
+        limiter = ConcurrencyLimiter(1, timeout=.1)
+        token = limiter.acquire()
+        start = time.time()
+        self.assertRaises(HashingOverloaded, limiter.acquire)
+        self.assertAlmostEqual(time.time() - start, .1, delta=.05)
+        self.assertEqual(limiter.stats()[None]['timeouts'], 1)
+
+        #check queued caller gets slot once released
+        limiter.timeout = None
+        results = []
+        def worker():
+            results.append(limiter.call(None, lambda: "done"))
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(.1)
+        stats = limiter.stats()[None]
+        self.assertEqual((stats['active'], stats['queued']), (1, 1))
+        limiter.release(token)
+        thread.join()
+        self.assertEqual(results, ["done"])
+        stats = limiter.stats()[None]
+        self.assertEqual((stats['active'], stats['queued'], stats['max_queued']), (0, 0, 1))
+        self.assertTrue(stats['max_wait'] >= .05)
+
+    def test_28_limiter_context(self):
+        "test CryptContext.limiter"
+        import threading
+        release = threading.Event()
+
+        class BlockingHash(uh.StaticHandler):
+            "psuedo hash that waits until released"
+            name = "blocking_hash"
+
+            @classmethod
+            def identify(cls, hash):
+                return True
+
+            @classmethod
+            def genhash(cls, secret, hash):
+                release.wait()
+                return secret
+
+        cc = CryptContext([BlockingHash])
+        cc.limiter = ConcurrencyLimiter(2, max_queue=0, category_limits=dict(admin=1))
+        thread = threading.Thread(target=cc.verify, args=("stub", "stub"))
+        thread.start()
+        try:
+            time.sleep(.1)
+            self.assertRaises(HashingOverloaded, cc.verify, "stub", "stub")
+            self.assertRaises(HashingOverloaded, cc.encrypt, "stub")
+            self.assertRaises(HashingOverloaded, cc.verify_and_update, "stub", "stub")
+            self.assertEqual(cc.limiter.stats()["admin"]['active'], 0)
+        finally:
+            release.set()
+            thread.join()
+        self.assertTrue(cc.verify("stub", "stub"))
+        self.assertEqual(cc.limiter.stats()[None]['rejected'], 3)
+
+    def test_29_metrics(self):
+        "test CryptContext.metrics"
+        cc = CryptContext(**self.sample_policy_1)
+        cc.metrics = metrics = CryptMetrics(bucket_bounds=[10, 1])
+        self.assertEqual(metrics.bucket_bounds, (1, 10))
+
+        h1 = cc.encrypt("password", scheme="des_crypt")
+        h2 = cc.encrypt("password", category="admin")
+        self.assertTrue(cc.verify("password", h1))
+        self.assertFalse(cc.verify("wrong", h2, category="admin"))
+        self.assertEqual(cc.verify_and_update("password", h2, category="admin")[1], None)
+        self.assertTrue(cc.hash_needs_update(h1))
+        self.assertIs(cc.identify("$9$abc"), None)
+
+        #check counters
+        self.assertEqual(metrics.get_count("verify_success", "des_crypt"), 1)
+        self.assertEqual(metrics.get_count("verify_failure", "sha256_crypt", "admin"), 1)
+        self.assertEqual(metrics.get_count("verify_success", "sha256_crypt", "admin"), 1)
+        self.assertEqual(metrics.get_count("deprecated", "des_crypt"), 1)
+        self.assertEqual(metrics.get_count("needs_update", "des_crypt"), 1)
+        self.assertEqual(metrics.get_count("identify_miss"), 1)
+
+        #check histograms
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['bucket_bounds'], [1, 10])
+        latency = dict(((entry['op'], entry['scheme'], entry['category']), entry)
+                        for entry in snapshot['latency'])
+        self.assertEqual(sorted(latency, key=repr), sorted([
+            ("encrypt", "des_crypt", None),
+            ("encrypt", "sha256_crypt", "admin"),
+            ("identify", "des_crypt", None),
+            ("identify", "sha256_crypt", "admin"),
+            ("verify", "des_crypt", None),
+            ("verify", "sha256_crypt", "admin"),
+            ], key=repr))
+        entry = latency["verify", "sha256_crypt", "admin"]
+        self.assertEqual(entry['count'], 2)
+        self.assertEqual(entry['buckets'], [2, 0, 0])
+        self.assertTrue(0 < entry['max'] <= entry['total'])
+        self.assertEqual(entry['backend'], hash.sha256_crypt.get_backend())
+        self.assertEqual(latency["identify", "des_crypt", None]['backend'], None)
+
+        #check reset
+        metrics.snapshot(reset=True)
+        self.assertEqual(metrics.snapshot()['latency'], [])
+        self.assertEqual(metrics.get_count("identify_miss"), 0)
+
+        #check min_verify_time overruns are counted
+        cc = CryptContext(["des_crypt"], min_verify_time=.000001)
+        cc.metrics = metrics
+        with catch_warnings(record=True):
+            warnings.simplefilter("always")
+            cc.verify("password", h1)
+        self.assertEqual(metrics.get_count("min_verify_time_overrun", "des_crypt"), 1)
+
+    def test_30_verify_many(self):
+        "test verify_many()"
+        cc = CryptContext(["md5_crypt", "des_crypt"], policy=None)
+        h1 = cc.encrypt("test", scheme="md5_crypt")
+        h2 = cc.encrypt("test", scheme="des_crypt")
+        pairs = [("test", h1), ("wrong", h1), ("test", h2), ("wrong", h2),
+                 ("test", None)] * 5
+        expected = [True, False, True, False, False] * 5
+
+        #check inline & pooled operation return results in order
+        self.assertEqual(cc.verify_many(pairs, workers=1), expected)
+        try:
+            self.assertEqual(cc.verify_many(pairs, workers=2), expected)
+            self.assertEqual(cc.verify_many(pairs, workers=2, chunksize=1), expected)
+            self.assertEqual(cc.verify_many([], workers=2), [])
+
+            #check scheme kwd
+            self.assertEqual(cc.verify_many(pairs[:2], scheme="md5_crypt", workers=2),
+                             [True, False])
+            self.assertRaises(ValueError, cc.verify_many, pairs[:2],
+                              scheme="des_crypt", workers=2)
+
+            #check unknown hash is fatal
+            self.assertRaises(ValueError, cc.verify_many, [("test", "$9$x")],
+                              workers=2)
+        finally:
+            cc.close_pool()
+
+    def test_32_verify_many_batch(self):
+        "test verify_many() hands pairs to handler's _verify_batch() hook"
+        from passlib.utils import md5_batch
+        cc = CryptContext(["apr_md5_crypt", "phpass", "des_crypt"], policy=None)
+        secrets = [ "test%d" % i for i in xrange(6) ]
+        pairs = []
+        expected = []
+        for scheme in ["apr_md5_crypt", "phpass", "des_crypt"]:
+            for secret in secrets:
+                h = cc.encrypt(secret, scheme=scheme, rounds=7) if scheme == "phpass" \
+                    else cc.encrypt(secret, scheme=scheme)
+                pairs.extend([(secret, h), ("wrong", h)])
+                expected.extend([True, False])
+        pairs.append(("test", None))
+        expected.append(False)
+
+        #force batch engine to be used even for small batches (if numpy is present)
+        orig = md5_batch.min_lanes
+        md5_batch.min_lanes = 1
+        try:
+            self.assertEqual(cc.verify_many(pairs, workers=1), expected)
+        finally:
+            md5_batch.min_lanes = orig
+        self.assertEqual(cc.verify_many(pairs, workers=1), expected)
+
+    def test_33_verify_many_context(self):
+        "test verify_many() honors verify_cache, limiter & metrics"
+        cc = CryptContext(["des_crypt", "sha256_crypt"], policy=None)
+        h1 = cc.encrypt("test", scheme="des_crypt")
+        h2 = cc.encrypt("test", scheme="sha256_crypt", rounds=1000)
+        pairs = [("test", h1), ("wrong", h1), ("test", h2), ("wrong", h2), ("test", None)]
+        expected = [True, False, True, False, False]
+        for workers in (1, 2):
+            cc.verify_cache = cache = VerifyCache()
+            cc.metrics = metrics = CryptMetrics()
+            cc.limiter = ConcurrencyLimiter(2)
+            try:
+                for _ in xrange(2):
+                    self.assertEqual(cc.verify_many(pairs, category="admin", workers=workers),
+                                     expected)
+            finally:
+                cc.close_pool()
+
+            #second round of successes should come from cache
+            self.assertEqual(cache.hits, 2)
+
+            #outcomes should be counted under the category
+            for name in ["des_crypt", "sha256_crypt"]:
+                self.assertEqual(metrics.get_count("verify_success", name, "admin"), 2)
+                self.assertEqual(metrics.get_count("verify_failure", name, "admin"), 2)
+
+            #hashing should have been admitted via limiter
+            self.assertTrue(cc.limiter.stats()[None]['admitted'] >= 2)
+
+    def test_34_batch_pool(self):
+        "test verify_many() / encrypt_many() pool management"
+        cc = CryptContext(["des_crypt"], policy=None)
+        h1 = cc.encrypt("test")
+        pairs = [("test", h1), ("wrong", h1)]
+
+        #small batches shouldn't start a pool unless workers is specified
+        self.assertEqual(cc.verify_many(pairs), [True, False])
+        self.assertEqual(len(cc.encrypt_many(["test"])), 1)
+        self.assertIs(cc._pool, None)
+
+        #limiter w/o enough free slots for 2 workers should run in-process
+        cc.limiter = ConcurrencyLimiter(1)
+        self.assertEqual(cc.verify_many(pairs, workers=2), [True, False])
+        self.assertIs(cc._pool, None)
+        self.assertEqual(cc.limiter.stats()[None]['active'], 0)
+        cc.limiter = None
+
+        #pool in use shouldn't be shut down until it's released
+        pool = cc._acquire_pool(2)
+        try:
+            cc.close_pool()
+            self.assertIs(cc._pool, None)
+            self.assertEqual(pool.map(abs, [-1, -2]), [1, 2])
+        finally:
+            cc._release_pool(pool)
+        self.assertRaises((AssertionError, ValueError), pool.map, abs, [-1])
+
+        #likewise if replaced by pool w/ different number of workers
+        pool = cc._acquire_pool(2)
+        try:
+            pool3 = cc._acquire_pool(3)
+            cc._release_pool(pool3)
+            self.assertIs(cc._pool, pool3)
+            self.assertEqual(pool.map(abs, [-1]), [1])
+        finally:
+            cc._release_pool(pool)
+            cc.close_pool()
+        self.assertIs(cc._pool, None)
+        self.assertEqual(cc._pool_users, {})
+
+    def test_31_encrypt_many(self):
+        "test encrypt_many()"
+        cc = CryptContext(["md5_crypt", "des_crypt"], policy=None)
+        secrets = [ "test%d" % i for i in xrange(20) ]
+        for workers in (1, 2):
+            try:
+                hashes = cc.encrypt_many(secrets, workers=workers)
+            finally:
+                cc.close_pool()
+            self.assertEqual(len(hashes), len(secrets))
+            self.assertEqual(len(set(hashes)), len(secrets))
+            for secret, value in zip(secrets, hashes):
+                self.assertEqual(cc.identify(value), "md5_crypt")
+                self.assertTrue(cc.verify(secret, value))
+
+        #check settings are passed through
+        hashes = cc.encrypt_many(secrets[:2], scheme="des_crypt", salt="ab",
+                                 workers=1)
+        self.assertEqual(hashes, [ hash.des_crypt.encrypt(secret, salt="ab")
+                                   for secret in secrets[:2] ])
+
+    #=========================================================
+    #asyncio interface
+    #=========================================================
+    def _get_async_loop(self):
+        "helper for asyncio tests - returns fresh event loop"
+        try:
+            import asyncio
+        except ImportError:
+            raise self.skipTest("asyncio not available")
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        def cleanup():
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.addCleanup(cleanup)
+        return loop
+
+    def _run_with_ticker(self, loop, future, interval=.01):
+        "run future to completion, counting how often loop serviced other callbacks"
+        ticks = [0]
+        def tick():
+            ticks[0] += 1
+            loop.call_later(interval, tick)
+        loop.call_soon(tick)
+        start = time.time()
+        result = loop.run_until_complete(future)
+        return time.time()-start, ticks[0], result
+
+    def test_40_async_basic(self):
+        "test encrypt_async(), verify_async(), hash_needs_update_async()"
+        loop = self._get_async_loop()
+        cc = CryptContext(**self.sample_policy_1)
+
+        def async_call(func, *args, **kwds):
+            return loop.run_until_complete(func(*args, **kwds))
+
+        h1 = async_call(cc.encrypt_async, "password")
+        self.assertEqual(cc.identify(h1), "sha256_crypt")
+        h2 = async_call(cc.encrypt_async, "password", scheme="des_crypt")
+        self.assertEqual(cc.identify(h2), "des_crypt")
+
+        self.assertTrue(async_call(cc.verify_async, "password", h1))
+        self.assertFalse(async_call(cc.verify_async, "wrong", h1))
+        self.assertFalse(async_call(cc.verify_async, "password", None))
+        self.assertRaises(ValueError, async_call, cc.verify_async, "password", "$9$x")
+
+        self.assertFalse(async_call(cc.hash_needs_update_async, h1))
+        self.assertTrue(async_call(cc.hash_needs_update_async, h2))
+
+        self.assertEqual(async_call(cc.verify_and_update_async, "wrong", h2), (False, None))
+        self.assertEqual(async_call(cc.verify_and_update_async, "password", h1), (True, None))
+        ok, new_hash = async_call(cc.verify_and_update_async, "password", h2)
+        self.assertTrue(ok)
+        self.assertEqual(cc.identify(new_hash), "sha256_crypt")
+
+    def test_41_async_nonblocking(self):
+        "test verify_async() doesn't block event loop"
+        loop = self._get_async_loop()
+        delay = .2
+
+        class TimedHash(uh.StaticHandler):
+            "psuedo hash that takes specified amount of time"
+            name = "timed_hash"
+
+            @classmethod
+            def identify(cls, hash):
+                return True
+
+            @classmethod
+            def genhash(cls, secret, hash):
+                time.sleep(delay)
+                return secret
+
+        #loop should keep running while hash is calculated
+        cc = CryptContext([TimedHash])
+        elapsed, ticks, result = self._run_with_ticker(loop,
+            cc.verify_async("stub", "stub"))
+        self.assertTrue(result)
+        self.assertAlmostEqual(elapsed, delay, delta=.1)
+        self.assertTrue(ticks > 5, "ticks=%r" % (ticks,))
+
+        #min_verify_time padding shouldn't block the loop either
+        cc = CryptContext([TimedHash], min_verify_time=delay*2)
+        elapsed, ticks, result = self._run_with_ticker(loop,
+            cc.verify_async("stub", "wrong"))
+        self.assertFalse(result)
+        self.assertAlmostEqual(elapsed, delay*2, delta=.1)
+        self.assertTrue(ticks > 15, "ticks=%r" % (ticks,))
+
+        elapsed, ticks, result = self._run_with_ticker(loop,
+            cc.verify_and_update_async("stub", "stub"))
+        self.assertEqual(result, (True, None))
+        self.assertAlmostEqual(elapsed, delay*2, delta=.1)
+        self.assertTrue(ticks > 15, "ticks=%r" % (ticks,))
+
+    def test_42_async_coalesce(self):
+        "test coalesce_verify with verify_async()"
+        loop = self._get_async_loop()
+        calls = []
+
+        class TimedHash(uh.StaticHandler):
+            "psuedo hash that takes a while to calculate"
+            name = "timed_hash"
+
+            @classmethod
+            def identify(cls, hash):
+                return True
+
+            @classmethod
+            def genhash(cls, secret, hash):
+                calls.append(secret)
+                time.sleep(.1)
+                return secret
+
+        cc = CryptContext([TimedHash])
+        cc.coalesce_verify = True
+        futures = [cc.verify_async("stub", "stub") for _ in range(5)]
+        futures.append(cc.verify_async("wrong", "stub"))
+        results = [loop.run_until_complete(future) for future in futures]
+        self.assertEqual(results, [True]*5 + [False])
+        self.assertEqual(sorted(calls), ["stub", "wrong"])
+        self.assertEqual(cc._inflight.futures, {})
+
     #=========================================================
     # other
     #=========================================================
+    def test_80_backend_option(self):
+        "test backend option"
+        from passlib import calibrate
+        class dummy_1(uh.HasManyBackends, uh.GenericHandler):
+            name = 'dummy_1'
+            setting_kwds = ()
+            backends = ("a", "b")
+            _has_backend_a = _has_backend_b = True
+
+            @classmethod
+            def from_string(cls, hash):
+                return cls(checksum=hash[4:] or None)
+
+            def to_string(self):
+                return "$d1$" + (self.checksum or "")
+
+            def _calc_checksum_a(self, secret):
+                time.sleep(.005)
+                return 'x'
+
+            def _calc_checksum_b(self, secret):
+                return 'x'
+
+        #check explicit backend
+        cc = CryptContext([dummy_1, "md5_crypt"], dummy_1__backend="a")
+        self.assertEqual(cc.policy.get_backend("dummy_1"), "a")
+        self.assertEqual(cc.policy.get_backend("md5_crypt"), None)
+        self.assertEqual(dummy_1.get_backend(), "a")
+        self.assertEqual(cc.encrypt("test"), "$d1$x")
+
+        #check context-wide backend name only applies to handlers which offer it,
+        #but hash-specific backend names are still checked
+        CryptContext([dummy_1, "md5_crypt"], all__backend="b")
+        self.assertEqual(dummy_1.get_backend(), "b")
+        CryptContext([dummy_1, "md5_crypt"], all__backend="builtin")
+        self.assertEqual(dummy_1.get_backend(), "b")
+        self.assertRaises(ValueError, CryptContext, [dummy_1], dummy_1__backend="builtin")
+
+        #check backend is loaded when policy is assigned
+        cc2 = CryptContext([dummy_1])
+        cc2.policy = cc2.policy.replace(dummy_1__backend="a")
+        self.assertEqual(dummy_1.get_backend(), "a")
+
+        #check context-wide fastest backend (md5_crypt has only one backend)
+        orig_path = calibrate.cache_path
+        calibrate.cache_path = None
+        calibrate.clear_cache()
+        try:
+            cc = cc.replace(all__backend="fastest")
+            self.assertEqual(cc.policy.get_backend("md5_crypt"), "fastest")
+            self.assertEqual(cc.policy.get_backend("dummy_1"), "a")
+            cc = CryptContext([dummy_1], all__backend="fastest")
+            self.assertTrue("all.backend = fastest" in cc.policy.to_string())
+
+            #benchmark should be deferred until handler is first used
+            self.assertEqual(dummy_1.get_backend(), "a")
+            self.assertEqual(cc.encrypt("test"), "$d1$x")
+            self.assertEqual(dummy_1.get_backend(), "b")
+
+            #verify() should trigger it too
+            dummy_1.set_backend("a")
+            cc.policy = cc.policy
+            self.assertEqual(dummy_1.get_backend(), "a")
+            self.assertTrue(cc.verify("test", "$d1$x"))
+            self.assertEqual(dummy_1.get_backend(), "b")
+        finally:
+            calibrate.cache_path = orig_path
+            calibrate.clear_cache()
+
     def test_90_bcrypt_normhash(self):
         "teset verify_and_update / hash_needs_update corrects bcrypt padding"
         # see issue 25.
@@ -242,6 +242,7 @@ hash.bcrypt._no_backends_msg() #call this for coverage purposes
 #create test cases for specific backends
 Pybcrypt_BCryptTest = create_backend_case(_BCryptTest, "pybcrypt")
 Bcryptor_BCryptTest = create_backend_case(_BCryptTest, "bcryptor")
+CryptR_BCryptTest = create_backend_case(_BCryptTest, "crypt_r")
 OsCrypt_BCryptTest = create_backend_case(_BCryptTest, "os_crypt")
 
 #=========================================================
@@ -249,7 +250,25 @@ OsCrypt_BCryptTest = create_backend_case(_BCryptTest, "os_crypt")
 #=========================================================
 from passlib.handlers.des_crypt import bigcrypt
 
-class BigCryptTest(HandlerCase):
+class _DesBatchMixin(object):
+    "tests for _verify_batch() of the des-based handlers"
+
+    def test_verify_batch(self):
+        "test _verify_batch() matches verify()"
+        from passlib.utils import des
+        handler = self.handler
+        pairs = []
+        for secret, hash in self.known_correct_hashes:
+            pairs.extend([(secret, hash), ("x" + secret, hash)])
+        orig = des.bs_min_lanes
+        des.bs_min_lanes = 1
+        try:
+            self.assertEqual(handler._verify_batch(pairs),
+                             [True, False] * len(self.known_correct_hashes))
+        finally:
+            des.bs_min_lanes = orig
+
+class BigCryptTest(_DesBatchMixin, HandlerCase):
     handler = bigcrypt
 
     #TODO: find an authortative source of test vectors,
@@ -270,7 +289,7 @@ class BigCryptTest(HandlerCase):
 #=========================================================
 #bsdi crypt
 #=========================================================
-class _BSDiCryptTest(HandlerCase):
+class _BSDiCryptTest(_DesBatchMixin, HandlerCase):
     "test BSDiCrypt algorithm"
     handler = hash.bsdi_crypt
     known_correct_hashes = [
@@ -285,6 +304,7 @@ class _BSDiCryptTest(HandlerCase):
        "_K1.!crsmZxOLzfJH8iw"
     ]
 
+CryptR_BSDiCryptTest = create_backend_case(_BSDiCryptTest, "crypt_r")
 OsCrypt_BSDiCryptTest = create_backend_case(_BSDiCryptTest, "os_crypt")
 Builtin_BSDiCryptTest = create_backend_case(_BSDiCryptTest, "builtin")
 
@@ -293,7 +313,7 @@ Builtin_BSDiCryptTest = create_backend_case(_BSDiCryptTest, "builtin")
 #=========================================================
 from passlib.handlers.des_crypt import crypt16
 
-class Crypt16Test(HandlerCase):
+class Crypt16Test(_DesBatchMixin, HandlerCase):
     handler = crypt16
     secret_chars = 16
 
@@ -314,7 +334,7 @@ class Crypt16Test(HandlerCase):
 #=========================================================
 from passlib.handlers.des_crypt import des_crypt
 
-class _DesCryptTest(HandlerCase):
+class _DesCryptTest(_DesBatchMixin, HandlerCase):
     "test des-crypt algorithm"
     handler = des_crypt
     secret_chars = 8
@@ -337,6 +357,7 @@ class _DesCryptTest(HandlerCase):
     def test_invalid_secret_chars(self):
         self.assertRaises(ValueError, self.do_encrypt, 'sec\x00t')
 
+CryptR_DesCryptTest = create_backend_case(_DesCryptTest, "crypt_r")
 OsCrypt_DesCryptTest = create_backend_case(_DesCryptTest, "os_crypt")
 Builtin_DesCryptTest = create_backend_case(_DesCryptTest, "builtin")
 
@@ -584,6 +605,7 @@ class _LdapMd5CryptTest(HandlerCase):
         '{CRYPT}$1$dOHYPKoP$tnxS1T8Q6VVn3kpV8cN6o!',
         ]
 
+CryptR_LdapMd5CryptTest = create_backend_case(_LdapMd5CryptTest, "crypt_r")
 OsCrypt_LdapMd5CryptTest = create_backend_case(_LdapMd5CryptTest, "os_crypt")
 Builtin_LdapMd5CryptTest = create_backend_case(_LdapMd5CryptTest, "builtin")
 
@@ -651,9 +673,79 @@ class _Md5CryptTest(HandlerCase):
     def test_raw(self):
         self.assertEqual(raw_md5_crypt(u's',u's'*16), u'YgmLTApYTv12qgTwBoj8i/')
 
+CryptR_Md5CryptTest = create_backend_case(_Md5CryptTest, "crypt_r")
 OsCrypt_Md5CryptTest = create_backend_case(_Md5CryptTest, "os_crypt")
 Builtin_Md5CryptTest = create_backend_case(_Md5CryptTest, "builtin")
 
+class Md5CryptParityTest(TestCase):
+    "check table-driven md5-crypt matches straightforward implementation"
+    case_prefix = "md5-crypt builtin parity"
+
+    @staticmethod
+    def reference(secret, salt, magic):
+        "direct implementation of md5-crypt, following the original C code"
+        from hashlib import md5
+        from passlib.handlers.md5_crypt import _chk_offsets
+        from passlib.utils import h64
+        h = md5(secret + magic + salt)
+        tmp = md5(secret + salt + secret).digest()
+        for i in range(len(secret)):
+            h.update(tmp[i % 16:i % 16 + 1])
+        i = len(secret)
+        while i:
+            h.update(b('\x00') if i & 1 else secret[:1])
+            i >>= 1
+        result = h.digest()
+        for i in range(1000):
+            h = md5(secret if i % 2 else result)
+            if i % 3:
+                h.update(salt)
+            if i % 7:
+                h.update(secret)
+            h.update(result if i % 2 else secret)
+            result = h.digest()
+        return h64.encode_transposed_bytes(result, _chk_offsets).decode("ascii")
+
+    def test_reference(self):
+        "test raw_md5_crypt() against reference implementation"
+        from passlib.utils import getrandbytes, getrandstr, rng
+        charset = u"./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+        for size in list(range(0, 34)) + [63, 64, 65, 127, 128, 255, 256, 300]:
+            secret = getrandbytes(rng, size)
+            salt = getrandstr(rng, charset, rng.randint(0, 8)).encode("ascii")
+            for apr, magic in [(False, b("$1$")), (True, b("$apr1$"))]:
+                self.assertEqual(raw_md5_crypt(secret, salt, apr),
+                                 self.reference(secret, salt, magic),
+                                 "raw_md5_crypt(%r, %r, %r):" % (secret, salt, apr))
+
+    def test_os_crypt(self):
+        "test raw_md5_crypt() against os_crypt"
+        from passlib.utils import safe_os_crypt
+        if not md5_crypt.has_backend("os_crypt"):
+            raise self.skipTest("os_crypt() doesn't support md5_crypt")
+        for secret, salt in [(u"", u""), (u"test", u"salt"), (u"x" * 100, u"saltsalt"),
+                             (UPASS_TABLE, u"abc")]:
+            ok, result = safe_os_crypt(secret, u"$1$" + salt)
+            self.assertTrue(ok)
+            self.assertEqual(raw_md5_crypt(secret, salt), result.split(u"$")[-1])
+
+    def test_batch(self):
+        "test raw_md5_crypt_batch() against raw_md5_crypt()"
+        from passlib.handlers.md5_crypt import raw_md5_crypt_batch
+        from passlib.utils import getrandbytes, getrandstr, md5_batch, rng
+        charset = u"./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+        pairs = [ (getrandbytes(rng, size), getrandstr(rng, charset, rng.randint(0, 8)))
+                  for size in list(range(0, 34)) + [63, 64, 65, 127] ]
+        pairs.append((UPASS_TABLE, u"abc"))
+        orig = md5_batch.min_lanes
+        md5_batch.min_lanes = 1
+        try:
+            for apr in (False, True):
+                self.assertEqual(raw_md5_crypt_batch(pairs, apr),
+                                 [ raw_md5_crypt(secret, salt, apr) for secret, salt in pairs ])
+        finally:
+            md5_batch.min_lanes = orig
+
 #=========================================================
 #mysql 323 & 41
 #=========================================================
@@ -792,7 +884,7 @@ class Oracle11Test(HandlerCase):
 #=========================================================
 from passlib.handlers import pbkdf2 as pk2
 
-class AtlassianPbkdf2Sha1Test(HandlerCase):
+class _AtlassianPbkdf2Sha1Test(HandlerCase):
     handler = pk2.atlassian_pbkdf2_sha1
     known_correct_hashes = [
         ("admin", '{PKCS5S2}c4xaeTQM0lUieMS3V5voiexyX9XhqC2dBd5ecVy60IPksHChwoTAVYFrhsgoq8/p'),
@@ -811,7 +903,10 @@ class AtlassianPbkdf2Sha1Test(HandlerCase):
         '{PKCS5S2}c4xaeTQM0lUieMS3V5voiexyX9XhqC2dBd5ecVy60IPksHChwoTAVYFrhsgoq8/='
     ]
 
-class Pbkdf2Sha1Test(HandlerCase):
+Hashlib_AtlassianPbkdf2Sha1Test = create_backend_case(_AtlassianPbkdf2Sha1Test, "hashlib")
+Builtin_AtlassianPbkdf2Sha1Test = create_backend_case(_AtlassianPbkdf2Sha1Test, "builtin")
+
+class _Pbkdf2Sha1Test(HandlerCase):
     handler = pk2.pbkdf2_sha1
     known_correct_hashes = [
         ("password", '$pbkdf2$1212$OB.dtnSEXZK8U5cgxU/GYQ$y5LKPOplRmok7CZp/aqVDVg8zGI'),
@@ -819,7 +914,10 @@ class Pbkdf2Sha1Test(HandlerCase):
             '$pbkdf2$1212$THDqatpidANpadlLeTeOEg$HV3oi1k5C5LQCgG1BMOL.BX4YZc'),
     ]
 
-class Pbkdf2Sha256Test(HandlerCase):
+Hashlib_Pbkdf2Sha1Test = create_backend_case(_Pbkdf2Sha1Test, "hashlib")
+Builtin_Pbkdf2Sha1Test = create_backend_case(_Pbkdf2Sha1Test, "builtin")
+
+class _Pbkdf2Sha256Test(HandlerCase):
     handler = pk2.pbkdf2_sha256
     known_correct_hashes = [
         ("password",
@@ -830,7 +928,10 @@ class Pbkdf2Sha256Test(HandlerCase):
             ),
     ]
 
-class Pbkdf2Sha512Test(HandlerCase):
+Hashlib_Pbkdf2Sha256Test = create_backend_case(_Pbkdf2Sha256Test, "hashlib")
+Builtin_Pbkdf2Sha256Test = create_backend_case(_Pbkdf2Sha256Test, "builtin")
+
+class _Pbkdf2Sha512Test(HandlerCase):
     handler = pk2.pbkdf2_sha512
     known_correct_hashes = [
         ("password",
@@ -843,7 +944,10 @@ class Pbkdf2Sha512Test(HandlerCase):
             ),
     ]
 
-class CtaPbkdf2Sha1Test(HandlerCase):
+Hashlib_Pbkdf2Sha512Test = create_backend_case(_Pbkdf2Sha512Test, "hashlib")
+Builtin_Pbkdf2Sha512Test = create_backend_case(_Pbkdf2Sha512Test, "builtin")
+
+class _CtaPbkdf2Sha1Test(HandlerCase):
     handler = pk2.cta_pbkdf2_sha1
     known_correct_hashes = [
         #test vectors from original implementation
@@ -855,7 +959,10 @@ class CtaPbkdf2Sha1Test(HandlerCase):
             "$p5k2$4321$OTg3NjU0MzIx$jINJrSvZ3LXeIbUdrJkRpN62_WQ="),
         ]
 
-class DlitzPbkdf2Sha1Test(HandlerCase):
+Hashlib_CtaPbkdf2Sha1Test = create_backend_case(_CtaPbkdf2Sha1Test, "hashlib")
+Builtin_CtaPbkdf2Sha1Test = create_backend_case(_CtaPbkdf2Sha1Test, "builtin")
+
+class _DlitzPbkdf2Sha1Test(HandlerCase):
     handler = pk2.dlitz_pbkdf2_sha1
     known_correct_hashes = [
         #test vectors from original implementation
@@ -867,7 +974,10 @@ class DlitzPbkdf2Sha1Test(HandlerCase):
                     '$p5k2$$KosHgqNo$9mjN8gqjt02hDoP0c2J0ABtLIwtot8cQ'),
         ]
 
-class GrubPbkdf2Sha512Test(HandlerCase):
+Hashlib_DlitzPbkdf2Sha1Test = create_backend_case(_DlitzPbkdf2Sha1Test, "hashlib")
+Builtin_DlitzPbkdf2Sha1Test = create_backend_case(_DlitzPbkdf2Sha1Test, "builtin")
+
+class _GrubPbkdf2Sha512Test(HandlerCase):
     handler = pk2.grub_pbkdf2_sha512
     known_correct_hashes = [
         #test vectors generated from cmd line tool
@@ -891,6 +1001,9 @@ class GrubPbkdf2Sha512Test(HandlerCase):
 
         ]
 
+Hashlib_GrubPbkdf2Sha512Test = create_backend_case(_GrubPbkdf2Sha512Test, "hashlib")
+Builtin_GrubPbkdf2Sha512Test = create_backend_case(_GrubPbkdf2Sha512Test, "builtin")
+
 #=========================================================
 #PHPass Portable Crypt
 #=========================================================
@@ -910,6 +1023,22 @@ class PHPassTest(HandlerCase):
         '$P$9IQRaTwmfeRo7ud9Fh4E2PdI0S3r!L0',
         ]
 
+    def test_calc_checksum_batch(self):
+        "test calc_checksum_batch() against calc_checksum()"
+        from passlib.utils import getrandbytes, md5_batch, rng
+        handler = self.handler
+        pairs = [ (getrandbytes(rng, size), handler(rounds=7).salt)
+                  for size in list(range(0, 50)) + [63, 64, 65, 127] ]
+        pairs.append((UPASS_TABLE, u"abcdefgh"))
+        expected = [ handler(salt=salt, rounds=7).calc_checksum(secret)
+                     for secret, salt in pairs ]
+        orig = md5_batch.min_lanes
+        md5_batch.min_lanes = 1
+        try:
+            self.assertEqual(handler.calc_checksum_batch(pairs, 7), expected)
+        finally:
+            md5_batch.min_lanes = orig
+
     def test_idents(self):
         handler = self.handler
 
@@ -1022,6 +1151,7 @@ class _SHA1CryptTest(HandlerCase):
         '$sha1$01773$uV7PTeux$I9oHnvwPZHMO0Nq6/WgyGV/tDJIH',
     ]
 
+CryptR_SHA1CryptTest = create_backend_case(_SHA1CryptTest, "crypt_r")
 OsCrypt_SHA1CryptTest = create_backend_case(_SHA1CryptTest, "os_crypt")
 Builtin_SHA1CryptTest = create_backend_case(_SHA1CryptTest, "builtin")
 
@@ -1131,6 +1261,7 @@ class _SHA256CryptTest(HandlerCase):
             )
         self.assertRaises(ValueError, raw_sha_crypt, b('secret'), b('$'), 1, hashlib.md5)
 
+CryptR_SHA256CryptTest = create_backend_case(_SHA256CryptTest, "crypt_r")
 OsCrypt_SHA256CryptTest = create_backend_case(_SHA256CryptTest, "os_crypt")
 Builtin_SHA256CryptTest = create_backend_case(_SHA256CryptTest, "builtin")
 
@@ -1195,9 +1326,42 @@ class _SHA512CryptTest(HandlerCase):
     def filter_known_config_warnings(self):
         warnings.filterwarnings("ignore", "sha512_crypt does not allow less than 1000 rounds: 10", UserWarning)
 
+CryptR_SHA512CryptTest = create_backend_case(_SHA512CryptTest, "crypt_r")
 OsCrypt_SHA512CryptTest = create_backend_case(_SHA512CryptTest, "os_crypt")
 Builtin_SHA512CryptTest = create_backend_case(_SHA512CryptTest, "builtin")
 
+class ShaCryptParityTest(TestCase):
+    "check builtin sha2-crypt backend matches os crypt() byte-for-byte"
+    case_prefix = "sha2-crypt builtin/os_crypt parity"
+
+    def check_parity(self, handler, raw_func, ident):
+        from passlib.utils import safe_os_crypt, getrandstr, rng
+        if not handler.has_backend("os_crypt"):
+            raise self.skipTest("os_crypt() doesn't support %s" % (handler.name,))
+        charset = u"./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+        #rounds chosen to cover full & partial 42-round cycles,
+        #secrets cover lengths around digest size boundaries.
+        for rounds in [1000, 1001, 1007, 1008, 1050, 1051, 1091, 1092, 1093]:
+            for size in [0, 1, 15, 31, 32, 33, 63, 64, 65, 100]:
+                secret = getrandstr(rng, charset, size)
+                salt = getrandstr(rng, charset, rng.randint(0, 16))
+                chk = raw_func(secret.encode("ascii"), salt.encode("ascii"), rounds)[0]
+                config = u"%srounds=%d$%s" % (ident, rounds, salt)
+                ok, result = safe_os_crypt(secret, config)
+                self.assertTrue(ok)
+                self.assertEqual(chk.decode("ascii"), result.split(u"$")[-1],
+                                 "%s(%r, %r):" % (handler.name, secret, config))
+
+    def test_sha256_crypt(self):
+        "test sha256_crypt builtin backend against os_crypt"
+        from passlib.handlers.sha2_crypt import raw_sha256_crypt
+        self.check_parity(sha256_crypt, raw_sha256_crypt, u"$5$")
+
+    def test_sha512_crypt(self):
+        "test sha512_crypt builtin backend against os_crypt"
+        from passlib.handlers.sha2_crypt import raw_sha512_crypt
+        self.check_parity(sha512_crypt, raw_sha512_crypt, u"$6$")
+
 #=========================================================
 #sun md5 crypt
 #=========================================================
@@ -5,6 +5,7 @@
 from __future__ import with_statement
 #core
 from binascii import hexlify, unhexlify
+import logging; log = logging.getLogger(__name__)
 import sys
 import random
 import warnings
@@ -16,7 +17,7 @@ from passlib import utils
 from passlib.utils import h64, des, Undef, sys_bits, bytes, b, \
     native_str, to_bytes, to_unicode, to_native_str, to_hash_str, \
     is_same_codec, is_ascii_safe, safe_os_crypt, md4 as md4_mod
-from passlib.tests.utils import TestCase, Params as ak, \
+from passlib.tests.utils import TestCase, Params as ak, mktemp, \
     enable_option, catch_warnings
 
 def hb(source):
@@ -105,6 +106,49 @@ class MiscTest(TestCase):
 
         rng.seed(utils.genseed(rng))
 
+    def test_lru_cache(self):
+        "test LRUCache"
+        cache = utils.LRUCache(3)
+        self.assertRaises(ValueError, utils.LRUCache, 0)
+
+        #check basic get/set
+        self.assertIs(cache.get("a"), None)
+        self.assertEqual(cache.get("a", 1), 1)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(len(cache), 3)
+
+        #check least recently used entry is evicted ("a" was just used)
+        cache.set("d", 4)
+        self.assertEqual(len(cache), 3)
+        self.assertFalse("b" in cache)
+        self.assertTrue("a" in cache)
+
+        #check overwriting existing entry doesn't evict
+        cache.set("c", 5)
+        self.assertEqual(cache.get("c"), 5)
+        self.assertEqual(len(cache), 3)
+
+        #check pop
+        self.assertEqual(cache.pop("c"), 5)
+        self.assertIs(cache.pop("c"), None)
+        cache.set("e", 6)
+        cache.set("f", 7)
+        self.assertEqual(sorted(cache._map), ["d", "e", "f"])
+
+        #check stats
+        self.assertEqual(cache.stats(), dict(size=3, maxsize=3, hits=2,
+                                             misses=2, evictions=2))
+        cache.reset_stats()
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (0, 0, 0))
+
+        #check clear
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIs(cache.get("d"), None)
+
     def test_safe_os_crypt(self):
         "test safe_os_crypt() wrapper"
         if not safe_os_crypt:
@@ -142,6 +186,130 @@ class MiscTest(TestCase):
         #self.assertEqual(ret, (False, None))
         # end Py3k #
 
+    def test_os_crypt_supports(self):
+        "test os_crypt_supports() probe cache"
+        from passlib import calibrate
+        calls = []
+        def fake_os_crypt(secret, hash):
+            calls.append(hash)
+            if hash.startswith(u"$x$"):
+                return True, u"*0"
+            return True, hash
+        orig = utils.safe_os_crypt, utils.persist_os_crypt_probes, calibrate.cache_path
+        utils.safe_os_crypt = fake_os_crypt
+        utils._os_crypt_probes.clear()
+        calibrate.cache_path = mktemp()
+        calibrate.clear_cache()
+        try:
+            #check results are memoized
+            self.assertTrue(utils.os_crypt_supports(u"aa", u"bb"))
+            self.assertFalse(utils.os_crypt_supports(u"$x$"))
+            self.assertTrue(utils.os_crypt_supports(u"aa", u"bb"))
+            self.assertFalse(utils.os_crypt_supports(u"$x$"))
+            self.assertEqual(calls, [u"aa", u"bb", u"$x$"])
+
+            #check results are persisted on disk when enabled
+            utils.persist_os_crypt_probes = True
+            utils._os_crypt_probes.clear()
+            del calls[:]
+            self.assertTrue(utils.os_crypt_supports(u"aa"))
+            self.assertFalse(utils.os_crypt_supports(u"$x$"))
+            utils._os_crypt_probes.clear()
+            calibrate.clear_cache()
+            self.assertTrue(utils.os_crypt_supports(u"aa"))
+            self.assertFalse(utils.os_crypt_supports(u"$x$"))
+            self.assertEqual(calls, [u"aa", u"$x$"])
+            self.assertTrue(calibrate.get_probe_id().startswith("probe "))
+
+            #check missing os_crypt
+            utils.safe_os_crypt = None
+            self.assertFalse(utils.os_crypt_supports(u"aa"))
+        finally:
+            utils.safe_os_crypt, utils.persist_os_crypt_probes, calibrate.cache_path = orig
+            utils._os_crypt_probes.clear()
+            calibrate.clear_cache()
+
+    def test_safe_crypt_r(self):
+        "test safe_crypt_r() wrapper"
+        if not utils.has_crypt_r():
+            raise self.skipTest("libcrypt crypt_r() not available")
+        safe_crypt_r = utils.safe_crypt_r
+
+        #test normal case
+        ok, hash = safe_crypt_r(u'test', u'aa')
+        self.assertTrue(ok)
+        self.assertIsInstance(hash, unicode)
+        self.assertEqual(hash, u'aaqPiZY5xR5l.')
+
+        #test hash-as-bytes
+        self.assertRaises(TypeError, safe_crypt_r, u'test', b('aa'))
+
+        #test password as ascii, unicode w/ high char, utf-8 w/ high char
+        self.assertEqual(safe_crypt_r(b('test'), u'aa'), (True, u'aaqPiZY5xR5l.'))
+        self.assertEqual(safe_crypt_r(u'test\u1234', u'aa'), (True, u'aahWwbrUsKZk.'))
+        self.assertEqual(safe_crypt_r(b('test\xe1\x88\xb4'), u'aa'), (True, u'aahWwbrUsKZk.'))
+
+        #test latin-1 password (unlike os_crypt, works under py3 too)
+        self.assertEqual(safe_crypt_r(b('test\xff'), u'aa'), (True, u'aaOx.5nbTU/.M'))
+
+        #test null chars & unsupported configs are refused
+        self.assertEqual(safe_crypt_r(b('te\x00st'), u'aa'), (False, None))
+        self.assertEqual(safe_crypt_r(u'test', u'$x$abc'), (False, None))
+
+    def test_crypt_r_threads(self):
+        "test safe_crypt_r() from multiple threads"
+        #NOTE: this doubles as a small benchmark - the speedup is logged,
+        #      but only asserted when PASSLIB_TESTS includes "bench",
+        #      since it depends on the number of cpus & system load.
+        if not utils.has_crypt_r():
+            raise self.skipTest("libcrypt crypt_r() not available")
+        if not utils.crypt_r_supports(u"$1$test$pi/xDtU5WFVRqYS6BMU8X/"):
+            raise self.skipTest("libcrypt doesn't support md5_crypt")
+        from time import time as timer
+        from passlib.utils import threading
+        try:
+            from multiprocessing import cpu_count
+            cpus = cpu_count()
+        except (ImportError, NotImplementedError):
+            cpus = 1
+        threads = max(2, min(cpus, 4))
+        secret, config = u"test", u"$1$test$"
+        expected = u"$1$test$pi/xDtU5WFVRqYS6BMU8X/"
+        count = 200
+
+        def worker(results):
+            for _ in range(count):
+                results.append(utils.safe_crypt_r(secret, config))
+
+        #time hashes run serially, in a single thread
+        serial = []
+        start = timer()
+        for _ in range(threads):
+            worker(serial)
+        serial_time = timer() - start
+
+        #time same number of hashes divided across threads
+        results = [[] for _ in range(threads)]
+        tasks = [threading.Thread(target=worker, args=(r,)) for r in results]
+        start = timer()
+        for task in tasks:
+            task.start()
+        for task in tasks:
+            task.join()
+        threaded_time = timer() - start
+
+        #each thread should have had it's own buffer, and gotten the right answer
+        for result in [serial] + results:
+            self.assertEqual(result, [(True, expected)] * len(result))
+        self.assertEqual(sum(len(r) for r in results), len(serial))
+
+        speedup = serial_time / max(threaded_time, 1e-6)
+        log.info("crypt_r: %d threads on %d cpus: %.2fx speedup over serial",
+                 threads, cpus, speedup)
+        if enable_option("bench") and cpus > 1:
+            self.assertTrue(speedup > 1.3, "crypt_r didn't scale across "
+                            "threads: %.2fx speedup" % speedup)
+
 #=========================================================
 #byte/unicode helpers
 #=========================================================
@@ -340,6 +508,117 @@ b("""    0000000000000000 0000000000000000 8CA64DE9C1B123A7
             result = des.mdes_encrypt_int_block(k,p, salt=0, rounds=1)
             self.assertEqual(result, c, "key=%r p=%r:" % (k,p))
 
+    def test_mdes_encrypt_int_blocks(self):
+        "test mdes_encrypt_int_blocks()"
+        mdes_encrypt_int_blocks = des.mdes_encrypt_int_blocks
+
+        #check against known des vectors
+        vectors = [ (int(k,16), int(p,16), int(c,16)) for k,p,c in self.test_des_vectors ]
+        keys, inputs, outputs = zip(*vectors)
+        self.assertEqual(mdes_encrypt_int_blocks(list(keys), list(inputs), 0, 1),
+                         list(outputs))
+
+        #check against mdes_encrypt_int_block() using random salts & rounds
+        rng = random.Random(1234)
+        keys = [ rng.getrandbits(64) for i in xrange(100) ]
+        inputs = [ rng.getrandbits(64) for i in xrange(100) ]
+        salts = [ rng.getrandbits(24) for i in xrange(100) ]
+        for rounds in (0, 1, 5):
+            self.assertEqual(mdes_encrypt_int_blocks(keys, inputs, salts, rounds),
+                             [ des.mdes_encrypt_int_block(k, p, s, rounds)
+                               for k, p, s in zip(keys, inputs, salts) ])
+
+        #check input of 0 (as used by des-crypt), and batches split across passes
+        orig = des.bs_lanes
+        des.bs_lanes = 7
+        try:
+            self.assertEqual(mdes_encrypt_int_blocks(keys[:20], 0, salts[:20], 25),
+                             [ des.mdes_encrypt_int_block(k, 0, s, 25)
+                               for k, s in zip(keys[:20], salts[:20]) ])
+        finally:
+            des.bs_lanes = orig
+
+        #check edge cases
+        self.assertEqual(mdes_encrypt_int_blocks([], [], [], 1), [])
+        self.assertRaises(ValueError, mdes_encrypt_int_blocks, keys, inputs[:-1], 0, 1)
+
+    def test_expand_des_key(self):
+        "test expand_des_key()"
+        self.assertEqual(des.expand_des_key(b('\x00') * 7), b('\x01') * 8)
+        self.assertEqual(des.expand_des_key(b('\xff') * 7), b('\xfe') * 8)
+        self.assertEqual(des.expand_des_key(hb("0123456789abcd")), hb("0191d0ad794cae9b"))
+        self.assertRaises(TypeError, des.expand_des_key, u"abcdefg")
+
+    def test_des_cipher(self):
+        "test DesCipher"
+        DesCipher = des.DesCipher
+
+        #check ecb mode against test vectors
+        for k,p,c in self.test_des_vectors:
+            cipher = DesCipher(unhexlify(k))
+            self.assertEqual(cipher.key, int(k,16))
+            self.assertEqual(cipher.encrypt_block(unhexlify(p)), unhexlify(c))
+            self.assertEqual(cipher.encrypt_ecb(unhexlify(p) * 2), unhexlify(c) * 2)
+            self.assertEqual(DesCipher(int(k,16)).encrypt_int_block(int(p,16)), int(c,16))
+
+        #check 7 byte keys are expanded
+        cipher = DesCipher(b('\x00') * 7)
+        self.assertEqual(cipher.encrypt_block(hb("ffffffffffffffff")), hb("355550b2150e2451"))
+
+        #check cbc mode against manual chaining
+        cipher = DesCipher(hb("0123456789abcdef"))
+        data = b("now is the time for all ")
+        iv = hb("1234567890abcdef")
+        result = cipher.encrypt_cbc(data, iv)
+        last = iv
+        for offset in xrange(0, 24, 8):
+            last = cipher.encrypt_block(utils.xor_bytes(last, data[offset:offset+8]))
+            self.assertEqual(result[offset:offset+8], last)
+        self.assertEqual(cipher.encrypt_cbc(data[:8]), cipher.encrypt_block(data[:8]))
+        self.assertEqual(cipher.encrypt_ecb(b('')), b(''))
+
+        #check salt & rounds match mdes_encrypt_int_block()
+        for salt, rounds in [(0, 0), (0x123, 25), (0xabcdef, 7)]:
+            self.assertEqual(cipher.encrypt_int_block(0x0123456789abcdef, salt, rounds),
+                des.mdes_encrypt_int_block(cipher.key, 0x0123456789abcdef, salt, rounds))
+
+        #check errors
+        self.assertRaises(ValueError, DesCipher, b('\x00') * 6)
+        self.assertRaises(ValueError, DesCipher, 1<<64)
+        self.assertRaises(TypeError, DesCipher, u"abcdefgh")
+        self.assertRaises(ValueError, cipher.encrypt_ecb, b('\x00') * 9)
+        self.assertRaises(TypeError, cipher.encrypt_cbc, u"abcdefgh")
+
+    def test_get_des_cipher(self):
+        "test get_des_cipher() caching"
+        key = hb("0123456789abcdef")
+        cipher = des.get_des_cipher(key)
+        self.assertTrue(isinstance(cipher, des.DesCipher))
+        self.assertEqual(cipher.key, 0x0123456789abcdef)
+        self.assertTrue(des.get_des_cipher(key) is cipher)
+        self.assertTrue(des.get_des_cipher(0x0123456789abcdef) is cipher)
+        self.assertTrue(des.get_des_cipher(hb("00000000000000")) is
+                        des.get_des_cipher(0x0101010101010101))
+        self.assertRaises(ValueError, des.get_des_cipher, b('\x00') * 9)
+
+    def test_get_des_cipher_secret_keys(self):
+        "test handlers don't cache password-derived des keys"
+        from passlib import hash
+        from passlib.handlers.oracle import ORACLE10_MAGIC
+        des._cipher_cache.clear()
+        for handler in [hash.bsdi_crypt, hash.bigcrypt, hash.crypt16]:
+            handler.encrypt("test password")
+        hash.oracle10.encrypt("password", user="system")
+        des_crypt = hash.des_crypt
+        orig = des_crypt.get_backend()
+        try:
+            des_crypt.set_backend("builtin")
+            des_crypt.encrypt("password")
+        finally:
+            des_crypt.set_backend(orig)
+        self.assertEqual(len(des._cipher_cache), 1)
+        self.assertTrue(utils.bytes_to_int(ORACLE10_MAGIC) in des._cipher_cache)
+
     #TODO: test other des methods (eg: mdes_encrypt_int_block w/ salt & rounds)
     # though des-crypt builtin backend test should thump it well enough
 
@@ -546,6 +825,43 @@ if not has_ssl_md4 or enable_option("cover"):
         case_prefix = "MD4 (builtin version)"
         hash = md4_mod._builtin_md4
 
+#=========================================================
+#test passlib.utils.md5_batch
+#=========================================================
+from passlib.utils import md5_batch
+
+class Md5BatchTest(TestCase):
+    "test md5_batch engine"
+    case_prefix = "md5_batch"
+
+    def setUp(self):
+        if not md5_batch.available:
+            raise self.skipTest("numpy not installed")
+
+    def test_md5_many(self):
+        "test md5_many() against hashlib"
+        from hashlib import md5
+        from passlib.utils import getrandbytes, rng
+        messages = [ getrandbytes(rng, size) for size in xrange(0, 200) ]
+        rng.shuffle(messages)
+        self.assertEqual(md5_batch.md5_many(messages),
+                         [ md5(msg).digest() for msg in messages ])
+        self.assertEqual(md5_batch.md5_many([b("abc")]),
+                         [ hb("900150983cd24fb0d6963f7d28e17f72") ])
+        self.assertEqual(md5_batch.md5_many([]), [])
+
+    def test_chunked(self):
+        "test batches larger than max_lanes"
+        from hashlib import md5
+        messages = [ str(i).encode("ascii") for i in xrange(50) ]
+        orig = md5_batch.max_lanes
+        md5_batch.max_lanes = 7
+        try:
+            self.assertEqual(md5_batch.md5_many(messages),
+                             [ md5(msg).digest() for msg in messages ])
+        finally:
+            md5_batch.max_lanes = orig
+
 #=========================================================
 #test passlib.utils.pbkdf2
 #=========================================================
@@ -573,11 +889,47 @@ class KdfTest(TestCase):
         #test klen > block size
         #test invalid hash
 
-#NOTE: this is not run directly, but via two subclasses (below)
+    def test_pbkdf2_pool(self):
+        "test pbkdf2() w/ pool"
+        try:
+            from multiprocessing import Pool
+            from multiprocessing.dummy import Pool as ThreadPool
+        except ImportError:
+            raise self.skipTest("multiprocessing not available")
+        secret, salt = b("password"), b("salt")
+        pool = ThreadPool(2)
+        try:
+            #multi-block keys, incl partial final block
+            for keylen, prf in [(40, "hmac-sha1"), (50, "hmac-sha1"),
+                                (100, "hmac-sha256"), (128, "hmac-sha512")]:
+                self.assertEqual(
+                    pbkdf2.pbkdf2(secret, salt, 50, keylen, prf, pool=pool),
+                    pbkdf2.pbkdf2(secret, salt, 50, keylen, prf))
+            #single block shouldn't touch pool
+            self.assertEqual(pbkdf2.pbkdf2(secret, salt, 2, 20, pool=object()),
+                             hb("ea6c014dc72d6f8ccd1ed92ace1d41f0d8de8957"))
+        finally:
+            pool.close()
+            pool.join()
+
+        #check real process pool
+        pool = Pool(2)
+        try:
+            self.assertEqual(
+                pbkdf2.pbkdf2(secret, salt, 50, 100, "hmac-sha256", pool=pool),
+                pbkdf2.pbkdf2(secret, salt, 50, 100, "hmac-sha256"))
+        finally:
+            pool.close()
+            pool.join()
+
+#NOTE: this is not run directly, but via the subclasses (below)
 class _Pbkdf2BackendTest(TestCase):
     "test builtin unix crypt backend"
     enable_m2crypto = False
 
+    #pbkdf2 implementation being tested
+    pbkdf2 = staticmethod(pbkdf2.pbkdf2)
+
     def setUp(self):
         #disable m2crypto support so we'll always use software backend
         if not self.enable_m2crypto:
@@ -595,9 +947,23 @@ class _Pbkdf2BackendTest(TestCase):
 
     #TODO: test get_prf() behavior in various situations - though overall behavior tested via pbkdf2
 
+    def test_keyed_prf(self):
+        "test get_prf() with key"
+        def custom(key, msg):
+            return hmac.new(key, msg, hashlib.md5).digest()
+        for name in ["hmac-sha1", "hmac_sha256", "hmac-sha512", custom]:
+            prf, size = pbkdf2.get_prf(name)
+            #check short key, key = block size, key > block size (gets hashed first)
+            for key in [b(""), b("secret"), b("k") * 128, b("k") * 129]:
+                keyed, ksize = pbkdf2.get_prf(name, key)
+                self.assertEqual(ksize, size)
+                for msg in [b(""), b("message"), b("m") * 200]:
+                    self.assertEqual(keyed(msg), prf(key, msg))
+                    self.assertEqual(len(keyed(msg)), size)
+
     def test_rfc3962(self):
         "rfc3962 test vectors"
-        self.assertFunctionResults(pbkdf2.pbkdf2, [
+        self.assertFunctionResults(self.pbkdf2, [
             # result, secret, salt, rounds, keylen, digest="sha1"
 
             #test case 1 / 128 bit
@@ -645,7 +1011,7 @@ class _Pbkdf2BackendTest(TestCase):
 
     def test_rfc6070(self):
         "rfc6070 test vectors"
-        self.assertFunctionResults(pbkdf2.pbkdf2, [
+        self.assertFunctionResults(self.pbkdf2, [
 
             (
                 hb("0c60c80f961f0e71f3a9b524af6012062fe037a6"),
@@ -685,23 +1051,23 @@ class _Pbkdf2BackendTest(TestCase):
     def test_invalid_values(self):
 
         #invalid rounds
-        self.assertRaises(ValueError, pbkdf2.pbkdf2, b('password'), b('salt'), -1, 16)
-        self.assertRaises(ValueError, pbkdf2.pbkdf2, b('password'), b('salt'), 0, 16)
-        self.assertRaises(TypeError, pbkdf2.pbkdf2, b('password'), b('salt'), 'x', 16)
+        self.assertRaises(ValueError, self.pbkdf2, b('password'), b('salt'), -1, 16)
+        self.assertRaises(ValueError, self.pbkdf2, b('password'), b('salt'), 0, 16)
+        self.assertRaises(TypeError, self.pbkdf2, b('password'), b('salt'), 'x', 16)
 
         #invalid keylen
-        self.assertRaises(ValueError, pbkdf2.pbkdf2, b('password'), b('salt'), 1, 20*(2**32-1)+1)
+        self.assertRaises(ValueError, self.pbkdf2, b('password'), b('salt'), 1, 20*(2**32-1)+1)
 
         #invalid salt type
-        self.assertRaises(TypeError, pbkdf2.pbkdf2, b('password'), 5, 1, 10)
+        self.assertRaises(TypeError, self.pbkdf2, b('password'), 5, 1, 10)
 
         #invalid secret type
-        self.assertRaises(TypeError, pbkdf2.pbkdf2, 5, b('salt'), 1, 10)
+        self.assertRaises(TypeError, self.pbkdf2, 5, b('salt'), 1, 10)
 
         #invalid hash
-        self.assertRaises(ValueError, pbkdf2.pbkdf2, b('password'), b('salt'), 1, 16, 'hmac-foo')
-        self.assertRaises(ValueError, pbkdf2.pbkdf2, b('password'), b('salt'), 1, 16, 'foo')
-        self.assertRaises(TypeError, pbkdf2.pbkdf2, b('password'), b('salt'), 1, 16, 5)
+        self.assertRaises(ValueError, self.pbkdf2, b('password'), b('salt'), 1, 16, 'hmac-foo')
+        self.assertRaises(ValueError, self.pbkdf2, b('password'), b('salt'), 1, 16, 'foo')
+        self.assertRaises(TypeError, self.pbkdf2, b('password'), b('salt'), 1, 16, 5)
 
     def test_hmac_sha1(self):
         "test independant hmac_sha1() method"
@@ -713,13 +1079,13 @@ class _Pbkdf2BackendTest(TestCase):
     def test_sha1_string(self):
         "test various prf values"
         self.assertEqual(
-            pbkdf2.pbkdf2(b("secret"), b("salt"), 10, 16, "hmac-sha1"),
+            self.pbkdf2(b("secret"), b("salt"), 10, 16, "hmac-sha1"),
             b('\xe2H\xfbk\x136QF\xf8\xacc\x07\xcc"(\x12')
         )
 
     def test_sha512_string(self):
         "test alternate digest string (sha512)"
-        self.assertFunctionResults(pbkdf2.pbkdf2, [
+        self.assertFunctionResults(self.pbkdf2, [
             # result, secret, salt, rounds, keylen, digest="sha1"
 
             #case taken from example in http://grub.enbug.org/Authentication
@@ -736,7 +1102,7 @@ class _Pbkdf2BackendTest(TestCase):
         def prf(key, msg):
             return hmac.new(key, msg, hashlib.sha512).digest()
 
-        self.assertFunctionResults(pbkdf2.pbkdf2, [
+        self.assertFunctionResults(self.pbkdf2, [
             # result, secret, salt, rounds, keylen, digest="sha1"
 
             #case taken from example in http://grub.enbug.org/Authentication
@@ -760,6 +1126,89 @@ if not has_m2crypto or enable_option("cover"):
         case_prefix = "pbkdf2 (builtin backend)"
         enable_m2crypto = False
 
+if pbkdf2.hashlib_pbkdf2:
+    class Pbkdf2_Hashlib_Test(_Pbkdf2BackendTest):
+        case_prefix = "pbkdf2 (hashlib backend)"
+        pbkdf2 = staticmethod(pbkdf2.hashlib_pbkdf2)
+
+        def test_fallback(self):
+            "test hashlib_pbkdf2() falls back to pbkdf2() for custom prfs"
+            def prf(key, msg):
+                return hmac.new(key, msg, hashlib.sha256).digest()
+            self.assertEqual(
+                pbkdf2.hashlib_pbkdf2(b("secret"), b("salt"), 10, 40, prf),
+                pbkdf2.pbkdf2(b("secret"), b("salt"), 10, 40, "hmac-sha256"))
+            self.assertEqual(pbkdf2.hashlib_pbkdf2(b("secret"), b("salt"), 10, 0), b(""))
+
+#=========================================================
+#profiling
+#=========================================================
+from passlib.utils import profiling
+
+class ProfilingTest(TestCase):
+    "test passlib.utils.profiling"
+    case_prefix = "profiling"
+
+    def test_enable(self):
+        "test enable_profiling() / disable_profiling()"
+        self.assertIs(profiling.get_profiler(), None)
+        try:
+            profiler = profiling.enable_profiling()
+            self.assertTrue(isinstance(profiler, profiling.PhaseProfiler))
+            self.assertIs(profiling.get_profiler(), profiler)
+            self.assertIs(profiling.disable_profiling(), profiler)
+            self.assertIs(profiling.get_profiler(), None)
+
+            other = profiling.PhaseProfiler()
+            self.assertIs(profiling.enable_profiling(other), other)
+        finally:
+            profiling.disable_profiling()
+
+    def test_profiler(self):
+        "test PhaseProfiler recording & table"
+        profiler = profiling.PhaseProfiler()
+        profiler.record("des_crypt", "digest", .5)
+        profiler.record("des_crypt", "digest", .25)
+        self.assertEqual(profiler.call("des_crypt", "parse", int, "3"), 3)
+        stats = profiler.stats()
+        self.assertEqual(stats["des_crypt"]["digest"], (2, .75))
+        self.assertEqual(stats["des_crypt"]["parse"][0], 1)
+
+        table = profiler.format_table().splitlines()
+        self.assertEqual(table[0].split()[:2], ["scheme", "phase"])
+        self.assertEqual(table[1].split()[:3], ["des_crypt", "parse", "1"])
+        self.assertEqual(table[2].split()[:5], ["des_crypt", "digest", "2", "750.000", "375000.0"])
+
+        profiler.reset()
+        self.assertEqual(profiler.stats(), {})
+
+    def test_context(self):
+        "test CryptContext & handlers record phases while profiling enabled"
+        ctx = CryptContext(["sha256_crypt", "des_crypt"], min_verify_time=.01,
+                           sha256_crypt__default_rounds=1000)
+        hash = ctx.encrypt("test")
+
+        #shouldn't record anything when disabled
+        profiler = profiling.PhaseProfiler()
+        ctx.verify("test", hash)
+        self.assertEqual(profiler.stats(), {})
+
+        profiling.enable_profiling(profiler)
+        try:
+            self.assertTrue(ctx.verify("test", hash))
+            self.assertFalse(ctx.hash_needs_update(hash))
+            ctx.encrypt("test", scheme="des_crypt")
+            ctx.identify("$9$abc")
+        finally:
+            profiling.disable_profiling()
+        stats = profiler.stats()
+        self.assertEqual(sorted(stats["sha256_crypt"]),
+                         ["digest", "identify", "pad", "parse", "policy"])
+        self.assertEqual(sorted(stats["des_crypt"]), ["digest", "policy", "render"])
+        self.assertEqual(sorted(stats[None]), ["identify"])
+        self.assertEqual(stats["sha256_crypt"]["identify"][0], 2)
+        self.assertTrue(stats["sha256_crypt"]["pad"][1] > 0)
+
 #=========================================================
 #EOF
 #=========================================================
@@ -7,6 +7,8 @@ from __future__ import with_statement
 import re
 import hashlib
 from logging import getLogger
+import os
+import time
 import warnings
 #site
 #pkg
@@ -15,7 +17,7 @@ from passlib.registry import _unload_handler_name as unload_handler_name, \
     register_crypt_handler, get_crypt_handler
 from passlib.utils import rng, getrandstr, handlers as uh, bytes, b, \
     to_hash_str, to_unicode, MissingBackendError, jython_vm
-from passlib.tests.utils import HandlerCase, TestCase, catch_warnings, \
+from passlib.tests.utils import HandlerCase, TestCase, catch_warnings, mktemp, \
     dummy_handler_in_registry
 #module
 log = getLogger(__name__)
@@ -239,6 +241,95 @@ class SkeletonTest(TestCase):
         self.assertRaises(ValueError, d1.set_backend, 'c')
         self.assertRaises(ValueError, d1.has_backend, 'c')
 
+    def test_41_fastest_backend(self):
+        "test HasManyBackends.set_backend('fastest')"
+        from passlib import calibrate
+        class d1(uh.HasManyBackends, uh.GenericHandler):
+            name = 'd1'
+            setting_kwds = ()
+
+            backends = ("slow", "fast", "broken", "builtin")
+
+            _has_backend_slow = True
+            _has_backend_fast = True
+            _has_backend_broken = True
+            _has_backend_builtin = True
+
+            @classmethod
+            def from_string(cls, hash):
+                return cls(checksum=hash[4:] or None)
+
+            def to_string(self):
+                return "$d1$" + (self.checksum or "")
+
+            def _calc_checksum_slow(self, secret):
+                time.sleep(.01)
+                return 'x'
+
+            def _calc_checksum_builtin(self, secret):
+                time.sleep(.005)
+                return 'x'
+
+            def _calc_checksum_fast(self, secret):
+                return 'x'
+
+            def _calc_checksum_broken(self, secret):
+                active.append(self._backend)
+                return 'y'
+
+        active = []
+        orig_path = calibrate.cache_path
+        path = calibrate.cache_path = mktemp()
+        calibrate.clear_cache()
+        try:
+            #broken backend should be ignored, even though it's fastest
+            self.assertTrue(d1.has_backend("fastest"))
+            self.assertEqual(d1.get_backend(), "slow")
+            self.assertEqual(d1.set_backend("fastest"), "fast")
+            self.assertEqual(d1.get_backend(), "fast")
+
+            #active backend shouldn't be switched while measuring
+            self.assertTrue(active)
+            self.assertEqual(set(active), set(["slow"]))
+            del active[:]
+            self.assertEqual(calibrate.find_fastest_backend(d1, use_cache=False), "fast")
+            self.assertEqual(set(active), set(["fast"]))
+
+            #result should be persisted & re-used
+            self.assertTrue(os.path.exists(path))
+            calibrate.clear_cache()
+            d1._calc_checksum_fast = d1.__dict__['_calc_checksum_slow']
+            d1.set_backend("builtin")
+            self.assertEqual(d1.set_backend("fastest"), "fast")
+
+            #but re-checked if list of available backends changes
+            d1._has_backend_broken = False
+            self.assertEqual(d1.set_backend("fastest"), "builtin")
+
+            #or if cached result is invalidated
+            d1._has_backend_broken = True
+            self.assertEqual(calibrate.find_fastest_backend(d1), "fast")
+            calibrate.clear_cache(disk=True, handler=d1)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(calibrate.find_fastest_backend(d1), "builtin")
+
+            #default backend should be kept unless another is clearly faster
+            d1._calc_checksum_slow = d1.__dict__['_calc_checksum_builtin']
+            for threads in [1, 4]:
+                self.assertEqual(calibrate.find_fastest_backend(d1, use_cache=False,
+                                 threads=threads, margin=.5), "slow")
+            self.assertTrue(calibrate.find_fastest_backend(d1, use_cache=False, margin=0)
+                            in ["slow", "builtin"])
+
+            #and shouldn't be needed at all if only one backend available
+            d1._has_backend_slow = d1._has_backend_fast = d1._has_backend_broken = False
+            self.assertEqual(calibrate.find_fastest_backend(d1, use_cache=False), "builtin")
+            d1._has_backend_builtin = False
+            self.assertRaises(MissingBackendError, d1.set_backend, "fastest")
+        finally:
+            calibrate.cache_path = orig_path
+            calibrate.clear_cache()
+
     def test_50_bh_norm_ident(self):
         "test GenericHandler+HasManyIdents: .norm_ident() & .identify()"
         class d1(uh.HasManyIdents, uh.GenericHandler):
@@ -331,6 +422,14 @@ class PrefixWrapperTest(TestCase):
         self.assertEqual(d1.name, "d1")
         self.assertIs(d1.setting_kwds, ldap_md5.setting_kwds)
 
+    def test_12_repr(self):
+        "test PrefixWrapper repr()"
+        d1 = uh.PrefixWrapper("d1", "ldap_md5", "{XXX}", "{MD5}")
+        self.assertEqual(repr(d1), "PrefixWrapper('d1', %r, prefix=%r, orig_prefix=%r)" %
+                         ("ldap_md5", u"{XXX}", u"{MD5}"))
+        d2 = uh.PrefixWrapper("d2", "ldap_md5", "{XXX}")
+        self.assertEqual(repr(d2), "PrefixWrapper('d2', %r, prefix=%r)" % ("ldap_md5", u"{XXX}"))
+
     def test_11_wrapped_methods(self):
         d1 = uh.PrefixWrapper("d1", "ldap_md5", "{XXX}", "{MD5}")
         dph = "{XXX}X03MO1qnZdYdgyfeuILPmQ=="
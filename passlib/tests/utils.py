@@ -81,6 +81,7 @@ def enable_option(*names):
     test flags:
         all-backends    test all backends, even the inactive ones
         cover           enable minor tweaks to maximize coverage testing
+        bench           assert on timing-sensitive benchmark results
         all             run all tests
     """
     return 'all' in tests or any(name in tests for name in names)
@@ -3,6 +3,7 @@
 #imports
 #=================================================================================
 #core
+from __future__ import with_statement
 from base64 import b64encode, b64decode
 from codecs import lookup as _lookup_codec
 from cStringIO import StringIO
@@ -15,6 +16,10 @@ import sys
 import random
 import time
 from warnings import warn
+try:
+    import threading
+except ImportError: #pragma: no cover -- python built w/o thread support
+    import dummy_threading as threading
 #site
 #pkg
 #local
@@ -30,6 +35,10 @@ __all__ = [
 
     #misc
     'os_crypt',
+    'os_crypt_supports',
+    'safe_crypt_r',
+    'crypt_r_supports',
+    'LRUCache',
 
     #tests
     'is_crypt_handler',
@@ -81,6 +90,17 @@ unix_crypt_schemes = [
 #: list of rounds_cost constants
 rounds_cost_values = [ "linear", "log2" ]
 
+#: schedule for the 42-round cycle of the md5-crypt / sha-crypt main loops,
+#: which depend only on ``round % 2``, ``round % 3``, and ``round % 7``.
+#: each entry is the (even, odd) pair of rounds ``2*k, 2*k+1``;
+#: and each value has bit 1 set if ``round % 3 > 0`` (include salt),
+#: and bit 2 set if ``round % 7 > 0`` (include extra copy of secret).
+crypt_round_schedule = (
+    (0, 3), (3, 2), (3, 3), (2, 1), (3, 2), (3, 3), (2, 3),
+    (1, 2), (3, 3), (2, 3), (3, 0), (3, 3), (2, 3), (3, 2),
+    (1, 3), (2, 3), (3, 2), (3, 1), (2, 3), (3, 2), (3, 3),
+)
+
 #: special byte string containing all possible byte values, used in a few places.
 #XXX: treated as singleton by some of the code for efficiency.
 # Py2k #
@@ -215,6 +235,165 @@ else:
         #return True, os_crypt(secret, hash)
         # end Py3k #
 
+#: in-process cache of :func:`os_crypt_supports` results, maps tuple of hashes -> bool
+_os_crypt_probes = {}
+
+#: whether :func:`os_crypt_supports` results should also be persisted on disk,
+#: in :mod:`passlib.calibrate`'s cache file. defaults to ``True`` if
+#: the ``$PASSLIB_PROBE_CACHE`` environment variable is set to a non-empty value.
+persist_os_crypt_probes = bool(os.environ.get("PASSLIB_PROBE_CACHE"))
+
+def os_crypt_supports(*hashes):
+    """check if :func:`safe_os_crypt` correctly reproduces the specified hashes of the password ``"test"``.
+
+    this is the probe used by the ``_has_backend_os_crypt`` attribute of
+    the various handlers. the result is memoized in-process; and if
+    :data:`persist_os_crypt_probes` is enabled, on disk as well
+    (keyed by :func:`passlib.calibrate.get_probe_id`), so short-lived processes
+    don't each have to run the probe's :func:`!crypt` calls.
+
+    :arg \*hashes: one or more unicode hashes of the password ``"test"``.
+    :returns: ``True`` if all hashes were reproduced, else ``False``.
+    """
+    if not safe_os_crypt:
+        return False
+    try:
+        return _os_crypt_probes[hashes]
+    except KeyError:
+        pass
+    result = None
+    if persist_os_crypt_probes:
+        from passlib.calibrate import lookup_probe
+        result = lookup_probe(hashes)
+    if result is None:
+        result = True
+        for hash in hashes:
+            if safe_os_crypt(u"test", hash)[1] != hash:
+                result = False
+                break
+        if persist_os_crypt_probes:
+            from passlib.calibrate import store_probe
+            store_probe(hashes, result)
+    _os_crypt_probes[hashes] = result
+    return result
+
+#=================================================================================
+#crypt_r helpers
+#=================================================================================
+
+#: per-thread storage for the crypt_r() buffer
+_crypt_r_local = threading.local()
+
+#: ``(func, size, pass_size)`` once libcrypt has been loaded, ``False`` if unavailable.
+#: *size* is the ``struct crypt_data`` buffer size: libxcrypt's struct is 32k,
+#: glibc's is ~128k (rounded up here). larger buffers work too, but cost
+#: a bit of extra cache pressure on each call.
+_crypt_r_func = None
+
+def _load_crypt_r():
+    "locate crypt_rn() / crypt_r() in libcrypt via ctypes"
+    global _crypt_r_func
+    if _crypt_r_func is not None:
+        return _crypt_r_func
+    result = False
+    try:
+        import ctypes
+        from ctypes.util import find_library
+        path = find_library("crypt")
+        if path:
+            lib = ctypes.CDLL(path)
+            #NOTE: prefer libxcrypt's crypt_rn(), which takes the buffer size
+            #      and returns NULL on error instead of a "*0" failure token.
+            func = getattr(lib, "crypt_rn", None)
+            if func is not None:
+                func.argtypes = [ctypes.c_char_p, ctypes.c_char_p,
+                                 ctypes.c_void_p, ctypes.c_int]
+                result = func, 1 << 15, True
+            else:
+                func = getattr(lib, "crypt_r", None)
+                if func is not None:
+                    func.argtypes = [ctypes.c_char_p, ctypes.c_char_p,
+                                     ctypes.c_void_p]
+                    result = func, 1 << 18, False
+            if result:
+                func.restype = ctypes.c_char_p
+    except (ImportError, OSError, AttributeError): #pragma: no cover -- no ctypes / libcrypt
+        result = False
+    _crypt_r_func = result
+    return result
+
+def _get_crypt_data(size):
+    "return this thread's zeroed ``struct crypt_data`` buffer"
+    data = getattr(_crypt_r_local, "data", None)
+    if data is None:
+        from ctypes import create_string_buffer
+        data = _crypt_r_local.data = create_string_buffer(size)
+    return data
+
+def has_crypt_r():
+    "check if :func:`safe_crypt_r` is available on this system"
+    return bool(_load_crypt_r())
+
+def safe_crypt_r(secret, hash):
+    """wrapper around libcrypt's reentrant :func:`!crypt_r` / :func:`!crypt_rn`.
+
+    This has the same call signature as :func:`safe_os_crypt`, but calls
+    the C library through :mod:`ctypes`, using a separate ``struct crypt_data``
+    buffer for each thread. Unlike the stdlib's :func:`!crypt`, this releases
+    the GIL while hashing, so multiple threads can hash in parallel;
+    and it accepts passwords as arbitrary bytes under Python 3 as well.
+
+    :arg secret: password as bytes or unicode (unicode is encoded to utf-8)
+    :arg hash: hash/salt as unicode
+    :returns:
+        ``(False, None)`` if the password can't be hashed
+        (libcrypt not available, password contains a null byte,
+        or hash configuration was rejected), or ``(True, result: unicode)`` otherwise.
+    """
+    if isinstance(secret, unicode):
+        secret = secret.encode("utf-8")
+    if isinstance(hash, bytes):
+        raise TypeError("hash must be unicode")
+    hash = hash.encode("ascii")
+    if b('\x00') in secret:
+        return False, None
+    info = _crypt_r_func or _load_crypt_r()
+    if not info:
+        return False, None
+    func, size, pass_size = info
+    data = _get_crypt_data(size)
+    if pass_size:
+        result = func(secret, hash, data, size)
+    else:
+        result = func(secret, hash, data)
+    if not result or result.startswith(b("*")):
+        return False, None
+    return True, result.decode("ascii")
+
+#: in-process cache of :func:`crypt_r_supports` results, maps tuple of hashes -> bool
+_crypt_r_probes = {}
+
+def crypt_r_supports(*hashes):
+    """check if :func:`safe_crypt_r` correctly reproduces the specified hashes of the password ``"test"``.
+
+    this is the probe used by the ``_has_backend_crypt_r`` attribute of
+    the various handlers; the result is memoized in-process.
+
+    :arg \*hashes: one or more unicode hashes of the password ``"test"``.
+    :returns: ``True`` if all hashes were reproduced, else ``False``.
+    """
+    try:
+        return _crypt_r_probes[hashes]
+    except KeyError:
+        pass
+    result = True
+    for hash in hashes:
+        if safe_crypt_r(u"test", hash)[1] != hash:
+            result = False
+            break
+    _crypt_r_probes[hashes] = result
+    return result
+
 #=================================================================================
 #decorators and meta helpers
 #=================================================================================
@@ -267,6 +446,122 @@ class classproperty(object):
 ##    update_wrapper(wrapper, func)
 ##    return classmethod(wrapper)
 
+#==========================================================
+#cache helpers
+#==========================================================
+class LRUCache(object):
+    """thread-safe dict-like cache holding at most *maxsize* entries,
+    discarding the least-recently-used entry when full.
+
+    :arg maxsize: maximum number of entries to hold (defaults to 1024).
+
+    the following attributes count the cache's activity,
+    and may be reset by calling :meth:`reset_stats`:
+
+    .. attribute:: hits
+
+        number of :meth:`get` calls which found their key.
+
+    .. attribute:: misses
+
+        number of :meth:`get` calls which didn't find their key.
+
+    .. attribute:: evictions
+
+        number of entries discarded to make room for new ones.
+    """
+    #NOTE: implemented as a dict mapping key -> link,
+    #      plus a circular doubly-linked list of [prev, next, key, value] links,
+    #      with the most recently used entries at the end,
+    #      since OrderedDict isn't available under python 2.5.
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.clear()
+        self.reset_stats()
+
+    def __repr__(self):
+        return "<LRUCache size=%d maxsize=%d>" % (len(self._map), self.maxsize)
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def get(self, key, default=None):
+        "return value for key (marking it as recently used), or *default* if not present"
+        with self._lock:
+            link = self._map.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            #move link to end of list
+            prev, next = link[0], link[1]
+            prev[1] = next
+            next[0] = prev
+            root = self._root
+            last = root[0]
+            last[1] = root[0] = link
+            link[0] = last
+            link[1] = root
+            return link[3]
+
+    def set(self, key, value):
+        "store value for key, evicting least-recently-used entry if cache is full"
+        with self._lock:
+            map = self._map
+            root = self._root
+            link = map.get(key)
+            if link is not None:
+                #unlink existing entry, will be re-added at end
+                prev, next = link[0], link[1]
+                prev[1] = next
+                next[0] = prev
+            elif len(map) >= self.maxsize:
+                #evict oldest entry
+                oldest = root[1]
+                root[1] = oldest[1]
+                oldest[1][0] = root
+                del map[oldest[2]]
+                self.evictions += 1
+            last = root[0]
+            link = [last, root, key, value]
+            last[1] = root[0] = map[key] = link
+
+    def pop(self, key, default=None):
+        "remove key from cache, returning it's value (or *default* if not present)"
+        with self._lock:
+            link = self._map.pop(key, None)
+            if link is None:
+                return default
+            prev, next = link[0], link[1]
+            prev[1] = next
+            next[0] = prev
+            return link[3]
+
+    def clear(self):
+        "remove all entries from cache"
+        root = []
+        root[:] = [root, root, None, None]
+        with self._lock:
+            self._root = root
+            self._map = {}
+
+    def reset_stats(self):
+        "reset :attr:`hits`, :attr:`misses`, and :attr:`evictions` counters"
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        "return dict containing current size and activity counters"
+        return dict(size=len(self._map), maxsize=self.maxsize,
+                    hits=self.hits, misses=self.misses,
+                    evictions=self.evictions)
+
 #==========================================================
 #protocol helpers
 #==========================================================
@@ -43,12 +43,16 @@ which has some nice notes on how this all works -
 #imports
 #=========================================================
 #pkg
-from passlib.utils import bytes_to_int, int_to_bytes, bytes, bord, bjoin_ints
+from passlib.utils import bytes_to_int, int_to_bytes, bytes, bjoin_ints, \
+    b, LRUCache
 #local
 __all__ = [
     "expand_des_key",
     "des_encrypt_block",
     "mdes_encrypt_int_block",
+    "mdes_encrypt_int_blocks",
+    "DesCipher",
+    "get_des_cipher",
 ]
 
 #=========================================================
@@ -571,35 +575,25 @@ def permute(c, p):
 #=========================================================
 #des frontend
 #=========================================================
+#: map of 7 bit value -> byte containing those bits + odd parity bit
+_parity_bytes = [
+    (value << 1) | (1 ^ (sum((value >> i) & 1 for i in xrange(7)) & 1))
+    for value in xrange(128)
+]
+
 def expand_des_key(key):
     "convert 7 byte des key to 8 byte des key (by adding parity bit every 7 bits)"
     if not isinstance(key, bytes):
         raise TypeError("key must be bytes, not %s" % (type(key),))
 
-    #NOTE: could probably do this much more cleverly and efficiently,
-    # but no need really given it's use.
-
     #NOTE: the parity bits are generally ignored, including by des_encrypt_block below
     assert len(key) == 7
 
-    def iter_bits(source):
-        for c in source:
-            v = bord(c)
-            for i in xrange(7,-1,-1):
-                yield (v>>i) & 1
-
-    out = 0
-    p = 1
-    for i, b in enumerate(iter_bits(key)):
-        out = (out<<1) + b
-        p ^= b
-        if i % 7 == 6:
-            out = (out<<1) + p
-            p = 1
-
+    #split 56 bit key into 7 bit chunks, each of which becomes a byte
+    key = bytes_to_int(key)
     return bjoin_ints(
-        ((out>>s) & 0xFF)
-        for s in xrange(8*7,-8,-8)
+        _parity_bytes[(key >> shift) & 0x7f]
+        for shift in xrange(49, -7, -7)
     )
 
 def des_encrypt_block(key, input):
@@ -613,16 +607,7 @@ def des_encrypt_block(key, input):
     """
     if not isinstance(key, bytes):
         raise TypeError("key must be bytes, not %s" % (type(key),))
-    if len(key) == 7:
-        key = expand_des_key(key)
-    assert len(key) == 8
-    if not isinstance(input, bytes):
-        raise TypeError("input must be bytes, not %s" % (type(input),))
-    assert len(input) == 8
-    input = bytes_to_int(input)
-    key = bytes_to_int(key)
-    out = mdes_encrypt_int_block(key, input, 0, 1)
-    return int_to_bytes(out, 8)
+    return DesCipher(key).encrypt_block(input)
 
 def mdes_encrypt_int_block(key, input, salt=0, rounds=1):
     """do modified multi-round DES encryption of single DES block.
@@ -645,8 +630,6 @@ def mdes_encrypt_int_block(key, input, salt=0, rounds=1):
     :returns:
         resulting block as 8 byte integer
     """
-    global SPE, PCXROT, IE3264, CF6464
-
     #bounds check
     assert 0 <= input <= INT_64_MAX, "input value out of range"
     assert 0 <= salt <= INT_24_MAX, "salt value out of range"
@@ -657,17 +640,23 @@ def mdes_encrypt_int_block(key, input, salt=0, rounds=1):
     if PCXROT is None:
         load_tables()
 
-    #convert key int -> key schedule
+    return _mdes_encrypt(_des_key_schedule(key), input, salt, rounds)
+
+def _des_key_schedule(key):
+    "convert key int -> key schedule, as used by _mdes_encrypt()"
     #NOTE: generation was modified to output two elements at a time,
     #to optimize for per-round algorithm below.
     mask = ~0x0303030300000000
-    def _gen(K):
-        for p_even, p_odd in PCXROT:
-            K1 = permute(K, p_even)
-            K = permute(K1, p_odd)
-            yield K1 & mask, K & mask
-    ks_list = list(_gen(key))
+    ks_list = []
+    K = key
+    for p_even, p_odd in PCXROT:
+        K1 = permute(K, p_even)
+        K = permute(K1, p_odd)
+        ks_list.append((K1 & mask, K & mask))
+    return ks_list
 
+def _mdes_encrypt(ks_list, input, salt, rounds):
+    "helper for mdes_encrypt_int_block(), which takes a precalculated key schedule"
     #expand 24 bit salt -> 32 bit
     salt = (
         ((salt & 0x00003f) << 26) |
@@ -728,6 +717,465 @@ def mdes_encrypt_int_block(key, input, salt=0, rounds=1):
 
     return C
 
+#=========================================================
+#key schedule objects
+#=========================================================
+class DesCipher(object):
+    """DES cipher object, which precalculates the key schedule,
+    so it can be reused to encrypt multiple blocks with the same key.
+
+    :arg key: des key, as an 8 byte integer, or as 7 or 8 bytes.
+
+    see also :func:`get_des_cipher`, which caches instances for keys which aren't secret.
+    """
+    #=========================================================
+    #init
+    #=========================================================
+    def __init__(self, key):
+        if isinstance(key, bytes):
+            if len(key) == 7:
+                key = expand_des_key(key)
+            elif len(key) != 8:
+                raise ValueError("key must be 7 or 8 bytes")
+            key = bytes_to_int(key)
+        elif not isinstance(key, (int, long)):
+            raise TypeError("key must be bytes or int, not %s" % (type(key),))
+        elif not 0 <= key <= INT_64_MAX:
+            raise ValueError("key value out of range")
+        if PCXROT is None:
+            load_tables()
+        self.key = key
+        self._schedule = _des_key_schedule(key)
+
+    def __repr__(self):
+        return "<DesCipher key=0x%016x>" % (self.key,)
+
+    #=========================================================
+    #encryption
+    #=========================================================
+    def encrypt_int_block(self, input, salt=0, rounds=1):
+        """encrypt single block using modified multi-round DES;
+        see :func:`mdes_encrypt_int_block` for details.
+
+        :arg input: 8 byte plaintext block as integer
+        :arg salt: integer 24 bit salt (defaults to 0)
+        :arg rounds: number of rounds of DES encryption to apply (defaults to 1)
+
+        :returns: resulting block as 8 byte integer
+        """
+        assert 0 <= input <= INT_64_MAX, "input value out of range"
+        assert 0 <= salt <= INT_24_MAX, "salt value out of range"
+        assert rounds >= 0, "rounds out of range"
+        return _mdes_encrypt(self._schedule, input, salt, rounds)
+
+    def encrypt_block(self, input):
+        "encrypt single 8 byte block, returns 8 byte ciphertext"
+        if not isinstance(input, bytes):
+            raise TypeError("input must be bytes, not %s" % (type(input),))
+        assert len(input) == 8
+        return int_to_bytes(_mdes_encrypt(self._schedule, bytes_to_int(input), 0, 1), 8)
+
+    def encrypt_ecb(self, data):
+        "encrypt data (which must be a multiple of 8 bytes) in ECB mode"
+        schedule = self._schedule
+        return b('').join(
+            int_to_bytes(_mdes_encrypt(schedule, block, 0, 1), 8)
+            for block in _iter_int_blocks(data)
+        )
+
+    def encrypt_cbc(self, data, iv=None):
+        """encrypt data (which must be a multiple of 8 bytes) in CBC mode.
+
+        :arg data: plaintext as bytes
+        :param iv: optional 8 byte iv (defaults to all nulls)
+
+        :returns: ciphertext, as bytes
+        """
+        schedule = self._schedule
+        last = 0 if iv is None else bytes_to_int(iv)
+        out = []
+        for block in _iter_int_blocks(data):
+            last = _mdes_encrypt(schedule, block ^ last, 0, 1)
+            out.append(int_to_bytes(last, 8))
+        return b('').join(out)
+
+    #=========================================================
+    #eoc
+    #=========================================================
+
+def _iter_int_blocks(data):
+    "split bytes into 8 byte blocks, yielding each as an integer"
+    if not isinstance(data, bytes):
+        raise TypeError("data must be bytes, not %s" % (type(data),))
+    if len(data) % 8:
+        raise ValueError("data must be a multiple of 8 bytes")
+    for offset in xrange(0, len(data), 8):
+        yield bytes_to_int(data[offset:offset+8])
+
+#: cache of recently used DesCipher instances, keyed by key integer
+_cipher_cache = LRUCache(32)
+
+def get_des_cipher(key):
+    """return :class:`DesCipher` for key, re-using a cached instance
+    if the key has been used recently.
+
+    :arg key: des key, as an 8 byte integer, or as 7 or 8 bytes.
+
+    .. warning::
+
+        this should only be used for keys which aren't secret
+        (such as the constant first-pass key used by :class:`~passlib.hash.oracle10`).
+        cached keys stay in memory, and a cache hit is measurably faster than a miss,
+        so keys derived from a password should use an uncached :class:`DesCipher`.
+    """
+    if isinstance(key, bytes):
+        if len(key) == 7:
+            key = expand_des_key(key)
+        elif len(key) != 8:
+            raise ValueError("key must be 7 or 8 bytes")
+        key = bytes_to_int(key)
+    cipher = _cipher_cache.get(key)
+    if cipher is None:
+        cipher = DesCipher(key)
+        _cipher_cache.set(key, cipher)
+    return cipher
+
+#=========================================================
+#bitsliced des
+#=========================================================
+#NOTE: the bitsliced implementation below works from the standard
+# des tables (FIPS 46-3), rather than the precalculated ones above:
+# each of the 64 bits of a block is stored as a separate integer,
+# where bit ``n`` of that integer belongs to the n'th block being encrypted.
+# the permutations (IP, E, P, the key schedule) then become simple
+# re-orderings of a list, and each s-box becomes a boolean circuit,
+# so that one pass over the circuit encrypts all the blocks at once.
+#
+# all bit numbers in these tables are 1-based, and count from the msb,
+# per the des spec.
+
+#: initial permutation
+BS_IP = (
+    58, 50, 42, 34, 26, 18, 10, 2, 60, 52, 44, 36, 28, 20, 12, 4,
+    62, 54, 46, 38, 30, 22, 14, 6, 64, 56, 48, 40, 32, 24, 16, 8,
+    57, 49, 41, 33, 25, 17,  9, 1, 59, 51, 43, 35, 27, 19, 11, 3,
+    61, 53, 45, 37, 29, 21, 13, 5, 63, 55, 47, 39, 31, 23, 15, 7,
+)
+
+#: expansion (R -> 48 bits)
+BS_E = (
+    32,  1,  2,  3,  4,  5,  4,  5,  6,  7,  8,  9,
+     8,  9, 10, 11, 12, 13, 12, 13, 14, 15, 16, 17,
+    16, 17, 18, 19, 20, 21, 20, 21, 22, 23, 24, 25,
+    24, 25, 26, 27, 28, 29, 28, 29, 30, 31, 32,  1,
+)
+
+#: permutation of s-box outputs
+BS_P = (
+    16,  7, 20, 21, 29, 12, 28, 17,  1, 15, 23, 26,  5, 18, 31, 10,
+     2,  8, 24, 14, 32, 27,  3,  9, 19, 13, 30,  6, 22, 11,  4, 25,
+)
+
+#: key permuted choice 1 (64 -> 56 bits)
+BS_PC1 = (
+    57, 49, 41, 33, 25, 17,  9,  1, 58, 50, 42, 34, 26, 18,
+    10,  2, 59, 51, 43, 35, 27, 19, 11,  3, 60, 52, 44, 36,
+    63, 55, 47, 39, 31, 23, 15,  7, 62, 54, 46, 38, 30, 22,
+    14,  6, 61, 53, 45, 37, 29, 21, 13,  5, 28, 20, 12,  4,
+)
+
+#: key permuted choice 2 (56 -> 48 bits)
+BS_PC2 = (
+    14, 17, 11, 24,  1,  5,  3, 28, 15,  6, 21, 10,
+    23, 19, 12,  4, 26,  8, 16,  7, 27, 20, 13,  2,
+    41, 52, 31, 37, 47, 55, 30, 40, 51, 45, 33, 48,
+    44, 49, 39, 56, 34, 53, 46, 42, 50, 36, 29, 32,
+)
+
+#: key rotation for each of the 16 des rounds
+BS_ROTATIONS = (1, 1, 2, 2, 2, 2, 2, 2, 1, 2, 2, 2, 2, 2, 2, 1)
+
+#: s-boxes, each one as 4 rows of 16 entries
+BS_SBOX = (
+    (14, 4, 13, 1, 2, 15, 11, 8, 3, 10, 6, 12, 5, 9, 0, 7,
+     0, 15, 7, 4, 14, 2, 13, 1, 10, 6, 12, 11, 9, 5, 3, 8,
+     4, 1, 14, 8, 13, 6, 2, 11, 15, 12, 9, 7, 3, 10, 5, 0,
+     15, 12, 8, 2, 4, 9, 1, 7, 5, 11, 3, 14, 10, 0, 6, 13),
+    (15, 1, 8, 14, 6, 11, 3, 4, 9, 7, 2, 13, 12, 0, 5, 10,
+     3, 13, 4, 7, 15, 2, 8, 14, 12, 0, 1, 10, 6, 9, 11, 5,
+     0, 14, 7, 11, 10, 4, 13, 1, 5, 8, 12, 6, 9, 3, 2, 15,
+     13, 8, 10, 1, 3, 15, 4, 2, 11, 6, 7, 12, 0, 5, 14, 9),
+    (10, 0, 9, 14, 6, 3, 15, 5, 1, 13, 12, 7, 11, 4, 2, 8,
+     13, 7, 0, 9, 3, 4, 6, 10, 2, 8, 5, 14, 12, 11, 15, 1,
+     13, 6, 4, 9, 8, 15, 3, 0, 11, 1, 2, 12, 5, 10, 14, 7,
+     1, 10, 13, 0, 6, 9, 8, 7, 4, 15, 14, 3, 11, 5, 2, 12),
+    (7, 13, 14, 3, 0, 6, 9, 10, 1, 2, 8, 5, 11, 12, 4, 15,
+     13, 8, 11, 5, 6, 15, 0, 3, 4, 7, 2, 12, 1, 10, 14, 9,
+     10, 6, 9, 0, 12, 11, 7, 13, 15, 1, 3, 14, 5, 2, 8, 4,
+     3, 15, 0, 6, 10, 1, 13, 8, 9, 4, 5, 11, 12, 7, 2, 14),
+    (2, 12, 4, 1, 7, 10, 11, 6, 8, 5, 3, 15, 13, 0, 14, 9,
+     14, 11, 2, 12, 4, 7, 13, 1, 5, 0, 15, 10, 3, 9, 8, 6,
+     4, 2, 1, 11, 10, 13, 7, 8, 15, 9, 12, 5, 6, 3, 0, 14,
+     11, 8, 12, 7, 1, 14, 2, 13, 6, 15, 0, 9, 10, 4, 5, 3),
+    (12, 1, 10, 15, 9, 2, 6, 8, 0, 13, 3, 4, 14, 7, 5, 11,
+     10, 15, 4, 2, 7, 12, 9, 5, 6, 1, 13, 14, 0, 11, 3, 8,
+     9, 14, 15, 5, 2, 8, 12, 3, 7, 0, 4, 10, 1, 13, 11, 6,
+     4, 3, 2, 12, 9, 5, 15, 10, 11, 14, 1, 7, 6, 0, 8, 13),
+    (4, 11, 2, 14, 15, 0, 8, 13, 3, 12, 9, 7, 5, 10, 6, 1,
+     13, 0, 11, 7, 4, 9, 1, 10, 14, 3, 5, 12, 2, 15, 8, 6,
+     1, 4, 11, 13, 12, 3, 7, 14, 10, 15, 6, 8, 0, 5, 9, 2,
+     6, 11, 13, 8, 1, 4, 10, 7, 9, 5, 0, 15, 14, 2, 3, 12),
+    (13, 2, 8, 4, 6, 15, 11, 1, 10, 9, 3, 14, 5, 0, 12, 7,
+     1, 15, 13, 8, 10, 3, 7, 4, 12, 5, 6, 11, 0, 14, 9, 2,
+     7, 11, 4, 1, 9, 12, 14, 2, 0, 6, 10, 13, 15, 3, 5, 8,
+     2, 1, 14, 7, 4, 10, 8, 13, 15, 12, 9, 0, 3, 5, 6, 11),
+)
+
+#: order in which each s-box's 6 inputs are branched on when building it's circuit.
+#: (these were picked by trying all 720 orders, and keeping the one which
+#: yields the smallest circuit).
+BS_SBOX_ORDER = (
+    (4, 5, 1, 2, 0, 3),
+    (1, 0, 4, 3, 2, 5),
+    (0, 4, 3, 2, 1, 5),
+    (5, 1, 3, 0, 2, 4),
+    (0, 2, 3, 5, 1, 4),
+    (2, 3, 0, 4, 1, 5),
+    (5, 0, 1, 2, 3, 4),
+    (5, 0, 4, 3, 1, 2),
+)
+
+#: max number of blocks encrypted per pass by mdes_encrypt_int_blocks()
+bs_lanes = 4096
+
+#: smallest batch for which mdes_encrypt_int_blocks() is faster
+#: than calling mdes_encrypt_int_block() for each block.
+bs_min_lanes = 128
+
+#: bit n of key used by each of the 48 key bits of each round (0-based from msb)
+_bs_key_schedule = None
+
+#: generated function performing one des round on bitsliced data
+_bs_round = None
+
+def _bs_sbox_circuit(idx, lines):
+    """generate source for boolean circuit implementing s-box *idx*.
+
+    the circuit is built by recursively splitting the s-box's truth table on
+    each input (shannon expansion), re-using any sub-functions which repeat,
+    and emitting a line of python code for each gate.
+    inputs are named ``x<n>``, for n in ``6*idx .. 6*idx+5``;
+    and ``M`` must be an integer with all lane bits set.
+
+    :returns: list of 4 names holding s-box's output bits (msb first)
+    """
+    box = BS_SBOX[idx]
+    order = BS_SBOX_ORDER[idx]
+    names = [ "x%d" % (6*idx+var) for var in order ]
+    cache = {}
+    inverted = {}
+
+    def invert(name):
+        if name not in inverted:
+            inverted[name] = "n" + name
+            lines.append("n%s = %s ^ M" % (name, name))
+        return inverted[name]
+
+    def emit(expr):
+        name = "s%d_%d" % (idx, len(cache))
+        lines.append("%s = %s" % (name, expr))
+        return name
+
+    def build(table, size):
+        #'table' is truth table of a function of the last 'size' inputs
+        full = (1 << (1 << size)) - 1
+        if table == 0:
+            return "0"
+        if table == full:
+            return "1"
+        key = (table, size)
+        if key in cache:
+            return cache[key]
+        half = 1 << (size-1)
+        mask = (1 << half) - 1
+        low, high = table & mask, table >> half
+        var = names[6-size]
+        if low == high:
+            result = build(low, size-1)
+        elif high == low ^ mask:
+            r0 = build(low, size-1)
+            if r0 == "0":
+                result = var
+            elif r0 == "1":
+                result = invert(var)
+            else:
+                result = emit("%s ^ %s" % (r0, var))
+        else:
+            r0 = build(low, size-1)
+            r1 = build(high, size-1)
+            if r0 == "0" and r1 == "1":
+                result = var
+            elif r0 == "1" and r1 == "0":
+                result = invert(var)
+            elif r0 == "0":
+                result = emit("%s & %s" % (r1, var))
+            elif r1 == "0":
+                result = emit("%s & %s" % (r0, invert(var)))
+            elif r0 == "1":
+                result = emit("%s | %s" % (r1, invert(var)))
+            elif r1 == "1":
+                result = emit("%s | %s" % (r0, var))
+            else:
+                result = emit("%s ^ (%s & %s)" % (r0, build(low ^ high, size-1), var))
+        cache[key] = result
+        return result
+
+    outputs = []
+    for bit in xrange(3, -1, -1):
+        #build truth table, indexed by input values in branching order
+        table = 0
+        for entry in xrange(64):
+            value = 0
+            for pos, var in enumerate(order):
+                if entry & (32 >> pos):
+                    value |= 32 >> var
+            row = ((value >> 4) & 2) | (value & 1)
+            col = (value >> 1) & 15
+            if box[row*16+col] & (1 << bit):
+                table |= 1 << entry
+        outputs.append(build(table, 6))
+    return outputs
+
+def _bs_load():
+    "build key schedule & generate round function for bitsliced des"
+    global _bs_key_schedule, _bs_round
+
+    #key schedule - just track which key bit ends up where
+    cd = [ pos-1 for pos in BS_PC1 ]
+    c, d = cd[:28], cd[28:]
+    schedule = []
+    for rot in BS_ROTATIONS:
+        c = c[rot:] + c[:rot]
+        d = d[rot:] + d[:rot]
+        cd = c + d
+        schedule.append(tuple(cd[pos-1] for pos in BS_PC2))
+
+    #generate round function, which takes in R & L as lists of 32 ints,
+    #K as list of 48 ints, S as list of 24 salt ints, and M as an all-ones mask.
+    #returns new value for L.
+    lines = []
+    for pos in xrange(24):
+        #E expansion, salt swap, and mixing in the key
+        a = BS_E[pos]-1
+        b = BS_E[pos+24]-1
+        lines.append("t = (R[%d] ^ R[%d]) & S[%d]" % (a, b, pos))
+        lines.append("x%d = R[%d] ^ t ^ K[%d]" % (pos, a, pos))
+        lines.append("x%d = R[%d] ^ t ^ K[%d]" % (pos+24, b, pos+24))
+    outputs = []
+    for idx in xrange(8):
+        outputs.extend(_bs_sbox_circuit(idx, lines))
+    lines.append("return [%s]" % ", ".join(
+        "L[%d] ^ %s" % (pos, outputs[src-1]) for pos, src in enumerate(BS_P)
+        ))
+    source = "def _bs_round(R, K, S, L, M):\n    " + "\n    ".join(lines) + "\n"
+    namespace = {}
+    exec compile(source, "<passlib.utils.des bitsliced round>", "exec") in namespace
+
+    _bs_key_schedule = schedule
+    _bs_round = namespace['_bs_round']
+
+#: map of hex digit -> 4 binary digits, used by bitslice helpers
+_bs_hex_bits = dict(
+    ("%x" % value, "".join(str((value >> bit) & 1) for bit in (3, 2, 1, 0)))
+    for value in xrange(16)
+)
+
+def _bs_slice(values, size):
+    """convert list of integers into list of *size* integers,
+    one per bit (msb first), with each lane's value occupying
+    the same bit position in all of them."""
+    fmt = "%%0%dx" % ((size+3)//4)
+    hex_bits = _bs_hex_bits
+    offset = -size
+    rows = [ "".join([ hex_bits[c] for c in fmt % value ])[offset:] for value in values ]
+    return [ int("".join(column), 2) for column in zip(*rows) ]
+
+def _bs_unslice(slices, count):
+    "inverse of _bs_slice - convert slices back into *count* integers"
+    fmt = "%%0%dx" % ((count+3)//4)
+    hex_bits = _bs_hex_bits
+    offset = -count
+    rows = [ "".join([ hex_bits[c] for c in fmt % value ])[offset:] for value in slices ]
+    return [ int("".join(column), 2) for column in zip(*rows) ]
+
+def mdes_encrypt_int_blocks(keys, inputs, salts, rounds):
+    """bitsliced version of :func:`mdes_encrypt_int_block`,
+    which encrypts many blocks (each with their own key & salt) at once.
+
+    :arg keys: list of 8 byte des keys as integers
+    :arg inputs: list of 8 byte plaintext blocks as integers, or single integer to use for all blocks
+    :arg salts: list of 24 bit salts as integers, or single integer to use for all blocks
+    :arg rounds: number of rounds of DES encryption to apply
+
+    :returns:
+        list of resulting blocks as 8 byte integers,
+        in the same order as *keys*.
+
+    Because it works on the blocks a bit at a time, this is slower than
+    :func:`!mdes_encrypt_int_block` for a handful of blocks;
+    but much faster for more than a hundred or so (see :data:`bs_min_lanes`).
+    """
+    count = len(keys)
+    if isinstance(inputs, (int, long)):
+        inputs = [inputs] * count
+    if isinstance(salts, (int, long)):
+        salts = [salts] * count
+    if len(inputs) != count or len(salts) != count:
+        raise ValueError("keys, inputs, and salts must be the same length")
+    assert rounds >= 0, "rounds out of range"
+    if _bs_round is None:
+        _bs_load()
+    step = bs_lanes
+    if count <= step:
+        return _bs_encrypt(keys, inputs, salts, rounds)
+    result = []
+    for start in xrange(0, count, step):
+        end = start + step
+        result.extend(_bs_encrypt(keys[start:end], inputs[start:end],
+                                  salts[start:end], rounds))
+    return result
+
+def _bs_encrypt(keys, inputs, salts, rounds):
+    "helper for mdes_encrypt_int_blocks() - encrypts up to bs_lanes blocks"
+    count = len(keys)
+    if not count:
+        return []
+    mask = (1 << count) - 1
+    key_bits = _bs_slice(keys, 64)
+    schedule = [ [ key_bits[pos] for pos in ks ] for ks in _bs_key_schedule ]
+    salt_bits = _bs_slice(salts, 24)
+    salt_bits.reverse() #salt bit 0 (the lsb) swaps E-box outputs 0 & 24
+    if any(inputs):
+        block = _bs_slice(inputs, 64)
+        block = [ block[pos-1] for pos in BS_IP ]
+        L, R = block[:32], block[32:]
+    else:
+        L = [0] * 32
+        R = [0] * 32
+    des_round = _bs_round
+    pairs = [ (schedule[idx], schedule[idx+1]) for idx in R16_S2 ]
+    while rounds:
+        rounds -= 1
+        for ks_even, ks_odd in pairs:
+            L = des_round(R, ks_even, salt_bits, L, mask)
+            R = des_round(L, ks_odd, salt_bits, R, mask)
+        L, R = R, L
+    #final permutation (inverse of IP)
+    block = [None] * 64
+    for pos, value in zip(BS_IP, L + R):
+        block[pos-1] = value
+    return _bs_unslice(block, count)
+
 #=========================================================
 #eof
 #=========================================================
@@ -17,6 +17,7 @@ from passlib.registry import get_crypt_handler
 from passlib.utils import to_hash_str, bytes, b, \
         classproperty, h64, getrandstr, getrandbytes, \
         rng, is_crypt_handler, ALL_BYTE_VALUES, MissingBackendError
+from passlib.utils import profiling
 #pkg
 #local
 __all__ = [
@@ -175,6 +176,11 @@ class StaticHandler(object):
     method (or the private :meth:`_norm_hash` method)
     should be overridden on a per-handler basis.
 
+    If your hash has a fixed size (eg: a hexidecimal digest), you may set
+    the optional :attr:`checksum_size` and :attr:`checksum_chars` attributes
+    to the size & charset of the *entire* hash string; :class:`~passlib.context.CryptContext`
+    uses these to skip calling :meth:`identify` for hashes which can't match.
+
     If your hash has options, such as multiple identifiers, salts,
     or variable rounds, this is not the right class to start with.
     You should use the :class:`GenericHandler` class, or implement the handler yourself.
@@ -223,7 +229,11 @@ class StaticHandler(object):
         if hash is None:
             raise ValueError("no hash specified")
         hash = cls._norm_hash(hash)
-        result = cls.genhash(secret, hash, *cargs, **context)
+        profiler = profiling.active
+        if profiler is None:
+            result = cls.genhash(secret, hash, *cargs, **context)
+        else:
+            result = profiler.call(cls.name, "digest", cls.genhash, secret, hash, *cargs, **context)
         return cls._norm_hash(result) == hash
 
     @classmethod
@@ -439,6 +449,12 @@ class GenericHandler(object):
 
     @classmethod
     def genhash(cls, secret, config):
+        profiler = profiling.active
+        if profiler is not None:
+            name = cls.name
+            self = profiler.call(name, "parse", cls.from_string, config)
+            self.checksum = profiler.call(name, "digest", self.calc_checksum, secret)
+            return profiler.call(name, "render", self.to_string)
         self = cls.from_string(config)
         self.checksum = self.calc_checksum(secret)
         return self.to_string()
@@ -453,6 +469,11 @@ class GenericHandler(object):
     @classmethod
     def encrypt(cls, secret, **settings):
         self = cls(**settings)
+        profiler = profiling.active
+        if profiler is not None:
+            name = cls.name
+            self.checksum = profiler.call(name, "digest", self.calc_checksum, secret)
+            return profiler.call(name, "render", self.to_string)
         self.checksum = self.calc_checksum(secret)
         return self.to_string()
 
@@ -461,6 +482,11 @@ class GenericHandler(object):
         #NOTE: classes with multiple checksum encodings (rare)
         # may wish to either override this, or override norm_checksum
         # to normalize any checksums provided by from_string()
+        profiler = profiling.active
+        if profiler is not None:
+            name = cls.name
+            self = profiler.call(name, "parse", cls.from_string, hash)
+            return self.checksum == profiler.call(name, "digest", self.calc_checksum, secret)
         self = cls.from_string(hash)
         return self.checksum == self.calc_checksum(secret)
 
@@ -1056,7 +1082,7 @@ class HasManyBackends(GenericHandler):
         :returns:
             ``True`` if backend is currently supported, else ``False``.
         """
-        if name in (None, "any", "default"):
+        if name in (None, "any", "default", "fastest"):
             if name is None:
                 warn("has_backend(None) is deprecated,"
                      " and support will be removed in Passlib 1.6;"
@@ -1099,6 +1125,12 @@ class HasManyBackends(GenericHandler):
               the current backend if one has been loaded,
               else acts like ``"default"``.
 
+            * the special string ``"fastest"``, which means to
+              benchmark all available backends on this host, and use the fastest
+              (see :func:`passlib.calibrate.find_fastest_backend`).
+              the result is cached on disk, so later processes
+              won't have to repeat the benchmark.
+
         :raises MissingBackendError:
             * if a specific backend was specified,
               but is not currently available.
@@ -1125,7 +1157,10 @@ class HasManyBackends(GenericHandler):
             if name:
                 return name
             name = "default"
-        if name == "default":
+        if name == "fastest":
+            from passlib.calibrate import find_fastest_backend
+            name = find_fastest_backend(cls)
+        elif name == "default":
             for name in cls.backends:
                 if cls.has_backend(name):
                     break
@@ -1222,7 +1257,7 @@ class PrefixWrapper(object):
         if self.prefix:
             args.append("prefix=%r" % self.prefix)
         if self.orig_prefix:
-            args.append("orig_prefix=%r", self.orig_prefix)
+            args.append("orig_prefix=%r" % (self.orig_prefix,))
         args = ", ".join(args)
         return 'PrefixWrapper(%r, %s)' % (self.name, args)
 
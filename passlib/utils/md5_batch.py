@@ -0,0 +1,326 @@
+"""passlib.utils.md5_batch - lane-parallel md5 engine used for batch hashing
+
+This module runs many independent md5 calculations in lock-step,
+with each one occupying a "lane" of a set of numpy ``uint32`` arrays.
+It's used by the batch helpers for :class:`~passlib.hash.md5_crypt`,
+:class:`~passlib.hash.apr_md5_crypt`, and :class:`~passlib.hash.phpass`,
+whose thousand-odd rounds of md5 would otherwise each be a separate
+python-level call into :mod:`!hashlib`.
+
+It requires numpy; if numpy isn't installed, :data:`available` will be ``False``,
+and the batch helpers fall back to their regular per-hash code.
+"""
+#=========================================================
+#imports
+#=========================================================
+#core
+import struct
+from math import sin
+#site
+try:
+    import numpy as np
+except ImportError: #pragma: no cover -- depends on local system
+    np = None
+#pkg
+from passlib.utils import b
+#local
+__all__ = [
+    "available",
+    "min_lanes",
+    "md5_many",
+    "md5_crypt_many",
+    "phpass_many",
+]
+
+#=========================================================
+#constants
+#=========================================================
+
+#: whether numpy is present, and the engine can be used.
+available = np is not None
+
+#: smallest batch for which the engine is faster than hashlib.
+#: numpy's per-operation overhead is only amortized once there are
+#: around a thousand lanes; below that, callers should use their normal per-hash code.
+min_lanes = 1024
+
+#: max number of lanes run at once (keeps the working set inside the cpu cache)
+max_lanes = 16384
+
+B_NULL = b("\x00")
+B_PAD = b("\x80")
+
+#: md5 initial state
+_md5_iv = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476)
+
+def _init_steps():
+    "build table of (round, constant, word, shift, 32-shift) for md5's 64 steps"
+    shifts = (7,12,17,22)*4 + (5,9,14,20)*4 + (4,11,16,23)*4 + (6,10,15,21)*4
+    steps = []
+    for i in xrange(64):
+        if i < 16:
+            g = i
+        elif i < 32:
+            g = (5*i+1) % 16
+        elif i < 48:
+            g = (3*i+5) % 16
+        else:
+            g = (7*i) % 16
+        k = int(abs(sin(i+1)) * 2**32) & 0xffffffff
+        s = shifts[i]
+        steps.append((i//16, np.uint32(k), g, np.uint32(s), np.uint32(32-s)))
+    return steps
+
+if available:
+    _steps = _init_steps()
+    _uint32 = np.uint32
+    _one = np.uint32(1)
+    _thirty_one = np.uint32(31)
+
+#=========================================================
+#compression function
+#=========================================================
+def _compress(state, words):
+    """run md5 compression function across all lanes.
+
+    :arg state: list of 4 ``uint32`` arrays, the chaining values a,b,c,d.
+    :arg words: list of 16 ``uint32`` arrays, the message block.
+
+    :returns: list of 4 new arrays containing the updated state.
+    """
+    #NOTE: this is written in terms of numpy's ufuncs with explicit output
+    #      buffers, so that each of the 64 steps makes no allocations.
+    band, bor, bxor, add = np.bitwise_and, np.bitwise_or, np.bitwise_xor, np.add
+    lshift, rshift = np.left_shift, np.right_shift
+    a, b, c, d = [ v.copy() for v in state ]
+    f = np.empty_like(a)
+    t = np.empty_like(a)
+    for rnd, k, g, s, rs in _steps:
+        if rnd == 0:
+            #F = (b & c) | (~b & d) = d ^ (b & (c ^ d))
+            bxor(c, d, f); band(f, b, f); bxor(f, d, f)
+        elif rnd == 1:
+            #G = (d & b) | (~d & c) = c ^ (d & (b ^ c))
+            bxor(b, c, f); band(f, d, f); bxor(f, c, f)
+        elif rnd == 2:
+            #H = b ^ c ^ d
+            bxor(b, c, f); bxor(f, d, f)
+        else:
+            #I = c ^ (b | ~d)
+            np.invert(d, f); bor(f, b, f); bxor(f, c, f)
+        add(f, a, f); add(f, k, f); add(f, words[g], f)
+        #new b = b + rotl(f, s); stored in a's buffer, which is then rotated into place
+        lshift(f, s, a); rshift(f, rs, t); bor(a, t, a); add(a, b, a)
+        a, b, c, d = d, a, b, c
+    add(a, state[0], a)
+    add(b, state[1], b)
+    add(c, state[2], c)
+    add(d, state[3], d)
+    return [a, b, c, d]
+
+#=========================================================
+#message layouts
+#=========================================================
+def _pad(msg, size):
+    "add md5 padding to message, then extend it with nulls to *size* bytes"
+    mlen = len(msg)
+    msg += B_PAD + B_NULL * ((55-mlen) % 64) + struct.pack("<Q", mlen<<3)
+    return msg + B_NULL * (size-len(msg))
+
+def _to_words(data, count):
+    "convert bytes to list of *count* native ``uint32`` arrays of little-endian words"
+    words = np.frombuffer(data, dtype="<u4").astype(_uint32)
+    return list(words.reshape(-1, count).T.copy())
+
+class _Layout(object):
+    """precalculated layout of the per-lane messages ``prefix + result + suffix``,
+    where ``result`` is the 16 byte digest from the previous round,
+    and prefix & suffix are constant for each lane.
+
+    all the constant parts of the messages are stored as a list of word arrays
+    (with nulls where the result goes), which are combined with the result
+    at the start of each round.
+    """
+    def __init__(self, prefixes, suffixes):
+        n = len(prefixes)
+        sizes = [ len(p) + 16 + len(s) for p, s in zip(prefixes, suffixes) ]
+        blocks = [ (size+8)//64 + 1 for size in sizes ]
+        self.masks = _block_masks(blocks)
+        count = max(blocks)
+        total = count*64
+        self.words = _to_words(b('').join(
+            _pad(p + B_NULL*16 + s, total) for p, s in zip(prefixes, suffixes)
+            ), count*16)
+
+        #figure out where result words go
+        offsets = [ len(p) for p in prefixes ]
+        start = min(offsets)
+        if start == max(offsets) and not start & 3:
+            #result is at same word-aligned offset in all lanes (the common case)
+            self.aligned = start >> 2
+            return
+        self.aligned = None
+        offsets = np.array(offsets)
+        #each word j of the message overlaps the result words at index
+        #m = j - (offset//4) and m-1, shifted by 8*(offset%4) bits.
+        #to do this with arrays, the result words are stacked into a
+        #(6, n) array with a row of zeros on either end, and each word
+        #is assembled via 'take' using a precalculated flat index.
+        lanes = np.arange(n)
+        first = offsets >> 2
+        self.shift = (offsets & 3).astype(_uint32) << 3
+        self.rshift = _thirty_one - self.shift
+        self.placement = placement = []
+        for j in xrange(start >> 2, (max(offsets) >> 2) + 5):
+            idx = np.clip(j - first + 1, 0, 5)
+            prev = np.clip(j - first, 0, 5)
+            placement.append((j, idx*n + lanes, prev*n + lanes))
+
+    def message(self, state):
+        "return list of message words for given result state"
+        words = list(self.words)
+        aligned = self.aligned
+        if aligned is not None:
+            words[aligned:aligned+4] = state
+            return words
+        zero = np.zeros_like(state[0])
+        stacked = np.concatenate([zero] + list(state) + [zero])
+        shift = self.shift
+        rshift = self.rshift
+        take, bor = np.take, np.bitwise_or
+        for j, cur, prev in self.placement:
+            #word = (cur << shift) | (prev >> (32-shift)) | const.
+            # right shift is split as >> 1 >> (31-shift) so shift=0 yields 0.
+            hi = take(stacked, prev) >> _one
+            hi >>= rshift
+            word = take(stacked, cur) << shift
+            bor(word, hi, word)
+            bor(word, words[j], word)
+            words[j] = word
+        return words
+
+    def digest(self, state):
+        "return md5 digest state of message formed from given result state"
+        return _hash_words(self.message(state), self.masks)
+
+def _block_masks(blocks):
+    """return list of masks for each block index, marking which lanes
+    have a block at that index (``None`` if all of them do)."""
+    first = min(blocks)
+    return [
+        None if idx < first else np.array([ idx < count for count in blocks ])
+        for idx in xrange(max(blocks))
+    ]
+
+def _hash_words(words, masks):
+    "run md5 over message words, returning final state"
+    n = len(words[0])
+    state = [ np.full(n, v, dtype=_uint32) for v in _md5_iv ]
+    for idx, mask in enumerate(masks):
+        new = _compress(state, words[idx*16:idx*16+16])
+        if mask is not None:
+            #leave state of lanes whose message has already ended untouched
+            new = [ np.where(mask, nv, cv) for nv, cv in zip(new, state) ]
+        state = new
+    return state
+
+def _to_state(digests):
+    "convert list of 16-byte digests to state arrays"
+    return _to_words(b('').join(digests), 4)
+
+def _from_state(state):
+    "convert state arrays to list of 16-byte digests"
+    data = np.stack(state, axis=1).astype("<u4").tobytes()
+    return [ data[idx:idx+16] for idx in xrange(0, len(data), 16) ]
+
+def _chunked(func, *columns):
+    "call func on max_lanes chunks of the input columns, and concatenate the results"
+    size = len(columns[0])
+    if size <= max_lanes:
+        return func(*columns)
+    result = []
+    for start in xrange(0, size, max_lanes):
+        result.extend(func(*[ col[start:start+max_lanes] for col in columns ]))
+    return result
+
+#=========================================================
+#public helpers
+#=========================================================
+def md5_many(messages):
+    """calculate md5 digests of a list of byte strings.
+
+    this is mainly useful for testing the engine,
+    though it's somewhat faster than :mod:`hashlib` when given several thousand messages.
+
+    :arg messages: list of byte strings.
+    :returns: list of 16 byte digests, in the same order.
+    """
+    if not messages:
+        return []
+    def helper(messages):
+        blocks = [ (len(msg)+8)//64 + 1 for msg in messages ]
+        size = max(blocks)
+        words = _to_words(b('').join(_pad(msg, size*64) for msg in messages), size*16)
+        return _from_state(_hash_words(words, _block_masks(blocks)))
+    return _chunked(helper, messages)
+
+def md5_crypt_many(secrets, salts, results, rounds, schedule):
+    """run main loop of md5-crypt for a batch of secrets.
+
+    :arg secrets: list of secrets (as bytes)
+    :arg salts: list of salts (as bytes)
+    :arg results: list of initial 16 byte digests for each secret.
+    :arg rounds: number of round pairs to run.
+    :arg schedule:
+        sequence of (even, odd) round flags for the repeating round cycle;
+        see :data:`passlib.utils.crypt_round_schedule`.
+    :returns: list of final 16 byte digests.
+    """
+    if not secrets:
+        return []
+    def helper(secrets, salts, results):
+        n = len(secrets)
+        #there are four kinds of each of even rounds (md5(result + parts))
+        #and odd rounds (md5(parts + result)), depending on whether
+        #round % 3 (salt) and round % 7 (extra secret) are used.
+        def parts(flags):
+            return [
+                (salt if flags & 1 else b('')) + (secret if flags & 2 else b(''))
+                for secret, salt in zip(secrets, salts)
+            ]
+        empty = [ b('') ] * n
+        even = [ _Layout(empty, [ rest + secret for secret, rest in zip(secrets, parts(flags)) ])
+                 for flags in xrange(4) ]
+        odd = [ _Layout([ secret + rest for secret, rest in zip(secrets, parts(flags)) ], empty)
+                for flags in xrange(4) ]
+        pairs = [ (even[e], odd[o]) for e, o in schedule ]
+        count = len(pairs)
+        state = _to_state(results)
+        for idx in xrange(rounds):
+            e, o = pairs[idx % count]
+            state = o.digest(e.digest(state))
+        return _from_state(state)
+    return _chunked(helper, secrets, salts, results)
+
+def phpass_many(secrets, results, rounds):
+    """run main loop of phpass for a batch of secrets.
+
+    :arg secrets: list of secrets (as bytes)
+    :arg results: list of initial 16 byte digests, ``md5(salt+secret)``.
+    :arg rounds: number of rounds to run.
+    :returns: list of final 16 byte digests.
+    """
+    if not secrets:
+        return []
+    def helper(secrets, results):
+        layout = _Layout([ b('') ] * len(secrets), secrets)
+        digest = layout.digest
+        state = _to_state(results)
+        for idx in xrange(rounds):
+            state = digest(state)
+        return _from_state(state)
+    return _chunked(helper, secrets, results)
+
+#=========================================================
+#eof
+#=========================================================
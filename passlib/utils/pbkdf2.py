@@ -7,7 +7,7 @@ maybe rename to "kdf" since it's getting more key derivation functions added.
 #imports
 #=================================================================================
 #core
-from binascii import unhexlify
+from binascii import hexlify, unhexlify
 import hashlib
 import hmac
 import logging; log = logging.getLogger(__name__)
@@ -20,13 +20,14 @@ try:
 except ImportError:
     _EVP = None
 #pkg
-from passlib.utils import xor_bytes, to_bytes, native_str, b, bytes
+from passlib.utils import to_bytes, native_str, b, bytes, bjoin_ints
 #local
 __all__ = [
     "hmac_sha1",
     "get_prf",
     "pbkdf1",
     "pbkdf2",
+    "hashlib_pbkdf2",
 ]
 
 # Py2k #
@@ -56,8 +57,48 @@ if _EVP:
 #=================================================================================
 #general prf lookup
 #=================================================================================
+
+#: translation tables used to derive hmac's inner & outer pads from the key
+_trans_36 = bjoin_ints((x ^ 0x36) for x in xrange(256))
+_trans_5C = bjoin_ints((x ^ 0x5C) for x in xrange(256))
+
+def _get_keyed_hmac(digest_const, key):
+    """helper to build keyed hmac prf for a hashlib constructor.
+
+    this precomputes the digest states after the inner & outer pads
+    have been hashed, so each call only has to ``copy()`` them,
+    rather than re-deriving them as :func:`hmac.new` does.
+    """
+    inner = digest_const()
+    outer = digest_const()
+    block_size = inner.block_size
+    if len(key) > block_size:
+        key = digest_const(key).digest()
+    key += b('\x00') * (block_size - len(key))
+    inner.update(key.translate(_trans_36))
+    outer.update(key.translate(_trans_5C))
+    inner_copy = inner.copy
+    outer_copy = outer.copy
+    def keyed_prf(msg):
+        "keyed_prf(msg)->digest; generated by passlib.utils.pbkdf2.get_prf()"
+        tmp = inner_copy()
+        tmp.update(msg)
+        result = outer_copy()
+        result.update(tmp.digest())
+        return result.digest()
+    return keyed_prf
+
+def _get_generic_keyed(prf):
+    "helper to build keyed prf factory for prfs which can't be precomputed"
+    def make_keyed(key):
+        def keyed_prf(msg):
+            "keyed_prf(msg)->digest; generated by passlib.utils.pbkdf2.get_prf()"
+            return prf(key, msg)
+        return keyed_prf
+    return make_keyed
+
 def _get_hmac_prf(digest):
-    "helper to return HMAC prf for specific digest"
+    "helper to return HMAC prf, digest size, and keyed prf factory for specific digest"
     #check if m2crypto is present and supports requested digest
     if _EVP:
         try:
@@ -72,28 +113,34 @@ def _get_hmac_prf(digest):
                 return hmac_const(key, msg, digest)
             prf.__name__ = "hmac_" + digest
             digest_size = len(result)
-            return prf, digest_size
+            return prf, digest_size, _get_generic_keyed(prf)
 
     #fall back to stdlib implementation
     digest_const = getattr(hashlib, digest, None)
     if not digest_const:
         raise ValueError("unknown hash algorithm: %r" % (digest,))
-    digest_size = digest_const().digest_size
+    tmp = digest_const()
+    digest_size = tmp.digest_size
     hmac_const = hmac.new
     def prf(key, msg):
         "prf(key,msg)->digest; generated by passlib.utils.pbkdf2.get_prf()"
         return hmac_const(key, msg, digest_const).digest()
     prf.__name__ = "hmac_" + digest
-    return prf, digest_size
-
-#cache mapping prf name/func -> (func, digest_size)
+    if hasattr(tmp, "copy") and getattr(tmp, "block_size", None):
+        def make_keyed(key):
+            return _get_keyed_hmac(digest_const, key)
+    else: #pragma: no cover -- all hashlib digests have these
+        make_keyed = _get_generic_keyed(prf)
+    return prf, digest_size, make_keyed
+
+#cache mapping prf name/func -> (func, digest_size, keyed prf factory)
 _prf_cache = {}
 
 def _clear_prf_cache():
     "helper for unit tests"
     _prf_cache.clear()
 
-def get_prf(name):
+def get_prf(name, key=None):
     """lookup pseudo-random family (prf) by name.
 
     :arg name:
@@ -107,6 +154,11 @@ def get_prf(name):
         ``prf(secret, message) -> digest``,
         in which case it will be returned unchanged.
 
+    :param key:
+        optional key (bytes) to bind the prf to.
+        if specified, the returned function will be a "keyed prf"
+        (see below).
+
     :raises ValueError: if the name is not known
     :raises TypeError: if the name is not a callable or string
 
@@ -116,6 +168,9 @@ def get_prf(name):
         * :samp:`{func}` is a function implementing
           the specified prf, and has the signature
           ``func(secret, message) -> digest``.
+          if *key* was specified, it instead has the signature
+          ``func(message) -> digest``, and reuses the
+          key's precomputed hmac state across calls.
 
         * :samp:`{digest_size}` is an integer indicating
           the number of bytes the function returns.
@@ -130,26 +185,34 @@ def get_prf(name):
         32
         >>> digest = hmac_sha256('password', 'message')
 
+        >>> #keyed prfs are faster when reusing the same key many times
+        >>> keyed_sha256, dsize = get_prf("hmac-sha256", 'password')
+        >>> keyed_sha256('message') == digest
+        True
+
     this function will attempt to return the fastest implementation
     it can find; if M2Crypto is present, and supports the specified prf,
     :func:`M2Crypto.EVP.hmac` will be used behind the scenes.
     """
     global _prf_cache
     if name in _prf_cache:
-        return _prf_cache[name]
-    if isinstance(name, native_str):
-        if name.startswith("hmac-") or name.startswith("hmac_"):
-            retval = _get_hmac_prf(name[5:])
-        else:
-            raise ValueError("unknown prf algorithm: %r" % (name,))
-    elif callable(name):
-        #assume it's a callable, use it directly
-        digest_size = len(name(b('x'),b('y')))
-        retval = (name, digest_size)
+        retval = _prf_cache[name]
     else:
-        raise TypeError("prf must be string or callable")
-    _prf_cache[name] = retval
-    return retval
+        if isinstance(name, native_str):
+            if name.startswith("hmac-") or name.startswith("hmac_"):
+                retval = _get_hmac_prf(name[5:])
+            else:
+                raise ValueError("unknown prf algorithm: %r" % (name,))
+        elif callable(name):
+            #assume it's a callable, use it directly
+            digest_size = len(name(b('x'),b('y')))
+            retval = (name, digest_size, _get_generic_keyed(name))
+        else:
+            raise TypeError("prf must be string or callable")
+        _prf_cache[name] = retval
+    if key is None:
+        return retval[0], retval[1]
+    return retval[2](key), retval[1]
 
 #=================================================================================
 #pbkdf1 support
@@ -222,7 +285,7 @@ def pbkdf1(secret, salt, rounds, keylen, hash="sha1"):
 MAX_BLOCKS = 0xffffffff #2**32-1
 MAX_HMAC_SHA1_KEYLEN = MAX_BLOCKS*20
 
-def pbkdf2(secret, salt, rounds, keylen, prf="hmac-sha1"):
+def pbkdf2(secret, salt, rounds, keylen, prf="hmac-sha1", pool=None):
     """pkcs#5 password-based key derivation v2.0
 
     :arg secret: passphrase to use to generate key
@@ -234,6 +297,14 @@ def pbkdf2(secret, salt, rounds, keylen, prf="hmac-sha1"):
         this can be any string or callable accepted by :func:`get_prf`.
         this defaults to ``hmac-sha1`` (the only prf explicitly listed in
         the PBKDF2 specification)
+    :param pool:
+        optional pool of workers, such as a :class:`!multiprocessing.Pool`
+        (or anything else with a compatible ``map()`` method).
+        if specified, and ``keylen`` requires more than one
+        digest-sized block, the blocks will be computed concurrently
+        by the pool's workers, so latency stays near that of a single block.
+        for process pools, ``prf`` must be picklable
+        (eg: a string, or a module-level function).
 
     :returns:
         raw bytes of generated key
@@ -262,31 +333,102 @@ def pbkdf2(secret, salt, rounds, keylen, prf="hmac-sha1"):
         if keylen < 41:
             return _EVP.pbkdf2(secret, salt, rounds, keylen)
 
-    #resolve prf
-    encode_block, digest_size = get_prf(prf)
+    #resolve prf, keyed to the secret
+    keyed_prf, digest_size = get_prf(prf, secret)
 
     #figure out how many blocks we'll need
     bcount = (keylen+digest_size-1)//digest_size
     if bcount >= MAX_BLOCKS:
         raise ValueError("key length to long")
 
+    #hand blocks off to pool if requested
+    if pool is not None and bcount > 1:
+        tasks = [
+            (secret, salt + pack(">L", i), rounds, prf)
+            for i in xrange(1,bcount+1)
+        ]
+        return b('').join(pool.map(_pbkdf2_block_task, tasks))[:keylen]
+
     #build up key from blocks
     out = BytesIO()
     write = out.write
     for i in xrange(1,bcount+1):
-        block = tmp = encode_block(secret, salt + pack(">L", i))
-        #NOTE: could potentially unroll this loop somewhat for speed,
-        # or find some faster way to accumulate & xor tmp values together
-        j = 1
-        while j < rounds:
-            tmp = encode_block(secret, tmp)
-            block = xor_bytes(block, tmp)
-            j += 1
-        write(block)
+        write(_pbkdf2_block(keyed_prf, digest_size, salt + pack(">L", i), rounds))
 
     #and done
     return out.getvalue()[:keylen]
 
+def _pbkdf2_block_task(task):
+    "helper for pbkdf2() - calculate a single pbkdf2 block inside pool worker"
+    secret, msg, rounds, prf = task
+    keyed_prf, digest_size = get_prf(prf, secret)
+    return _pbkdf2_block(keyed_prf, digest_size, msg, rounds)
+
+def _pbkdf2_block(keyed_prf, digest_size, msg, rounds):
+    "calculate a single pbkdf2 block, given keyed prf & initial message"
+    #NOTE: xor'ing the digests together as (arbitrary precision) integers
+    #      is much faster than xor_bytes(), which works a byte at a time.
+    tmp = keyed_prf(msg)
+    acc = int(hexlify(tmp), 16)
+    for _ in xrange(rounds-1):
+        tmp = keyed_prf(tmp)
+        acc ^= int(hexlify(tmp), 16)
+    return unhexlify("%0*x" % (digest_size*2, acc))
+
+#=================================================================================
+#hashlib's native pbkdf2
+#=================================================================================
+_pbkdf2_hmac = getattr(hashlib, "pbkdf2_hmac", None) #python 2.7.8+, 3.4+
+
+if _pbkdf2_hmac:
+    def hashlib_pbkdf2(secret, salt, rounds, keylen, prf="hmac-sha1"):
+        """pkcs#5 password-based key derivation v2.0, using :func:`!hashlib.pbkdf2_hmac`.
+
+        this accepts the same arguments as :func:`pbkdf2`, and returns the same result,
+        but runs the whole derivation in C (via OpenSSL where available), which is
+        orders of magnitude faster than the :func:`pbkdf2` loop. if the prf isn't a
+        :samp:`hmac-{digest}` name that hashlib supports (eg: a custom callable),
+        this falls back to :func:`pbkdf2`.
+
+        this is set to ``None`` if the host's :mod:`hashlib` lacks
+        :func:`!pbkdf2_hmac` (added in Python 2.7.8 / 3.4).
+        """
+        #prepare secret & salt
+        if not isinstance(secret, bytes):
+            raise TypeError("secret must be bytes, not %s" % (type(secret),))
+        if not isinstance(salt, bytes):
+            raise TypeError("salt must be bytes, not %s" % (type(salt),))
+
+        #prepare rounds
+        if not isinstance(rounds, (int, long)):
+            raise TypeError("rounds must be an integer")
+        if rounds < 1:
+            raise ValueError("rounds must be at least 1")
+
+        #resolve digest name, anything else is handled by pbkdf2()
+        if not isinstance(prf, native_str) or prf[:5] not in ("hmac-", "hmac_"):
+            return pbkdf2(secret, salt, rounds, keylen, prf)
+        digest = prf[5:]
+        try:
+            digest_size = hashlib.new(digest).digest_size
+        except ValueError:
+            return pbkdf2(secret, salt, rounds, keylen, prf)
+
+        #check key length against spec limit
+        if (keylen+digest_size-1)//digest_size >= MAX_BLOCKS:
+            raise ValueError("key length to long")
+        if keylen < 1:
+            return b('')
+
+        try:
+            return _pbkdf2_hmac(digest, secret, salt, rounds, keylen)
+        except (ValueError, OverflowError):
+            #digest not supported by pbkdf2_hmac, or rounds / keylen
+            #too large for a C long on this platform.
+            return pbkdf2(secret, salt, rounds, keylen, prf)
+else:
+    hashlib_pbkdf2 = None
+
 #=================================================================================
 #eof
 #=================================================================================
@@ -0,0 +1,148 @@
+"""passlib.utils.profiling - phase-level timing of the hashing pipeline"""
+#=========================================================================
+#imports
+#=========================================================================
+from __future__ import with_statement
+#core
+import time
+try:
+    import threading
+except ImportError: #pragma: no cover -- python built w/o thread support
+    import dummy_threading as threading
+#site
+#local
+__all__ = [
+    "PhaseProfiler",
+    "enable_profiling",
+    "disable_profiling",
+    "get_profiler",
+]
+
+#=========================================================================
+#profiler
+#=========================================================================
+
+#: timer used by profiler (perf_counter has better resolution, where available)
+timer = getattr(time, "perf_counter", time.time)
+
+#: order phases are listed in by :meth:`PhaseProfiler.format_table`
+phase_order = ["identify", "policy", "parse", "digest", "render", "pad"]
+
+class PhaseProfiler(object):
+    """records time spent in each phase of the hashing pipeline, per scheme.
+
+    While profiling is enabled (see :func:`enable_profiling`),
+    :class:`~passlib.context.CryptContext` and the
+    :class:`~passlib.utils.handlers.GenericHandler` /
+    :class:`~passlib.utils.handlers.StaticHandler` machinery
+    will record the time taken by the following phases:
+
+    * ``identify`` - identifying which scheme a hash belongs to.
+    * ``policy`` - preparing settings for encrypt, and checking
+      existing hashes against the policy (:meth:`~passlib.context.CryptContext.hash_needs_update`).
+    * ``parse`` - parsing the hash string (:meth:`!from_string`).
+    * ``digest`` - calculating the checksum (:meth:`!calc_checksum`),
+      which includes encoding the secret, running the hash function itself,
+      and encoding the result.
+    * ``render`` - rendering the hash string (:meth:`!to_string`).
+    * ``pad`` - sleeping to honor ``min_verify_time``.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, scheme, phase, elapsed):
+        "record that a single call to phase took specified number of seconds"
+        key = (scheme, phase)
+        with self._lock:
+            entry = self._totals.get(key)
+            if entry is None:
+                self._totals[key] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def call(self, scheme, phase, func, *args, **kwds):
+        "call ``func(*args, **kwds)``, recording time taken as specified phase"
+        start = timer()
+        try:
+            return func(*args, **kwds)
+        finally:
+            self.record(scheme, phase, timer() - start)
+
+    def reset(self):
+        "discard all recorded timings"
+        with self._lock:
+            self._totals = {}
+
+    def stats(self):
+        """return recorded timings.
+
+        :returns:
+            dict mapping ``scheme -> phase -> (calls, total_seconds)``.
+        """
+        result = {}
+        with self._lock:
+            for (scheme, phase), (count, total) in self._totals.iteritems():
+                result.setdefault(scheme, {})[phase] = (count, total)
+        return result
+
+    def format_table(self):
+        "return per-scheme breakdown of recorded timings, as a string"
+        def sort_key(phase):
+            if phase in phase_order:
+                return (phase_order.index(phase), phase)
+            return (len(phase_order), phase)
+        lines = ["%-24s %-10s %8s %12s %12s %7s" %
+                 ("scheme", "phase", "calls", "total (ms)", "avg (us)", "share")]
+        stats = self.stats()
+        for scheme in sorted(stats, key=lambda s: s or ""):
+            phases = stats[scheme]
+            grand = sum(total for count, total in phases.itervalues()) or 1
+            for phase in sorted(phases, key=sort_key):
+                count, total = phases[phase]
+                lines.append("%-24s %-10s %8d %12.3f %12.1f %6.1f%%" %
+                             (scheme or "-", phase, count, total*1000,
+                              total*1e6/count, total*100/grand))
+        return "\n".join(lines) + "\n"
+
+#=========================================================================
+#global switch
+#=========================================================================
+
+#: currently enabled profiler, or ``None`` if profiling is disabled.
+#: (checked by instrumented code, so it costs only a global lookup when off)
+active = None
+
+def enable_profiling(profiler=None):
+    """enable phase profiling for all contexts & handlers.
+
+    :param profiler:
+        optional :class:`PhaseProfiler` to record timings into;
+        a new one is created if not specified.
+
+    :returns: the profiler which is now active.
+    """
+    global active
+    if profiler is None:
+        profiler = PhaseProfiler()
+    active = profiler
+    return profiler
+
+def disable_profiling():
+    """disable phase profiling.
+
+    :returns: the profiler which was active, or ``None``.
+    """
+    global active
+    profiler = active
+    active = None
+    return profiler
+
+def get_profiler():
+    "return active :class:`PhaseProfiler`, or ``None`` if profiling is disabled"
+    return active
+
+#=========================================================================
+#eof
+#=========================================================================
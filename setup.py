@@ -151,6 +151,7 @@ setup(
     #package info
     packages = [
         "passlib",
+            "passlib.bench",
             "passlib.ext",
                 "passlib.ext.django",
             "passlib.handlers",